@@ -202,7 +202,6 @@ intersphinx_mapping = {
     'scipy [latest]': ('https://docs.scipy.org/doc/scipy/reference', None),
     'pandas [latest]': ('https://pandas.pydata.org/pandas-docs/stable', None),
     'h5py [latest]': ('http://docs.h5py.org/en/stable', None),
-    'geopy [latest]': ('https://geopy.readthedocs.io/en/stable/', None),
     }
 
 # -- Options for todo extension ----------------------------------------------
@@ -1,6 +1,6 @@
 import readgssi.functions as fx
 import numpy as np
-import pandas as pd
+from scipy.fft import rfft, irfft, rfftfreq, next_fast_len
 
 def flip(ar, verbose=False):
     """
@@ -17,9 +17,9 @@ def flip(ar, verbose=False):
 
 def reducex(ar, header, by=1, chnum=1, number=1, verbose=False):
     """
-    Reduce the number of traces in the array by a number. Not the same as :py:func:`stack` since it doesn't sum adjacent traces, however :py:func:`stack` uses it to resize the array prior to stacking.
+    Reduce the number of traces in the array by a number. Not the same as :py:func:`stack` since it doesn't sum adjacent traces.
 
-    Used by :py:func:`stack` and :py:func:`distance_normalize` but not accessible from the command line or :py:func:`readgssi.readgssi`.
+    Not accessible from the command line or :py:func:`readgssi.readgssi`.
 
     :param numpy.ndarray ar: Input data array
     :param int by: Factor to reduce by. Default is 1.
@@ -34,27 +34,36 @@ def reducex(ar, header, by=1, chnum=1, number=1, verbose=False):
             fx.printmsg('%s/%s reducing %sx%s chunk by a factor of %s...' % (chnum, number, ar.shape[0], ar.shape[1], by))
     return ar[:,::by]
 
-def stack(ar, header, stack='auto', verbose=False):
+def autostack(shape):
+    """
+    The stacking value that :py:data:`stack='auto'` resolves to for an array of a given shape, i.e. the one that results in an approximately 2.5:1 x:y axis ratio.
+
+    :param tuple shape: Shape of the array (samples, traces)
+    :rtype: :py:class:`int`
+    """
+    ratio = (shape[1]/shape[0])/(75/30)
+    if ratio > 1:
+        return int(round(ratio))
+    return 1
+
+def stack(ar, header, stack='auto', mean=False, verbose=False):
     """
     Stacking algorithm. Stacking is the process of summing adjacent traces in order to reduce noise --- the thought being that random noise around zero will cancel out and data will either add or subtract, making it easier to discern.
 
     It is also useful for displaying long lines on a computer screen. Usage is covered in the :ref:`stacking` section of the tutorial.
 
-    :py:data:`stack='auto'` results in an approximately 2.5:1 x:y axis ratio. :py:data:`stack=3` sums three adjacent traces into a single trace across the width of the array.
+    :py:data:`stack='auto'` results in an approximately 2.5:1 x:y axis ratio. :py:data:`stack=3` sums three adjacent traces into a single trace across the width of the array. If the number of traces isn't a multiple of the stacking value, the last trace is the sum of the traces left over (see :py:func:`stacktraces`).
 
     :param numpy.ndarray ar: Input data array
     :param int by: Factor to stack by. Default is "auto".
+    :param bool mean: Average adjacent traces instead of summing them. Defaults to False.
     :rtype: radar array (:py:class:`numpy.ndarray`)
 
     """
     stack0 = stack
     if str(stack).lower() in 'auto':
         am = '(automatic)'
-        ratio = (ar.shape[1]/ar.shape[0])/(75/30)
-        if ratio > 1:
-            stack = int(round(ratio))
-        else:
-            stack = 1
+        stack = autostack(ar.shape)
     else:
         am = '(manually set)'
         try:
@@ -67,11 +76,7 @@ def stack(ar, header, stack='auto', verbose=False):
     if stack > 1:
         if verbose:
             fx.printmsg('stacking %sx %s...' % (stack, am))
-        i = list(range(stack))
-        l = list(range(int(ar.shape[1]/stack)))
-        arr = np.copy(reducex(ar=ar, by=stack, header=header, verbose=verbose))
-        for s in l:
-            arr[:,s] = arr[:,s] + ar[:,s*stack+1:s*stack+stack].sum(axis=1)
+        arr = stacktraces(ar, stack, mean=mean)
     else:
         arr = ar
         if str(stack0).lower() in 'auto': # this happens when distance normalization reduces the file
@@ -79,84 +84,309 @@ def stack(ar, header, stack='auto', verbose=False):
         else:
             fx.printmsg('WARNING: no stacking applied. this can result in very large and awkwardly-shaped figures.')
 
-    if header['rh_nchan'] == 1:
-        # this is a hack to prevent the rhf_spx vars from being changed multiple times
-        # when stacking a multichannel file. this will go away when each array has its
-        # own header and thus each can be dealt with individually.
-        if header['rhf_sps'] != 0:
-            header['rhf_sps'] = header['rhf_sps'] / stack
-        if header['rhf_spm'] != 0:
-            header['rhf_spm'] = header['rhf_spm'] / stack
-    else:
-        try:
-            if header['spx_updates']:
-                pass
-            else:
-                if header['rhf_sps'] != 0:
-                    header['rhf_sps'] = header['rhf_sps'] / stack
-                if header['rhf_spm'] != 0:
-                    header['rhf_spm'] = header['rhf_spm'] / stack
-                header['spx_updates'] = True
-        except KeyError:
-            header['spx_updates'] = False
+    # each channel has its own copy of the header (see readgssi.readgssi.process_channel), so this is only done once per array
+    if header['rhf_sps'] != 0:
+        header['rhf_sps'] = header['rhf_sps'] / stack
+    if header['rhf_spm'] != 0:
+        header['rhf_spm'] = header['rhf_spm'] / stack
 
     return header, arr, stack
 
-def distance_normalize(header, ar, gps, verbose=False):
+def stacktraces(ar, by, mean=False, partial=True):
+    """
+    Sum (or average) every :code:`by` adjacent traces. The array is viewed as (samples, traces // by, by) without copying it, and summed along the last axis. For small stacking values, the :code:`by` strided slices along that axis are added into the output one after another instead, since :py:func:`numpy.sum` is slow over such a short axis. Used by :py:func:`stack` and :py:func:`stack_stream`.
+
+    Integer arrays are summed in their own dtype, and floating point arrays keep their precision.
+
+    :param numpy.ndarray ar: Input data array
+    :param int by: Number of traces per stack
+    :param bool mean: Average instead of summing. Defaults to False.
+    :param bool partial: If the number of traces isn't a multiple of :code:`by`, add a last trace made from the traces left over. Otherwise they are dropped. Defaults to True.
+    :rtype: radar array (:py:class:`numpy.ndarray`)
+    """
+    by = int(by)
+    full = ar.shape[1] // by
+    rest = ar.shape[1] - full * by
+    dtype = (ar.dtype if ar.dtype.kind == 'f' else np.dtype(np.float64)) if mean else ar.dtype
+    out = np.empty((ar.shape[0], full + (1 if (partial and rest) else 0)), dtype=dtype)
+    groups = ar[:,:full*by].reshape(ar.shape[0], full, by)
+    if by <= 6:
+        out[:,:full] = groups[:,:,0]
+        for i in range(1, by):
+            out[:,:full] += groups[:,:,i]
+    else:
+        np.sum(groups, axis=2, dtype=dtype, out=out[:,:full])
+    if mean:
+        out[:,:full] /= by
+    if partial and rest:
+        if mean:
+            out[:,full] = ar[:,full*by:].mean(axis=1, dtype=dtype)
+        else:
+            out[:,full] = ar[:,full*by:].sum(axis=1, dtype=dtype)
+    return out
+
+def stack_stream(ar, state=None, stack=2, final=False, mean=False):
     """
-    Distance normalization algorithm. Uses a GPS array to calculate expansion and contraction needed to convert from time-triggered to distance-normalized sampling interval. Then, the samples per meter is recalculated and inserted into the header for proper plotting.
+    Streaming stacking, for arrays that are read or recorded in blocks of traces (see :py:func:`readgssi.dzt.iter_traces`). Traces that don't fill a whole stack are carried over to the next block, so the result is the same as stacking the whole line with :py:func:`stack`. Call this once per block, passing back the returned state, and with :code:`final=True` on the last block (or afterwards with :code:`ar=None`) to get the last, partial stack: ::
+
+        from readgssi.dzt import iter_traces
+        from readgssi.arrayops import stack_stream
+
+        state = None
+        for header, block, data in iter_traces('FILE__001.DZT', chunk=2048):
+            ar, state = stack_stream(data[0], state, stack=4)
+        ar, state = stack_stream(None, state, stack=4, final=True)
+
+    :param numpy.ndarray ar: The next block of traces, or :py:data:`None`
+    :param state: The state returned by the last call (the traces carried over), or :py:data:`None` on the first
+    :param int stack: Number of traces per stack. Defaults to 2.
+    :param bool final: Whether this is the last block. Defaults to False.
+    :param bool mean: Average adjacent traces instead of summing them. Defaults to False.
+    :rtype: stacked traces (:py:class:`numpy.ndarray`), state
+    """
+    if ar is None:
+        ar = state[:,:0]
+    if (state is not None) and (state.shape[1] > 0):
+        ar = np.concatenate((state, ar), axis=1)
+    n = (ar.shape[1] // int(stack)) * int(stack)
+    return stacktraces(ar, stack, mean=mean, partial=final), ar[:,n:]
+
+def tracedistance(header, ntraces, gps):
+    """
+    The distance along the line of each trace in the array, interpolated linearly between the trace numbers of the GPS fixes. Traces before the first fix or after the last are given the distance of that fix. Distances never decrease, so traces recorded while standing still all have the same distance.
+
+    :param dict header: The file header dictionary. :code:`start_scan` (the first trace read, if the file was read in a window) is used to line trace numbers up with the array.
+    :param int ntraces: The number of traces in the array
+    :param pandas.DataFrame gps: GPS data from :py:func:`readgssi.gps.readdzg`
+    :rtype: :py:class:`numpy.ndarray` of distances in meters
+    """
+    first = header.get('start_scan', 0)
+    traces = np.asarray(gps['trace'], dtype=np.float64)
+    meters = np.maximum.accumulate(np.asarray(gps['meters'], dtype=np.float64))
+    order = np.argsort(traces, kind='stable') # np.interp needs increasing trace numbers
+    return np.interp(np.arange(first, first + ntraces, dtype=np.float64), traces[order], meters[order])
+
+def distance_normalize(header, ar, gps=None, method='nearest', verbose=False):
+    """
+    Distance normalization algorithm. Converts a time-triggered array to a distance-normalized one by resampling its traces onto evenly spaced distances along the line. The distance of every trace is interpolated from the GPS (see :py:func:`tracedistance`), the array is given the same number of traces spread evenly from the first distance to the last, and each new trace is taken from the original trace nearest to it (or interpolated between the two on either side of it). Traces are gathered into the output in one pass, so memory use is only that of the input and output arrays. Then, the samples per meter is recalculated and inserted into the header for proper plotting.
 
     Usage described in the :ref:`Distance normalization` section of the tutorial.
 
     :param dict header: Input data array
     :param numpy.ndarray ar: Input data array
-    :param pandas.DataFrame gps: GPS data from :py:func:`readgssi.gps.readdzg`. This is used to calculate the expansion and compression needed to normalize traces to distance.
+    :param pandas.DataFrame gps: GPS data from :py:func:`readgssi.gps.readdzg`. This is used to calculate the distance of each trace. Defaults to :py:data:`None`, which uses :code:`header.gps` (read from the DZG on first use, see :py:class:`readgssi.dzt.DZTHeader`).
+    :param str method: :code:`'nearest'` to use the nearest trace to each distance, which keeps the original trace values and data type, or :code:`'linear'` to interpolate between the traces on either side of it. Defaults to :code:`'nearest'`.
     :param bool verbose: Verbose, defaults to False.
     :rtype: header (:py:class:`dict`), radar array (:py:class:`numpy.ndarray`), gps (False or :py:class:`pandas.DataFrame`)
 
     """
-    if gps.empty:
+    if gps is None:
+        gps = header.gps
+    if gps.empty or (gps.shape[0] < 2):
         if verbose:
             fx.printmsg('no gps information for distance normalization')
+        return header, ar, gps
+    if method not in ('nearest', 'linear'):
+        raise ValueError('distance normalization method must be "nearest" or "linear", not "%s"' % (method))
+    n = ar.shape[1]
+    dist = tracedistance(header, n, gps)
+    length = dist[-1] - dist[0]
+    if (n < 2) or (length <= 0):
+        fx.printmsg('WARNING: GPS shows no movement over this line; skipping distance normalization')
+        return header, ar, gps
+    if verbose:
+        fx.printmsg('resampling %s traces to even spacing (%s)...' % (n, method))
+    grid = np.linspace(dist[0], dist[-1], n)
+    if method == 'nearest':
+        right = np.clip(np.searchsorted(dist, grid, side='left'), 1, n - 1)
+        left = right - 1
+        idx = np.where(grid - dist[left] <= dist[right] - grid, left, right)
+        proc = np.take(ar, idx, axis=1)
     else:
-        if verbose:
-            fx.printmsg('normalizing GPS velocity records...')
-        while np.min(gps['velocity']) < 0.01: # fix zero and negative velocity values
-            gps['velocity'].replace(gps['velocity'].min(), 0.01, inplace=True)
-        norm_vel = (gps['velocity'] * (1/gps['velocity'].max())*100).to_frame('normalized') # should end up as dataframe with one column
-        # upsample to match radar array shape
-        nanosec_samp_rate = int((1/header['rhf_sps'])*10**9) # nanoseconds
-        start = np.datetime64(str(norm_vel.index[0])) - np.timedelta64(nanosec_samp_rate*(gps.iloc[0,0]), 'ns')
-        newdf = pd.DataFrame(index=pd.date_range(start=start, periods=ar.shape[1], freq=str(nanosec_samp_rate)+'N', tz='UTC'))
-        norm_vel = pd.concat([norm_vel, newdf], axis=1).interpolate('time').bfill()
-        del newdf
-        norm_vel = norm_vel.round().astype(int, errors='ignore')#, casting='unsafe')
-
-        try:
-            rm = int(round(ar.shape[1] / (norm_vel.shape[0] - ar.shape[1])))
-            norm_vel = norm_vel.drop(norm_vel.index[::rm])
-        except ZeroDivisionError as e:
-            fx.printmsg('equal length radar & velocity arrays; no size adjustment')
-        for i in range(0,abs(norm_vel.shape[0]-ar.shape[1])):
-            s = pd.DataFrame({'normalized':[norm_vel['normalized'].iloc[-1]]}) # hacky, but necessary
-            norm_vel = pd.concat([norm_vel, s])
-
-        nvm = int(round(norm_vel['normalized'].mean()))
-        proc = np.ndarray((ar.shape[0], 0))
-        if verbose:
-            fx.printmsg('expanding array using mean of normalized velocity %.2f' % (norm_vel['normalized'].mean()))
-        on, i = 0, 0
-        for c in np.array_split(ar, nvm, axis=1):
-            # takes (array, [transform values to broadcast], axis)
-            p = np.repeat(c, norm_vel['normalized'].astype(int, errors='ignore').values[on:on+c.shape[1]], axis=1)
-            p = reducex(p, header=header, by=nvm, chnum=i, number=nvm, verbose=verbose)
-            proc = np.concatenate((proc, p), axis=1)
-            on = on + c.shape[1]
-            i += 1
-        if verbose:
-            fx.printmsg('total GPS distance: %.2f m' % gps['meters'].iloc[-1])
-            fx.printmsg('replacing old traces per meter value of %s with %s' % (header['rhf_spm'],
-                                                                            ar.shape[1] / gps['meters'].iloc[-1]))
-        header['rhf_spm'] = proc.shape[1] / gps['meters'].iloc[-1]
-        header['rhf_sps'] = 0
+        right = np.clip(np.searchsorted(dist, grid, side='right'), 1, n - 1)
+        left = right - 1
+        span = dist[right] - dist[left]
+        w = np.divide(grid - dist[left], span, out=np.zeros(n), where=span > 0)
+        proc = np.empty(ar.shape, dtype=np.result_type(ar.dtype, np.float32)) # float32 stays float32
+        w = w.astype(proc.dtype)
+        cols = max(1, 2**22 // max(ar.shape[0], 1))
+        for i in range(0, n, cols):
+            s = slice(i, i + cols)
+            a, b = ar[:,left[s]], ar[:,right[s]]
+            np.multiply(a, 1 - w[s], out=proc[:,s])
+            proc[:,s] += b * w[s]
+    if verbose:
+        fx.printmsg('total GPS distance: %.2f m' % length)
+        fx.printmsg('replacing old traces per meter value of %s with %s' % (header['rhf_spm'], proc.shape[1] / length))
+    header['rhf_spm'] = proc.shape[1] / length
+    header['rhf_sps'] = 0
     return header, proc, gps
+
+def firstbreak(ar, threshold=0.2):
+    """
+    Pick the first break (the onset of the direct wave) of every trace. The pick is the first sample at which the trace's absolute amplitude, measured from the trace's mean (which also removes the unsigned offset of integer data), reaches :code:`threshold` times its largest absolute amplitude. It is refined to a fraction of a sample by interpolating between the samples on either side of the crossing. Amplitudes are used rather than sample to sample differences, which amplify noise: with the direct wave well above the noise, picks stay within a small fraction of a sample of each other.
+
+    Traces are picked a block at a time, so memory use doesn't grow with the length of the line.
+
+    :param numpy.ndarray ar: The radar array
+    :param float threshold: Fraction of each trace's largest absolute amplitude that counts as the first break. Defaults to 0.2.
+    :rtype: :py:class:`numpy.ndarray` of picks in samples (:py:data:`numpy.nan` for traces that are flat)
+    """
+    picks = np.full(ar.shape[1], np.nan)
+    if ar.shape[0] < 2:
+        return picks
+    cols = max(1, 2**20 // ar.shape[0])
+    for i in range(0, ar.shape[1], cols):
+        a = ar[:,i:i+cols].astype(np.float32)
+        a -= a.mean(axis=0)
+        np.abs(a, out=a)
+        level = a.max(axis=0) * threshold
+        j = np.argmax(a >= level, axis=0)
+        k = np.arange(a.shape[1])
+        before, at = a[np.maximum(j - 1, 0), k], a[j, k]
+        rise = at - before
+        frac = np.divide(level - before, rise, out=np.ones(a.shape[1], dtype=np.float32), where=(j > 0) & (rise > 0))
+        p = np.maximum(j - 1 + frac, 0.)
+        p[level == 0] = np.nan
+        picks[i:i+cols] = p
+    return picks
+
+def directwave(ar, maxshift):
+    """
+    The reference wavelet for :py:func:`wavelettimes`: the average trace of the line, cut to a window of :code:`2*maxshift` samples either side of its largest sample (the direct wave). The window has its mean removed, so correlating it with a trace ignores the trace's offset.
+
+    :param numpy.ndarray ar: The radar array
+    :param int maxshift: The furthest the wavelet will be moved
+    :rtype: first row of the window (:py:class:`int`), wavelet (:py:class:`numpy.ndarray`)
+    """
+    ref = np.mean(ar, axis=1, dtype=np.float64)
+    ref -= ref.mean()
+    peak = int(np.argmax(np.abs(ref)))
+    start = max(peak - 2 * maxshift, 0)
+    ref = ref[start:peak + 2 * maxshift + 1]
+    return start, (ref - ref.mean()).astype(np.float32)
+
+def wavelettimes(ar, maxshift=None):
+    """
+    The delay of the direct wave in every trace relative to the average trace of the line. Each trace is cross-correlated with the reference wavelet (see :py:func:`directwave`) at every lag from :code:`-maxshift` to :code:`maxshift`, and the best lag is refined to a fraction of a sample by fitting a parabola through the correlation around its peak. Since the lags are few, each one is a single matrix-vector product over a block of traces rather than an FFT of the whole trace, and only the rows around the direct wave are read.
+
+    :param numpy.ndarray ar: The radar array
+    :param int maxshift: The largest delay to look for, in samples. Defaults to :py:data:`None`, which is 1/32 of the trace length (at least 4 samples).
+    :rtype: :py:class:`numpy.ndarray` of delays in samples (:py:data:`numpy.nan` where the best lag is at the edge of the search)
+    """
+    m = int(maxshift) if maxshift else max(ar.shape[0] // 32, 4)
+    delays = np.full(ar.shape[1], np.nan)
+    if ar.shape[0] < 2:
+        return delays
+    start, ref = directwave(ar, m)
+    # the rows the wavelet is compared with, repeating the first or last sample past the ends of the trace
+    rows = np.clip(np.arange(start - m, start + ref.shape[0] + m), 0, ar.shape[0] - 1)
+    cols = max(1, 2**20 // rows.shape[0])
+    for i in range(0, ar.shape[1], cols):
+        block = ar[rows, i:i+cols].astype(np.float32)
+        cc = np.empty((2 * m + 1, block.shape[1]), dtype=np.float32)
+        for lag in range(2 * m + 1):
+            np.dot(ref, block[lag:lag + ref.shape[0]], out=cc[lag])
+        best = np.argmax(cc, axis=0)
+        k = np.arange(cc.shape[1])
+        inside = (best > 0) & (best < 2 * m)
+        a, b, c = cc[np.maximum(best - 1, 0), k], cc[best, k], cc[np.minimum(best + 1, 2 * m), k]
+        curve = a - 2 * b + c
+        frac = np.divide(a - c, 2 * curve, out=np.zeros(cc.shape[1], dtype=np.float32), where=inside & (curve < 0))
+        d = best - m + frac
+        d[~inside] = np.nan
+        delays[i:i+cols] = d
+    return delays
+
+def shifttraces(ar, shifts):
+    """
+    Shift each trace down (positive) or up (negative) by its own number of samples. Whole sample shifts are done by gathering samples with :py:func:`numpy.take_along_axis`, which keeps the data type of the array. Fractional shifts are done with the whole part gathered the same way, then the remainder applied as a phase shift in the frequency domain, which returns floating point data. Samples shifted in from beyond the ends of a trace repeat its first or last sample.
+
+    Traces are shifted a block at a time, so only one block's indices (or spectrum) are held in memory.
+
+    :param numpy.ndarray ar: The radar array
+    :param numpy.ndarray shifts: The shift of each trace in samples
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    shifts = np.asarray(shifts, dtype=np.float64)
+    whole = np.rint(shifts).astype(np.intp)
+    frac = shifts - whole
+    fractional = np.any(frac != 0)
+    rows = ar.shape[0]
+    out = np.empty(ar.shape, dtype=np.result_type(ar.dtype, np.float32) if fractional else ar.dtype)
+    if fractional:
+        # pad with a ramp from the last sample back to the first so that the periodic FFT doesn't see a jump
+        pad = next_fast_len(rows + 16) - rows
+        ramp = (np.arange(1, pad + 1) / (pad + 1.)).reshape(-1, 1)
+        phase = -2j * np.pi * rfftfreq(rows + pad).reshape(-1, 1)
+    index = np.arange(rows).reshape(-1, 1)
+    cols = max(1, 2**20 // max(rows, 1))
+    for i in range(0, ar.shape[1], cols):
+        s = slice(i, i + cols)
+        src = index - whole[s]
+        np.clip(src, 0, rows - 1, out=src)
+        block = np.take_along_axis(ar[:,s], src, axis=0)
+        if fractional:
+            block = block.astype(out.dtype, copy=False)
+            block = np.concatenate((block, block[-1] + (block[0] - block[-1]) * ramp), axis=0)
+            block = irfft(rfft(block, axis=0) * np.exp(phase * frac[s]), n=rows + pad, axis=0)[:rows]
+        out[:,s] = block
+    return out
+
+def alignspec(align):
+    """
+    Parse the :code:`align` argument of :py:func:`readgssi.readgssi.readgssi` (or :code:`--align` on the command line) into the arguments of :py:func:`align`. The spec is the method (:code:`xcorr`, the default, or :code:`threshold`), optionally followed by a colon and how traces are shifted (:code:`int` for whole samples, the default, or :code:`fft` for fractions of a sample). Either part alone is also accepted, and :py:data:`True` means :code:`xcorr:int`. For example: :code:`'fft'`, :code:`'threshold'`, :code:`'threshold:fft'`.
+
+    :param align: The spec
+    :rtype: method (:py:class:`str`), fractional (:py:class:`bool`)
+    :raises ValueError: if the spec can't be parsed
+    """
+    shifts = {'int': False, 'integer': False, 'sample': False, 'samples': False,
+              'fft': True, 'frac': True, 'fractional': True}
+    if align is True:
+        return 'xcorr', False
+    method, _, shift = str(align).strip().lower().partition(':')
+    if (method in shifts) and not shift:
+        method, shift = 'xcorr', method
+    if (method not in ('xcorr', 'threshold')) or (shift and (shift not in shifts)):
+        raise ValueError('alignment must be "xcorr" or "threshold", optionally followed by ":int" or ":fft" (e.g. "threshold:fft"), not "%s"' % (align))
+    return method, shifts.get(shift, False)
+
+def align(ar, method='xcorr', fractional=False, maxshift=None, threshold=0.2, verbose=False):
+    """
+    Line up the direct wave of all traces. Drift of the direct wave along a line (from changes in temperature or flexing of the antenna cable, for example) is removed by finding the delay of the direct wave in every trace and shifting each trace (see :py:func:`shifttraces`) to cancel it. The single time zero of the channel is unchanged.
+
+    Delays are found by one of two methods:
+
+    * :code:`'xcorr'`: delays from cross-correlation with the average direct wave of the line (see :py:func:`wavelettimes`), relative to the median delay. This uses the whole wavelet, so it holds up well in noisy data.
+    * :code:`'threshold'`: first break picks (see :py:func:`firstbreak`), relative to the median pick of the line. This is the cheaper of the two, but picks can jump in noisy data.
+
+    Both are a few passes over blocks of traces, which is cheap enough to run on every file in a batch.
+
+    :param numpy.ndarray ar: The radar array
+    :param str method: :code:`'xcorr'` or :code:`'threshold'`. Defaults to :code:`'xcorr'`.
+    :param bool fractional: Shift traces by fractions of a sample (in the frequency domain) rather than whole samples. Defaults to False.
+    :param int maxshift: The largest shift in samples. Traces that would need to move further are left where they are, on the assumption that their delay is wrong. Defaults to :py:data:`None`, which is 1/32 of the trace length (at least 4 samples).
+    :param float threshold: First break threshold for the :code:`'threshold'` method (see :py:func:`firstbreak`). Defaults to 0.2.
+    :param bool verbose: Verbose, defaults to False.
+    :rtype: radar array (:py:class:`numpy.ndarray`), shifts in samples (:py:class:`numpy.ndarray`)
+    """
+    maxshift = int(maxshift) if maxshift else max(ar.shape[0] // 32, 4)
+    if method == 'xcorr':
+        delays = wavelettimes(ar, maxshift=maxshift)
+        shifts = np.nanmedian(delays) - delays if np.any(np.isfinite(delays)) else delays
+    elif method == 'threshold':
+        picks = firstbreak(ar, threshold=threshold)
+        shifts = np.nanmedian(picks) - picks if np.any(np.isfinite(picks)) else picks
+    else:
+        raise ValueError('alignment method must be "xcorr" or "threshold", not "%s"' % (method))
+    shifts = np.nan_to_num(shifts, nan=0.)
+    shifts[np.abs(shifts) > maxshift] = 0
+    if not fractional:
+        shifts = np.rint(shifts)
+    if verbose:
+        fx.printmsg('aligning direct wave by %s (largest shift %.2f samples, %s traces moved)...'
+                    % (method, np.max(np.abs(shifts), initial=0), np.count_nonzero(shifts)))
+    if not np.any(shifts):
+        return ar, shifts
+    return shifttraces(ar, shifts), shifts
@@ -0,0 +1,162 @@
+import os
+import json
+import pickle
+import hashlib
+import numpy as np
+import readgssi.functions as fx
+from readgssi import __version__
+
+"""
+an on-disk, content-addressed cache of processed arrays
+
+each entry is a .npy file holding a processed channel array and a .pkl file holding
+the header and processing values that go with it. entries are named by a hash of the
+input file's fingerprint and the processing parameters, so changing the file or any
+parameter that affects the array results in a different entry. the least recently
+used entries are removed once the cache grows past its size limit.
+"""
+
+MAXBYTES = 2 * 1024**3 # default cache size limit (2 GiB)
+FPBYTES = 1024**2 # bytes hashed from each end of the input file
+
+
+def cachedir(directory=None):
+    """
+    Return the cache directory, creating it if necessary. If :code:`directory` is not given, the :code:`READGSSI_CACHE` environment variable is used, then :code:`$XDG_CACHE_HOME/readgssi`, then :code:`~/.cache/readgssi`.
+
+    :param str directory: Cache directory. Defaults to None.
+    :rtype: :py:class:`str`
+    """
+    if not directory:
+        directory = os.environ.get('READGSSI_CACHE')
+    if not directory:
+        directory = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join('~', '.cache')), 'readgssi')
+    directory = os.path.expanduser(directory)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def fingerprint(infile):
+    """
+    Fingerprint a file by its size, modification time, and a hash of its first and last :code:`FPBYTES` bytes. This is much faster than hashing a whole DZT, and still changes if the file is rewritten or appended to.
+
+    :param str infile: The file to fingerprint
+    :rtype: :py:class:`str`
+    """
+    st = os.stat(infile)
+    h = hashlib.sha1()
+    with open(infile, 'rb') as f:
+        h.update(f.read(FPBYTES))
+        if st.st_size > FPBYTES:
+            f.seek(max(st.st_size - FPBYTES, FPBYTES))
+            h.update(f.read(FPBYTES))
+    return '%s-%s-%s' % (st.st_size, st.st_mtime_ns, h.hexdigest())
+
+
+def key(infile, chan, params):
+    """
+    Create a cache key for one channel of a file processed with a set of parameters.
+
+    :param str infile: The input DZT
+    :param int chan: The channel number
+    :param dict params: Every parameter that affects the processed array or its header (see :py:func:`readgssi.readgssi.readgssi`)
+    :rtype: :py:class:`str`
+    """
+    ident = {'fingerprint': fingerprint(infile), 'chan': chan, 'version': __version__, 'params': params}
+    return hashlib.sha1(json.dumps(ident, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def load(key, directory=None, verbose=False):
+    """
+    Load a cache entry. The array is returned as a read-only memory map of the cached file, and the entry is marked as recently used.
+
+    :param str key: The cache key from :py:func:`key`
+    :param str directory: Cache directory (see :py:func:`cachedir`)
+    :param bool verbose: Verbose, defaults to False
+    :rtype: radar array (:py:class:`numpy.ndarray`), metadata (whatever was passed to :py:func:`save`), or :py:data:`None` if there is no entry
+    """
+    base = os.path.join(cachedir(directory), key)
+    try:
+        with open(base + '.pkl', 'rb') as f:
+            meta = pickle.load(f)
+        ar = np.load(base + '.npy', mmap_mode='r')
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return None
+    for ext in ('.npy', '.pkl'):
+        os.utime(base + ext) # mark as recently used
+    if verbose:
+        fx.printmsg('loaded processed array from cache (%s)' % (key))
+    return ar, meta
+
+
+def save(key, ar, meta, directory=None, maxbytes=MAXBYTES, verbose=False):
+    """
+    Save a cache entry, then evict old entries if the cache is larger than :code:`maxbytes`. Files are written under a temporary name and moved into place, so concurrent readers never see a partial entry.
+
+    :param str key: The cache key from :py:func:`key`
+    :param numpy.ndarray ar: The processed radar array
+    :param meta: Anything picklable to store with the array (e.g. the processed header)
+    :param str directory: Cache directory (see :py:func:`cachedir`)
+    :param int maxbytes: Cache size limit in bytes. Defaults to :code:`MAXBYTES`.
+    :param bool verbose: Verbose, defaults to False
+    """
+    directory = cachedir(directory)
+    base = os.path.join(directory, key)
+    tmp = '%s.%s.tmp' % (base, os.getpid())
+    try:
+        with open(tmp, 'wb') as f:
+            np.save(f, np.ascontiguousarray(ar), allow_pickle=False)
+        os.replace(tmp, base + '.npy')
+        with open(tmp, 'wb') as f:
+            pickle.dump(meta, f)
+        os.replace(tmp, base + '.pkl')
+    except OSError as e:
+        fx.printmsg('WARNING: could not write to cache: %s' % (e))
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return
+    if verbose:
+        fx.printmsg('saved processed array to cache (%s)' % (key))
+    evict(directory, maxbytes=maxbytes, verbose=verbose)
+
+
+def evict(directory=None, maxbytes=MAXBYTES, verbose=False):
+    """
+    Remove least recently used entries until the cache is no larger than :code:`maxbytes`.
+
+    :param str directory: Cache directory (see :py:func:`cachedir`)
+    :param int maxbytes: Cache size limit in bytes. Defaults to :code:`MAXBYTES`.
+    :param bool verbose: Verbose, defaults to False
+    """
+    directory = cachedir(directory)
+    entries = {}
+    for f in os.listdir(directory):
+        k, ext = os.path.splitext(f)
+        if ext in ('.npy', '.pkl'):
+            try:
+                st = os.stat(os.path.join(directory, f))
+            except OSError:
+                continue # removed by another process
+            size, used = entries.get(k, (0, 0))
+            entries[k] = (size + st.st_size, max(used, st.st_mtime))
+    total = sum(size for size, used in entries.values())
+    for k in sorted(entries, key=lambda k: entries[k][1]): # oldest first
+        if total <= maxbytes:
+            break
+        for ext in ('.npy', '.pkl'):
+            try:
+                os.remove(os.path.join(directory, k + ext))
+            except OSError:
+                pass
+        total -= entries[k][0]
+        if verbose:
+            fx.printmsg('removed %s from cache' % (k))
+
+
+def clear(directory=None):
+    """
+    Remove all entries from the cache.
+
+    :param str directory: Cache directory (see :py:func:`cachedir`)
+    """
+    evict(directory, maxbytes=-1)
@@ -22,14 +22,16 @@ help_text = u'''Help text:
 
 usage:
 readgssi -i input.DZT [OPTIONS]
+readgssi -i /dir/ [-i "/dir2/*.DZT" ...] [OPTIONS]   (batch mode)
 
 required flags:
      OPTION     |      ARGUMENT       |       FUNCTIONALITY
--i, --input     | file:  /dir/f.DZT   |  input DZT file
+-i, --input     | file:  /dir/f.DZT   |  input DZT file. can be repeated, and can be a directory or a quoted glob pattern (batch mode)
 
 optional flags:
      OPTION     |      ARGUMENT       |       FUNCTIONALITY
 -o, --output    | file:  /dir/f.ext   |  output file. if not set, will be named similar to input
+-I, --info      |                     |  print header information only (does not read data, GPS, or DZX)
 -f, --format    | string, eg. "csv"   |  output format (CSV and DZT are the only working formats currently available from the command line)
 -p, --plot      | +integer or "auto"  |  plot size. will be x inches high or "auto". default: 10. see also -D to set DPI
 -D, --dpi       | positive integer    |  set the plot DPI for figure making. defaults to 150
@@ -40,11 +42,13 @@ optional flags:
 -n, --noshow    |                     |  suppress matplotlib popup window and simply save a figure (useful for multi-file processing)
 -c, --colormap  | string, eg. "Greys" |  specify the colormap (https://matplotlib.org/users/colormaps.html#grayscale-conversion)
 -g, --gain      | positive float      |  gain constant (higher=greater contrast, default: 1)
+    --tgain     | string, eg. "agc:50"|  amplitude gain applied to the data (and exports): "agc[:window]", "tpow:power", "exp:alpha", or "sec:alpha" (alpha per ns)
 -A, --absval    |                     |  Displays the absolute value of the vertical gradient of the array when plotting. Good for displaying faint array features.
 -r, --bgr       | +integer or zero    |  horizontal background removal (useful to remove ringing). zero=full width; positive=window size (after stacking)
 -R, --reverse   |                     |  reverse (flip array horizontally)
--w, --dewow     |                     |  trinomial dewow algorithm
+-w, --dewow     |                     |  dewow: removes a cubic polynomial trend from each trace
 -t, --bandpass  | +int-+int (MHz)     |  triangular FIR bandpass filter applied vertically (positive integer range in megahertz; ex. 70-130)
+    --filtertype| string, eg. "butter"|  type of bandpass filter used by -t: "triangular" (FIR, default) or "butterworth" (IIR)
 -b, --colorbar  |                     |  add a colorbar to the radar figure
 -a, --antfreq   | positive integer    |  set antenna frequency. overrides header value
 -s, --stack     | +integer or "auto"  |  set trace stacking value or "auto" to autostack to ~2.5:1 x:y axis ratio
@@ -54,17 +58,42 @@ optional flags:
 -m, --histogram |                     |  produce a histogram of data values
 -E, --epsr      | float > 1.0         |  user-defined epsilon sub r (sometimes referred to as "dielectric") if set, ignores value in DZT header
 -Z, --zero      | +int or list of int |  timezero: skip samples before direct wave. samples are removed from the top of the trace. use list for multi-channel
+    --memmap    |                     |  memory-map the DZT instead of reading it into memory (for files larger than RAM)
+    --dtype     | string, eg. float32 |  working precision of the array. float32 removes the unsigned offset and halves memory use vs. float64 filtering. default: int32
+    --parallel  |                     |  process the channels of multichannel files at the same time in separate processes (use with -n)
+-j, --jobs      | positive integer    |  batch mode: number of files to process at the same time. default: 1
+    --align     | string, eg. "int"   |  line up the first break (direct wave) of every trace: "int" shifts by whole samples, "fft" by fractions of a sample.
+                |                     |  delays come from cross-correlation, or from first break picks with "threshold" (e.g. "threshold:fft")
+    --threads   | +integer or "auto"  |  number of threads each filter (dewow, bandpass, bgr, gain) splits the array between. "auto" uses one per CPU. default: 1
+    --force     |                     |  batch mode: process files even if their outputs are newer than the input (skipped by default)
+    --cache     |                     |  cache processed arrays on disk (in $READGSSI_CACHE or ~/.cache/readgssi) and reuse them when re-plotting
+    --gpscsv    |                     |  write the GPS table (after pause correction) to a CSV next to the DZG, e.g. FILE__001.DZG-gps.csv
+    --watch     |                     |  follow a DZT while it is being recorded, processing new traces as they arrive and updating the plot (-p) and DZT output (-f dzt)
+    --pipeline  | string, see below   |  run processing steps in one pass, in the order given, e.g. "dewow,bandpass:70-130,stack:4,bgr:100". replaces -w, -t, -s, -r, and --tgain
+
+pipeline stages (--pipeline):
+     STAGE      |    EXAMPLE          |       FUNCTIONALITY
+    dewow       | dewow, dewow:50     |  cubic dewow, or subtract a running mean of n samples
+    bandpass    | bandpass:70-130     |  triangular FIR bandpass filter (MHz)
+    butterworth | butterworth:70-130  |  butterworth bandpass filter (MHz)
+    stack       | stack:4, stack:auto |  stack traces
+    bgr         | bgr, bgr:100        |  background removal (full width or window size)
+    gain        | gain:agc:50         |  amplitude gain, same values as --tgain
 
 naming scheme for exports:
   CHARACTERS    |    MEANING
     Ch0         |  Profile from channel 0 (can range from 0 - 3)
     Dn          |  Distance normalization
     Tz233       |  Time zero at 233 samples
+    Al          |  First breaks aligned by whole samples (Alf: by fractions of a sample; Alt, Altf: aligned by first break picks)
     S8          |  Stacked 8 times
     Rv          |  Profile read in reverse (flipped horizontally)
     Bgr75       |  Background removal filter with window size of 75
+    BgrRun      |  Background removal by running mean (full width in pipelines and watch mode)
+    Agc50       |  Automatic gain control with a 50 sample window (also Tpow2, Exp0.02, Sec0.02)
     Dw          |  Dewow filter
     Bp70-130    |  triangular FIR filter applied from 70 to 130 MHz
+    Bw70-130    |  butterworth filter applied from 70 to 130 MHz
     G30         |  30x contrast gain
     Abs         |  Color scale represents absolute value of vertical gradient
     Z10.20.7.5  |  zoom from 10-20 axis units on the x-axis and 5-7 on the z-axis
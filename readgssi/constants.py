@@ -1,4 +1,5 @@
 import pytz
+import numpy as np
 
 """
 This module contains a number of variables that readgssi needs to perform physics calculations and interpret files from DZT files.
@@ -12,11 +13,65 @@ INFOAREASIZE = MINHEADSIZE - PAREASIZE - GPSAREASIZE
 
 TZ = pytz.timezone('UTC')
 
+# layout of the 1024-byte header that precedes the data for each channel.
+# used with numpy.frombuffer to decode one or many headers at once (readgssi.dzt),
+# and to encode headers when writing DZT files (readgssi.translate)
+DZT_HEADER = np.dtype([
+    ('rh_tag', '<i2'),          # 0x00ff if header, 0xfnff if old file format
+    ('rh_data', '<i2'),         # offset to data from beginning of file
+    ('rh_nsamp', '<i2'),        # samples per scan
+    ('rh_bits', '<i2'),         # bits per data word
+    ('rh_zero', '<i2'),         # if sir-30 or utilityscan df, then repeats per sample; otherwise 0x80 for 8bit and 0x8000 for 16bit
+    ('rhf_sps', '<f4'),         # scans per second
+    ('rhf_spm', '<f4'),         # scans per meter
+    ('rhf_mpm', '<f4'),         # meters per mark
+    ('rhf_position', '<f4'),    # position (ns)
+    ('rhf_range', '<f4'),       # range (ns)
+    ('rh_npass', '<i2'),        # number of passes for 2-D files
+    ('rhb_cdt', '<u4'),         # creation date and time, bitfield u5u6u5u5u4u7 (see readgssi.dzt.readtime)
+    ('rhb_mdt', '<u4'),         # modification date and time, same bitfield
+    ('rh_rgain', '<i2'),        # offset to range gain function
+    ('rh_nrgain', '<i2'),       # size of range gain function
+    ('rh_text', '<i2'),         # offset to text
+    ('rh_ntext', '<i2'),        # size of text
+    ('rh_proc', '<i2'),         # offset to processing history
+    ('rh_nproc', '<i2'),        # size of processing history
+    ('rh_nchan', '<i2'),        # number of channels
+    ('rhf_epsr', '<f4'),        # epsr (sometimes referred to as "dielectric permittivity")
+    ('rhf_top', '<f4'),         # data top position in meters
+    ('rhf_depth', '<f4'),       # range in meters based on rhf_epsr, before subtracting rhf_top
+    ('rh_xstart', '<f4'),       # starting x grid coordinate
+    ('rh_xend', '<f4'),         # ending x grid coordinate
+    ('rhf_servo_level', '<f4'), # gain servo level
+    ('rh_reserved', 'V3'),      # "reserved" bytes
+    ('rh_accomp', 'u1'),        # Ant Conf component
+    ('rh_sconfig', '<i2'),      # setup config number
+    ('rh_spp', '<i2'),          # scans per pass
+    ('rh_linenum', '<i2'),      # line number
+    ('rh_ystart', '<f4'),       # starting y grid coordinate
+    ('rh_yend', '<f4'),         # ending y grid coordinate
+    ('rh_96', 'u1'),            # line order and slice type (superseded by rh_112)
+    ('rh_dtype', 'u1'),         # no description of dtype
+    ('rh_ant', 'V14'),          # antenna name
+    ('rh_112', 'u1'),           # line order (low 4 bits) and slice type (high 4 bits)
+    ('vsbyte', 'u1'),           # version (low 3 bits) and system type (high 5 bits)
+    ('rh_name', 'V12'),         # initials of operator
+    ('rh_chksum', 'V2'),        # checksum
+    ('INFOAREA', 'V%s' % (MINHEADSIZE - PAREASIZE - GPSAREASIZE)),
+    ('rh_RGPS0', 'V%s' % (RGPSSIZE)),
+    ('rh_RGPS1', 'V%s' % (RGPSSIZE)),
+])
+
 # some physical constants for Maxwell's equation for speed of light in a dielectric medium
 C = 299792458                   # speed of light in a vacuum
 Eps_0 = 8.8541878 * 10**(-12)   # epsilon naught (vacuum permittivity)
 Mu_0 = 1.257 * 10**(-6)         # mu naught (vacuum permeability)
 
+# the WGS84 ellipsoid, for distances between GPS fixes (readgssi.distance)
+WGS84_A = 6378137.0             # semi-major axis in meters
+WGS84_F = 1 / 298.257223563     # flattening
+R_EARTH = 6371008.8             # mean radius in meters, for the spherical (haversine) distance
+
 
 # the GSSI field unit used
 UNIT = {
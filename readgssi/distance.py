@@ -0,0 +1,118 @@
+import numpy as np
+import readgssi.functions as fx
+from readgssi.constants import WGS84_A, WGS84_F, R_EARTH
+
+"""
+Distances between GPS fixes
+
+every function here works on whole arrays of coordinates at once, so the length of a
+line of thousands of fixes is measured in a handful of numpy operations rather than
+one geodesic solution per fix.
+"""
+
+METHODS = ('vincenty', 'haversine')
+
+
+def haversine(lat0, lon0, lat1, lon1, radius=R_EARTH):
+    """
+    Great circle distance between two sets of points on a sphere, using the haversine formula. This is faster than :py:func:`vincenty`, but ignores the flattening of the earth, so distances can be off by up to about half a percent.
+
+    :param numpy.ndarray lat0: Latitudes of the first points in decimal degrees
+    :param numpy.ndarray lon0: Longitudes of the first points in decimal degrees
+    :param numpy.ndarray lat1: Latitudes of the second points in decimal degrees
+    :param numpy.ndarray lon1: Longitudes of the second points in decimal degrees
+    :param float radius: Radius of the sphere in meters. Defaults to the mean radius of the earth (:py:data:`readgssi.constants.R_EARTH`).
+    :rtype: :py:class:`numpy.ndarray` of distances in meters
+    """
+    lat0, lon0, lat1, lon1 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat0, lon0, lat1, lon1))
+    h = np.sin((lat1 - lat0) / 2)**2 + np.cos(lat0) * np.cos(lat1) * np.sin((lon1 - lon0) / 2)**2
+    return 2 * radius * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+
+def vincenty(lat0, lon0, lat1, lon1, tol=1e-12, maxiter=200, a=WGS84_A, f=WGS84_F):
+    """
+    Distance between two sets of points on the WGS84 ellipsoid, using Vincenty's inverse formula. All pairs are solved at once: each iteration updates every pair, and iteration stops once the longitude on the auxiliary sphere has changed by less than :code:`tol` radians for all of them. With the default tolerance, distances agree with Karney's method (as implemented by geographiclib) to well under a millimeter.
+
+    The formula does not converge for nearly antipodal points, which consecutive GPS fixes never are. Pairs that haven't converged after :code:`maxiter` iterations are measured with :py:func:`haversine` instead, with a warning.
+
+    :param numpy.ndarray lat0: Latitudes of the first points in decimal degrees
+    :param numpy.ndarray lon0: Longitudes of the first points in decimal degrees
+    :param numpy.ndarray lat1: Latitudes of the second points in decimal degrees
+    :param numpy.ndarray lon1: Longitudes of the second points in decimal degrees
+    :param float tol: Convergence tolerance in radians. Defaults to 1e-12 (about 6 micrometers on the ground). Larger values take fewer iterations.
+    :param int maxiter: Maximum number of iterations. Defaults to 200.
+    :param float a: Semi-major axis of the ellipsoid in meters. Defaults to WGS84 (:py:data:`readgssi.constants.WGS84_A`).
+    :param float f: Flattening of the ellipsoid. Defaults to WGS84 (:py:data:`readgssi.constants.WGS84_F`).
+    :rtype: :py:class:`numpy.ndarray` of distances in meters
+    """
+    lat0, lon0, lat1, lon1 = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (lat0, lon0, lat1, lon1)))
+    b = a * (1 - f)
+    L = np.radians(lon1 - lon0)
+    U0 = np.arctan((1 - f) * np.tan(np.radians(lat0))) # reduced latitudes
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    sinU0, cosU0, sinU1, cosU1 = np.sin(U0), np.cos(U0), np.sin(U1), np.cos(U1)
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i in range(maxiter):
+            sinlam, coslam = np.sin(lam), np.cos(lam)
+            sinsig = np.hypot(cosU1 * sinlam, cosU0 * sinU1 - sinU0 * cosU1 * coslam)
+            cossig = sinU0 * sinU1 + cosU0 * cosU1 * coslam
+            sig = np.arctan2(sinsig, cossig)
+            sinalpha = np.where(sinsig == 0, 0., cosU0 * cosU1 * sinlam / sinsig)
+            cos2alpha = 1 - sinalpha**2
+            cos2sigm = np.where(cos2alpha == 0, 0., cossig - 2 * sinU0 * sinU1 / cos2alpha) # 0 on the equator
+            C = f / 16 * cos2alpha * (4 + f * (4 - 3 * cos2alpha))
+            prev = lam
+            lam = L + (1 - C) * f * sinalpha * (sig + C * sinsig * (cos2sigm + C * cossig * (-1 + 2 * cos2sigm**2)))
+            converged = np.abs(lam - prev) <= tol
+            if converged.all():
+                break
+        u2 = cos2alpha * (a**2 - b**2) / b**2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        dsig = B * sinsig * (cos2sigm + B / 4 * (cossig * (-1 + 2 * cos2sigm**2) -
+                                                 B / 6 * cos2sigm * (-3 + 4 * sinsig**2) * (-3 + 4 * cos2sigm**2)))
+        s = b * A * (sig - dsig)
+    if not converged.all():
+        fx.printmsg('WARNING: distance between %s pairs of points did not converge, using the spherical distance for them instead' % (np.count_nonzero(~converged)))
+        s = np.where(converged, s, haversine(lat0, lon0, lat1, lon1))
+    return s
+
+
+def segments(lat, lon, alt=None, method='vincenty', tol=1e-12):
+    """
+    The distance in meters between each pair of consecutive positions in a track. If altitudes are given, the change in altitude is included, i.e. each segment is :math:`\\sqrt{d^2 + \\Delta z^2}` where :math:`d` is the distance along the ellipsoid (or sphere).
+
+    :param numpy.ndarray lat: Latitudes in decimal degrees
+    :param numpy.ndarray lon: Longitudes in decimal degrees
+    :param numpy.ndarray alt: Altitudes in meters. Defaults to None, which ignores altitude.
+    :param str method: :code:`'vincenty'` (:py:func:`vincenty`, the default) or :code:`'haversine'` (:py:func:`haversine`)
+    :param float tol: Convergence tolerance for :py:func:`vincenty` in radians. Defaults to 1e-12.
+    :rtype: :py:class:`numpy.ndarray` (one shorter than the inputs)
+    :raises ValueError: if the method is unknown
+    """
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    if method == 'vincenty':
+        d = vincenty(lat[:-1], lon[:-1], lat[1:], lon[1:], tol=tol)
+    elif method == 'haversine':
+        d = haversine(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    else:
+        raise ValueError('unknown distance method "%s". available methods are: %s' % (method, ', '.join(METHODS)))
+    if alt is not None:
+        d = np.hypot(d, np.diff(np.asarray(alt, dtype=np.float64)))
+    return d
+
+
+def cumulative(lat, lon, alt=None, method='vincenty', tol=1e-12):
+    """
+    The distance in meters travelled along a track up to each position, starting at 0 (see :py:func:`segments`).
+
+    :param numpy.ndarray lat: Latitudes in decimal degrees
+    :param numpy.ndarray lon: Longitudes in decimal degrees
+    :param numpy.ndarray alt: Altitudes in meters. Defaults to None, which ignores altitude.
+    :param str method: :code:`'vincenty'` (the default) or :code:`'haversine'`
+    :param float tol: Convergence tolerance for :py:func:`vincenty` in radians. Defaults to 1e-12.
+    :rtype: :py:class:`numpy.ndarray` (the same length as the inputs)
+    """
+    return np.concatenate(([0.], np.cumsum(segments(lat, lon, alt=alt, method=method, tol=tol))))
@@ -2,7 +2,7 @@ import struct
 import math
 import os
 import numpy as np
-from pandas import DataFrame
+from pandas import DataFrame, to_datetime
 from datetime import datetime
 from itertools import takewhile
 from readgssi.gps import readdzg
@@ -36,27 +36,45 @@ def readtime(bytez):
     For more information on :code:`rfDateByte`, see page 55 of
     `GSSI's SIR 3000 manual <https://support.geophysical.com/gssiSupport/Products/Documents/Control%20Unit%20Manuals/GSSI%20-%20SIR-3000%20Operation%20Manual.pdf>`_.
 
-    :param bytes bytes: The :code:`rfDateByte` to be decoded
+    :param bytes bytes: The :code:`rfDateByte` to be decoded, either as four bytes or as the unsigned integer stored in the :code:`rhb_cdt` and :code:`rhb_mdt` fields of :py:data:`readgssi.constants.DZT_HEADER`
     :rtype: :py:class:`datetime.datetime`
     """
-    dtbits = ''
-    rfDateByte = (b for b in bytez)
-    for byte in rfDateByte:                    # assemble the binary string
-        for i in range(8):
-            dtbits += str((byte >> i) & 1)
-    dtbits = dtbits[::-1]               # flip the string
-    sec2 = int(dtbits[27:32], 2) * 2    # seconds are stored as seconds/2 because there's only 5 bytes to work with
-    mins = int(dtbits[21:27], 2)        # minutes
-    hr = int(dtbits[16:21], 2)          # hours
-    day = int(dtbits[11:16], 2)         # day
-    mo = int(dtbits[7:11], 2)           # month
-    yr = int(dtbits[0:7], 2) + 1980     # year, stored as 1980+(0:127)
+    if isinstance(bytez, (bytes, bytearray)):
+        bytez = struct.unpack('<I', bytez)[0]
+    yr, mo, day, hr, mins, sec2 = [int(v) for v in unpacktime(bytez)]
     return datetime(yr, mo, day, hr, mins, sec2, 0, tzinfo=pytz.UTC)
 
 
-def arraylist(header, data):
+def unpacktime(rfdate):
+    """
+    Decode the bitfields of one or many :code:`rfDateByte` integers with bit shifts (see :py:func:`readtime` for the layout). Works on a single integer or an array of them, so a whole catalog of headers can be decoded at once.
+
+    :param rfdate: :code:`rfDateByte` value(s) as unsigned 32-bit integers
+    :type rfdate: int or numpy.ndarray
+    :rtype: year, month, day, hour, minute, second (each the same shape as :code:`rfdate`)
+    """
+    rfdate = np.asarray(rfdate, dtype=np.uint32)
+    sec2 = (rfdate & 0x1f) * 2          # seconds are stored as seconds/2 because there's only 5 bits to work with
+    mins = (rfdate >> 5) & 0x3f         # minutes
+    hr = (rfdate >> 11) & 0x1f          # hours
+    day = (rfdate >> 16) & 0x1f         # day
+    mo = (rfdate >> 21) & 0x0f          # month
+    yr = (rfdate >> 25) + 1980          # year, stored as 1980+(0:127)
+    return yr, mo, day, hr, mins, sec2
+
+
+def arraylist(header, data, dtype=np.int32):
+    """
+    Split the stacked data block into a dictionary of per-channel arrays, slicing off time zero samples.
+
+    :param dict header: The file header dictionary
+    :param numpy.ndarray data: The transposed data block, :code:`rh_nchan*rh_nsamp` samples high
+    :param dtype: The dtype to convert to before splitting. If :py:data:`None`, each channel is returned as a view of :code:`data` in the file's native dtype (this is how memory-mapped reads avoid copying). If a floating point dtype such as :py:class:`numpy.float32`, the unsigned offset is removed in the same step (see :py:func:`convert`). Defaults to :py:class:`numpy.int32`.
+    :rtype: radar arrays by channel :py:class:`dict` {0: :py:class:`numpy.ndarray`, 1: :py:class:`numpy.ndarray`, etc.}
+    """
     # create a list of n arrays, where n is the number of channels
-    data = data.astype(np.int32)
+    if dtype != None:
+        data = convert(data, dtype=dtype, offset=unsigned_offset(header))
     chans = list(range(header['rh_nchan']))
 
     # set up list of arrays
@@ -71,35 +89,128 @@ def arraylist(header, data):
     return new_arr
 
 
-def readdzt(infile, gps=DataFrame(), spm=None, start_scan=0, num_scans=-1,
-            epsr=None, antfreq=[None,None,None,None], verbose=False,
-            zero=[None,None,None,None]):
+def unsigned_offset(header):
+    """
+    The value that samples are centered on in the file. 8 and 16 bit DZT data are stored as unsigned integers centered on :code:`0x80` and :code:`0x8000` respectively, while 32 bit data are signed and centered on zero.
+
+    :param dict header: The file header dictionary
+    :rtype: :py:class:`int`
+    """
+    if np.dtype(header['dtype']).kind == 'u':
+        return 2 ** (header['rh_bits'] - 1)
+    return 0
+
+
+def convert(ar, dtype=np.int32, offset=0):
     """
-    Function to unpack and return things the program needs from the file header, and the data itself.
+    Return a writable copy of a channel array in the dtype used for processing.
+
+    Arrays read with :code:`mmap=True` are read-only views of the file in its native dtype, so this is called just before the first filter that needs to modify the array.
+
+    If :code:`dtype` is a floating point type, :code:`offset` (see :py:func:`unsigned_offset`) is subtracted during the conversion, so that the array is centered on zero without making an intermediate integer copy. Working in :py:class:`numpy.float32` uses half the memory of :py:class:`numpy.float64`, which is what most filters would otherwise promote to.
+
+    :param numpy.ndarray ar: The radar array
+    :param dtype: The dtype to convert to. Defaults to :py:class:`numpy.int32`.
+    :param int offset: The value to subtract from floating point output. Defaults to 0.
+    :rtype: radar array (:py:class:`numpy.ndarray`)
+    """
+    dtype = np.dtype(dtype)
+    if (dtype.kind == 'f') and offset:
+        return np.subtract(ar, offset, dtype=dtype)
+    return np.array(ar, dtype=dtype)
+
+
+def tracewindow(header, start_scan=0, num_scans=-1):
+    """
+    Check a window of traces against the trace count in the header, and clip it to the extents of the file.
+
+    :param dict header: The file header dictionary, containing :code:`ntraces`
+    :param int start_scan: Zero-based first trace of the window. Defaults to 0.
+    :param int num_scans: Number of traces in the window. Defaults to -1, which reads from :code:`start_scan` to the end of the file.
+    :rtype: start_scan (:py:class:`int`), num_scans (:py:class:`int`)
+    """
+    try:
+        start_scan = int(start_scan)
+    except (TypeError, ValueError):
+        fx.printmsg('WARNING: invalid scan offset: %s (reading from start of data)' % (start_scan))
+        start_scan = 0
+    if start_scan < 0:
+        fx.printmsg('WARNING: negative scan offset: %s (reading from start of data)' % (start_scan))
+        start_scan = 0
+    if start_scan > header['ntraces']:
+        fx.printmsg('WARNING: scan offset %s is past the end of the file (%s traces)' % (start_scan, header['ntraces']))
+        start_scan = header['ntraces']
+    try:
+        num_scans = int(num_scans)
+    except (TypeError, ValueError):
+        fx.printmsg('WARNING: invalid number of scans: %s (reading all traces from scan %s)' % (num_scans, start_scan))
+        num_scans = -1
+    if (num_scans < 0) or (start_scan + num_scans > header['ntraces']):
+        num_scans = header['ntraces'] - start_scan
+    return start_scan, num_scans
+
+
+def readtraces(infile, header, start_scan=0, num_scans=-1, mmap=False):
+    """
+    Read a window of traces from the data block of a DZT without touching the rest of the file. The read seeks straight to :code:`data_offset + start_scan * trace_bytes`, where :code:`trace_bytes` is the size of one trace for all channels.
+
+    :param str infile: The DZT file location
+    :param dict header: The file header dictionary from :py:func:`readdzt`
+    :param int start_scan: Zero-based first trace to read. Defaults to 0.
+    :param int num_scans: Number of traces to read. Defaults to -1, which reads from :code:`start_scan` to the end of the file.
+    :param bool mmap: If :py:data:`True`, return a read-only :py:class:`numpy.memmap` view of the window instead of reading it. Defaults to False.
+    :rtype: transposed data block (:py:class:`numpy.ndarray`), :code:`rh_nchan*rh_nsamp` samples high
+    """
+    start_scan, num_scans = tracewindow(header, start_scan, num_scans)
+    tracesize = header['rh_nsamp'] * header['rh_nchan']
+    offset = header['data_offset'] + start_scan * header['trace_bytes']
+    if num_scans == 0:
+        data = np.zeros((0, tracesize), dtype=header['dtype'])
+    elif mmap:
+        # map the window instead of reading it. the transpose below is a view, so nothing is copied
+        data = np.memmap(infile, dtype=header['dtype'], mode='r', offset=offset, shape=(num_scans, tracesize))
+    else:
+        with open(infile, 'rb') as f:
+            f.seek(offset)
+            data = np.fromfile(f, header['dtype'], count=num_scans * tracesize)
+        data = data.reshape(-1, tracesize)
+    return data.T
+
+
+def readdzt_header(infile, spm=None, epsr=None, antfreq=[None,None,None,None], verbose=False,
+                   zero=[None,None,None,None]):
+    """
+    Function to unpack and return the file header of a DZT without reading the data, GPS, or DZX files. Only the :code:`MINHEADSIZE * rh_nchan` bytes of channel headers are decoded, and the trace count is derived from the file size, so this is a fast way to inventory large numbers of files. The header returned covers the whole file (:code:`start_scan=0`, :code:`num_scans=ntraces`).
+
+    Used by :py:func:`readdzt`, which also reads the data, GPS, and marks.
 
     :param str infile: The DZT file location
-    :param bool gps: Whether a GPS file exists. Defaults to False, but changed to :py:class:`pandas.DataFrame` if a DZG file with the same name as :code:`infile` exists.
     :param float spm: User value of samples per meter, if specified. Defaults to None.
     :param float epsr: User value of relative permittivity, if specified. Defaults to None.
+    :param list[int,int,int,int] antfreq: User values of antenna frequency, used where the antenna name is not recognized. Defaults to None.
     :param list[int,int,int,int] zero: List of time-zero values per channel. Defaults to a list of :code:`None` values, which resolves to :code:`rh_zero`.
     :param bool verbose: Verbose, defaults to False
-    :rtype: header (:py:class:`dict`), radar array (:py:class:`numpy.ndarray`), gps (False or :py:class:`pandas.DataFrame`)
+    :rtype: header (:py:class:`DZTHeader`)
     """
 
-    '''
-    currently unused but potentially useful lines:
-    # headerstruct = '<5h 5f h 4s 4s 7h 3I d I 3c x 3h d 2x 2c s s 14s s s 12s h 816s 76s' # the structure of the bytewise header and "gps data" as I understand it - 1024 bytes
-    # readsize = (2,2,2,2,2,4,4,4,4,4,2,4,4,4,2,2,2,2,2,4,4,4,8,4,3,1,2,2,2,8,1,1,14,1,1,12,2) # the variable size of bytes in the header (most of the time) - 128 bytes
-    # fx.printmsg('total header structure size: '+str(calcsize(headerstruct)))
-    # packed_size = 0
-    # for i in range(len(readsize)): packed_size = packed_size+readsize[i]
-    # fx.printmsg('fixed header size: '+str(packed_size)+'\\n')
-    '''
-    infile_gps = os.path.splitext(infile)[0] + ".DZG"
-    infile_dzx = os.path.splitext(infile)[0] + ".DZX"
-    infile = open(infile, 'rb')
-    header = {}
-    header['infile'] = infile.name
+    with open(infile, 'rb') as f:
+        buf = f.read(MINHEADSIZE)
+        nchan = int(np.frombuffer(buf, dtype=DZT_HEADER, count=1)['rh_nchan'][0])
+        buf += f.read(MINHEADSIZE * (nchan - 1)) # one 1024-byte header per channel
+        hdrs = np.frombuffer(buf, dtype=DZT_HEADER, count=nchan)
+        h = hdrs[0]
+        # range gain function is usually inside the header, but not necessarily
+        header = DZTHeader()
+        try:
+            if h['rh_rgain'] + h['rh_nrgain'] <= len(buf):
+                header['rgain_bytes'] = buf[h['rh_rgain']:h['rh_rgain'] + h['rh_nrgain']]
+            else:
+                f.seek(h['rh_rgain'])
+                header['rgain_bytes'] = f.read(h['rh_nrgain'])
+        except:
+            fx.printmsg('WARNING: Could not read range gain function')
+
+    header['infile'] = infile
     header['known_ant'] = [None, None, None, None]
     header['dzt_ant'] = [None, None, None, None]
     header['rh_ant'] = [None, None, None, None]
@@ -107,84 +218,61 @@ def readdzt(infile, gps=DataFrame(), spm=None, start_scan=0, num_scans=-1,
     header['antfreq'] = [None, None, None, None]
     header['timezero'] = [None, None, None, None]
 
-    # begin read
+    # integer and float fields come straight from the schema (see DZT_HEADER in constants.py)
+    for key in ('rh_tag', 'rh_data', 'rh_nsamp', 'rh_bits', 'rh_zero', 'rh_npass', 'rh_rgain', 'rh_nrgain',
+                'rh_text', 'rh_ntext', 'rh_proc', 'rh_nproc', 'rh_nchan', 'rh_accomp', 'rh_sconfig', 'rh_spp',
+                'rh_linenum'):
+        header[key] = int(h[key])
+    for key in ('rhf_sps', 'rhf_spm', 'rhf_mpm', 'rhf_position', 'rhf_range', 'rhf_top', 'rh_xstart', 'rh_xend',
+                'rhf_servo_level', 'rh_ystart', 'rh_yend'):
+        header[key] = float(h[key])
 
-    header['rh_tag'] = struct.unpack('<h', infile.read(2))[0] # 0x00ff if header, 0xfnff if old file format
-    header['rh_data'] = struct.unpack('<h', infile.read(2))[0] # offset to data from beginning of file
-    header['rh_nsamp'] = struct.unpack('<h', infile.read(2))[0] # samples per scan
-    header['rh_bits'] = struct.unpack('<h', infile.read(2))[0] # bits per data word
-    header['rh_zero'] = struct.unpack('<h', infile.read(2))[0] # if sir-30 or utilityscan df, then repeats per sample; otherwise 0x80 for 8bit and 0x8000 for 16bit
-    header['rhf_sps'] = struct.unpack('<f', infile.read(4))[0] # scans per second
     header['dzt_sps'] = header['rhf_sps']
-    header['rhf_spm'] = struct.unpack('<f', infile.read(4))[0] # scans per meter
     header['dzt_spm'] = header['rhf_spm']
     if spm:
         header['rhf_spm'] = spm
 
-    header['rhf_mpm'] = struct.unpack('<f', infile.read(4))[0] # meters per mark
-    header['rhf_position'] = struct.unpack('<f', infile.read(4))[0] # position (ns)
-    header['rhf_range'] = struct.unpack('<f', infile.read(4))[0] # range (ns)
-    header['rh_npass'] = struct.unpack('<h', infile.read(2))[0] # number of passes for 2-D files
-    # bytes 32-36 and 36-40: creation and modification date and time in bits
-    # structured as little endian u5u6u5u5u4u7
-    infile.seek(32)
+    # creation and modification date and time in bits, structured as little endian u5u6u5u5u4u7
     try:
-        header['rhb_cdt'] = readtime(infile.read(4))
+        header['rhb_cdt'] = readtime(h['rhb_cdt'])
     except:
         header['rhb_cdt'] = datetime(1980, 1, 1)
     try:
-        header['rhb_mdt'] = readtime(infile.read(4))
+        header['rhb_mdt'] = readtime(h['rhb_mdt'])
     except:
         header['rhb_mdt'] = datetime(1980, 1, 1)
-    header['rh_rgain'] = struct.unpack('<h', infile.read(2))[0] # offset to range gain function
-    header['rh_nrgain'] = struct.unpack('<h', infile.read(2))[0] # size of range gain function
-    infile.seek(header['rh_rgain'])
-    try:
-        header['rgain_bytes'] = infile.read(header['rh_nrgain'])
-    except:
-        fx.printmsg('WARNING: Could not read range gain function')
-    infile.seek(44)
-    header['rh_text'] = struct.unpack('<h', infile.read(2))[0] # offset to text
-    header['rh_ntext'] = struct.unpack('<h', infile.read(2))[0] # size of text
-    header['rh_proc'] = struct.unpack('<h', infile.read(2))[0] # offset to processing history
-    header['rh_nproc'] = struct.unpack('<h', infile.read(2))[0] # size of processing history
-    header['rh_nchan'] = struct.unpack('<h', infile.read(2))[0] # number of channels
+
+    header['dzt_epsr'] = float(h['rhf_epsr'])
     if epsr != None: # in this case the user has specified an epsr value
-        header['dzt_epsr'] = struct.unpack('<f', infile.read(4))[0]
         header['rhf_epsr'] = epsr
     else:
-        header['rhf_epsr'] = struct.unpack('<f', infile.read(4))[0] # epsr (sometimes referred to as "dielectric permittivity")
-        header['dzt_epsr'] = header['rhf_epsr']
+        header['rhf_epsr'] = header['dzt_epsr']
 
     # calculate relative wave celerity given epsr value(s)
     header['cr'] = 1 / math.sqrt(Mu_0 * Eps_0 * header['rhf_epsr'])
     header['cr_true'] = 1 / math.sqrt(Mu_0 * Eps_0 * header['dzt_epsr'])
 
-    header['rhf_top'] = struct.unpack('<f', infile.read(4))[0] # from experimentation, it seems this is the data top position in meters
-    header['dzt_depth'] = struct.unpack('<f', infile.read(4))[0] # range in meters based on DZT rhf_epsr, before subtracting rhf_top
+    header['dzt_depth'] = float(h['rhf_depth']) # range in meters based on DZT rhf_epsr, before subtracting rhf_top
     if (header['dzt_depth'] == 0):
         # if dzt depth is 0, we need to calculate it using cr and rhf_range (converted to seconds)
         header['dzt_depth'] = header['cr'] * (header['rhf_range'] * (10 ** (-10)))
 
     header['rhf_depth'] = header['dzt_depth'] * (math.sqrt(header['dzt_epsr']) / math.sqrt(header['rhf_epsr'])) # range based on user epsr, before subtracting rhf_top
 
-    # getting into largely useless territory (under "normal" operation)
-    header['rh_xstart'] = struct.unpack('<f', infile.read(4))[0] # starting x grid coordinate? part of rh_coordx
-    header['rh_xend'] = struct.unpack('<f', infile.read(4))[0] # ending x grid coordinate? part of rh_coordx
-    header['rhf_servo_level'] = struct.unpack('<f', infile.read(4))[0] # gain servo level
-    # 3 "reserved" bytes
-    infile.seek(81)
-    header['rh_accomp'] = struct.unpack('B', infile.read(1))[0] # Ant Conf component
-    header['rh_sconfig'] = struct.unpack('<h', infile.read(2))[0] # setup config number
-    header['rh_spp'] = struct.unpack('<h', infile.read(2))[0] # scans per pass
-    header['rh_linenum'] = struct.unpack('<h', infile.read(2))[0] # line number
-    header['rh_ystart'] = struct.unpack('<f', infile.read(4))[0] # starting y grid coordinate? part of rh_coordx
-    header['rh_yend'] = struct.unpack('<f', infile.read(4))[0] # ending y grid coordinate? part of rh_coordx
-    
-    header['rh_96'] = infile.read(1)
-    header['rh_lineorder'] = int('{0:08b}'.format(ord(header['rh_96']))[::-1][4:], 2)
-    header['rh_slicetype'] = int('{0:08b}'.format(ord(header['rh_96']))[::-1][:4], 2)
-    header['rh_dtype'] = infile.read(1) # no description of dtype
+    # single bytes are kept as bytes so they can be written back out unchanged
+    header['rh_96'] = bytes([h['rh_96']])
+    header['rh_dtype'] = bytes([h['rh_dtype']]) # no description of dtype
+    header['rh_112'] = bytes([h['rh_112']])
+    header['rh_lineorder'] = int(h['rh_112']) & 0x0f
+    header['rh_slicetype'] = int(h['rh_112']) >> 4
+    header['vsbyte'] = bytes([h['vsbyte']]) # byte containing versioning bits
+    header['rh_version'] = int(h['vsbyte']) & 0x07 # whether or not the system is GPS-capable, 1=no 2=yes (does not mean GPS is in file)
+    header['rh_system'] = int(h['vsbyte']) >> 3 # the system type (values in UNIT={...} dictionary in constants.py)
+    header['rh_name'] = h['rh_name'].tobytes()
+    header['rh_chksum'] = h['rh_chksum'].tobytes()
+    header['INFOAREA'] = h['INFOAREA'].tobytes()
+    header['rh_RGPS0'] = h['rh_RGPS0'].tobytes()
+    header['rh_RGPS1'] = h['rh_RGPS1'].tobytes()
 
     freq = [None, None, None, None]
     for i in range(header['rh_nchan']):
@@ -196,14 +284,9 @@ def readdzt(infile, gps=DataFrame(), spm=None, start_scan=0, num_scans=-1,
                 print('WARNING: due to an error, antenna %s frequency was set to 200 MHz' % (i))
                 print('Error detail: %s' % (e))
 
-    curpos = infile.tell()
     # read frequencies for multiple antennae
     for chan in list(range(header['rh_nchan'])):
-        if chan == 0:
-            infile.seek(98) # start of antenna section
-        else:
-            infile.seek(98 + (MINHEADSIZE*(chan))) # start of antenna bytes for channel n
-        header['dzt_ant'][chan] = infile.read(14)
+        header['dzt_ant'][chan] = hdrs[chan]['rh_ant'].tobytes()
         header['rh_ant'][chan] = header['dzt_ant'][chan].decode('utf-8').split('\x00')[0]
         header['rh_antname'][chan] = header['rh_ant'][chan].rsplit('x')[0]
         try:
@@ -217,21 +300,6 @@ def readdzt(infile, gps=DataFrame(), spm=None, start_scan=0, num_scans=-1,
                 header['antfreq'] = freq
             #header['antfreq'][chan] = int(header['rh_antname'][chan].replace('D5','').replace('D6',''))
 
-    infile.seek(curpos+14)
-    header['rh_112'] = infile.read(1)
-    header['rh_lineorder'] = int('{0:08b}'.format(ord(header['rh_112']))[4:], 2)
-    header['rh_slicetype'] = int('{0:08b}'.format(ord(header['rh_112']))[:4], 2)
-
-    #infile.seek(113) # byte 113
-    header['vsbyte'] = infile.read(1) # byte containing versioning bits
-    header['rh_version'] = int('{0:08b}'.format(ord(header['vsbyte']))[5:], 2) # ord(vsbyte) >> 5 # whether or not the system is GPS-capable, 1=no 2=yes (does not mean GPS is in file)
-    header['rh_system'] = int('{0:08b}'.format(ord(header['vsbyte']))[:5], 2) # ord(vsbyte) >> 3 ## the system type (values in UNIT={...} dictionary in constants.py)
-    header['rh_name'] = infile.read(12)
-    header['rh_chksum'] = infile.read(2)
-    header['INFOAREA'] = infile.read(MINHEADSIZE-PAREASIZE-GPSAREASIZE)
-    header['rh_RGPS0'] = infile.read(RGPSSIZE)
-    header['rh_RGPS1'] = infile.read(RGPSSIZE)
-
     if header['rh_system'] == 14:   # hardcoded because this is so frustrating. assuming no other antennas can be paired with SS Mini XT
         header['rh_antname'] = ['SSMINIXT', None, None, None]
         header['antfreq'] = [2700, None, None, None]
@@ -242,9 +310,6 @@ def readdzt(infile, gps=DataFrame(), spm=None, start_scan=0, num_scans=-1,
     else:
         header['data_offset'] = MINHEADSIZE * header['rh_nchan']
 
-    infile.seek(MINHEADSIZE * header['rh_nchan'])
-    header['header_extra'] = infile.read(header['data_offset'] - (MINHEADSIZE * header['rh_nchan']))
-
     if header['rh_bits'] == 8:
         dtype = np.uint8 # 8-bit unsigned
     elif header['rh_bits'] == 16:
@@ -253,45 +318,21 @@ def readdzt(infile, gps=DataFrame(), spm=None, start_scan=0, num_scans=-1,
         dtype = np.int32 # 32-bit signed
     header['dtype'] = dtype
     
-    if start_scan != 0:
-        try:
-            # calculate start offset in bytes:
-            start_offset = int(start_scan * header['rh_nchan'] * header['rh_nsamp'] * header['rh_bits']/8)
-        except ValueError:
-            # if this fails, then fall back to 0 offset.
-            start_offset = 0
-            fx.printmsg('WARNING: ValueError for scan offset: {start_scan} (reading from start of data)')
-            # consider returning No Data?
-    else:
-        start_offset = 0
-    
-    if num_scans != -1:
-        try:
-            num_items = int(num_scans * header['rh_nsamp']*header['rh_nchan'])
-        except ValueError:
-            # if this fails then get all scans...
-            fx.printmsg('WARNING: ValueError for number of scans: {num_scans} (reading all items from {start_scan} scans)')
-            num_items = -1
-    else:
-        num_items = -1
-            
-    # read in and transpose data
-    data = np.fromfile(infile, dtype, count=num_items)
-    data = data.reshape(-1,(header['rh_nsamp']*header['rh_nchan'])) # offset=start_offset,
-    data = data.T
-    header['shape'] = data.shape
+    # trace index: bytes per trace (all channels) and the number of complete traces in the file
+    header['trace_bytes'] = header['rh_nsamp'] * header['rh_nchan'] * np.dtype(dtype).itemsize
+    header['ntraces'] = int((os.path.getsize(infile) - header['data_offset']) / header['trace_bytes'])
+
+    header['start_scan'], header['num_scans'] = 0, header['ntraces']
+    header['shape'] = (header['rh_nchan'] * header['rh_nsamp'], header['ntraces'])
 
     header['ns_per_zsample'] = ((header['rhf_depth']-header['rhf_top']) * 2) / (header['rh_nsamp'] * header['cr'])
     header['samp_freq'] = 1 / ((header['dzt_depth'] * 2) / (header['rh_nsamp'] * header['cr_true']))
 
     try:
-        header['sec'] = data.shape[1]/float(header['rhf_sps'])
+        header['sec'] = header['shape'][1]/float(header['rhf_sps'])
     except ZeroDivisionError:
         header['sec'] = 1.
 
-    infile.close()
-
-
     for i in range(header['rh_nchan']):
         try:
             header['timezero'][i] = int(list(zero)[i])
@@ -299,6 +340,76 @@ def readdzt(infile, gps=DataFrame(), spm=None, start_scan=0, num_scans=-1,
             fx.printmsg('WARNING: no time zero specified for channel %s, defaulting to rh_zero value (%s)' % (i, header['rh_zero']))
             header['timezero'][i] = header['rh_zero']
 
+    header.snapshot(verbose=verbose)
+    return header
+
+
+class DZTHeader(dict):
+    """
+    The file header dictionary returned by :py:func:`readdzt` and :py:func:`readdzt_header`. It behaves like a normal :py:class:`dict`, except that the sidecar files are only read when something asks for them:
+
+    * :py:attr:`gps` reads the DZG (or CSV) the first time it is accessed (see :py:func:`readgps`)
+    * :code:`header['marks']` and :code:`header['picks']` read the DZX the first time either is accessed (see :py:func:`readmarks`)
+
+    Both are read using the header values as they were when the file was read (see :py:meth:`snapshot`), so stacking or distance normalization beforehand does not change the result. GPS parsing is often the slowest step in opening a file, so plot-only runs skip it entirely.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._gps = None
+        self._source = {}
+        self._verbose = False
+
+    def __missing__(self, key):
+        if key in ('marks', 'picks') and self._source:
+            marks, picks = readmarks(self._source, verbose=self._verbose)
+            self.setdefault('marks', marks)
+            self.setdefault('picks', picks)
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def copy(self):
+        new = DZTHeader(self)
+        new.__dict__.update(self.__dict__)
+        return new
+
+    def snapshot(self, verbose=False):
+        """
+        Record the current header values as the ones used to read GPS and marks later on.
+
+        :param bool verbose: Verbose, defaults to False
+        """
+        self._source = dict(self)
+        self._verbose = verbose
+
+    @property
+    def gps(self):
+        """
+        GPS record for the file (:py:class:`pandas.DataFrame`), read on first access. Empty if there is no GPS file.
+        """
+        if self._gps is None:
+            self._gps = readgps(self._source, verbose=self._verbose) if self._source else DataFrame()
+        return self._gps
+
+    @gps.setter
+    def gps(self, gps):
+        self._gps = gps
+
+
+def readgps(header, verbose=False):
+    """
+    Read the GPS file that goes with a DZT. Tries the DZG first, then a CSV with the same name.
+
+    :param dict header: The file header dictionary (must contain :code:`infile`)
+    :param bool verbose: Verbose, defaults to False
+    :rtype: GPS data (:py:class:`pandas.DataFrame`), empty if none could be read
+    """
+    infile_gps = os.path.splitext(header['infile'])[0] + ".DZG"
     if os.path.isfile(infile_gps):
         try:
             if verbose:
@@ -322,36 +433,192 @@ def readdzt(infile, gps=DataFrame(), spm=None, start_scan=0, num_scans=-1,
     else:
         fx.printmsg('WARNING: no DZG file found for GPS input')
         gps = DataFrame()
+    return gps
+
+
+def readmarks(header, verbose=False):
+    """
+    Read user marks and picks for the window of traces described by the header. Marks come from the DZX if there is one, otherwise from the second sample of each trace (where SIR 3000 units store them).
 
-    header['marks'] = []
-    header['picks'] = {}
+    :param dict header: The file header dictionary (must contain :code:`infile`, :code:`start_scan`, and :code:`num_scans`)
+    :param bool verbose: Verbose, defaults to False
+    :rtype: marks (:py:class:`list` of trace numbers relative to :code:`start_scan`), picks (:py:class:`dict`)
+    """
+    infile_dzx = os.path.splitext(header['infile'])[0] + ".DZX"
+    marks = []
+    picks = {}
 
     if os.path.isfile(infile_dzx):
-        header['marks'] = get_user_marks(infile_dzx, verbose=verbose)
-        header['picks'] = get_picks(infile_dzx, verbose=verbose)
+        marks = get_user_marks(infile_dzx, verbose=verbose)
+        picks = get_picks(infile_dzx, verbose=verbose)
+        # DZX marks are numbered from the start of the file, so shift them into the window that was read
+        marks = [m - header['start_scan'] for m in marks
+                 if header['start_scan'] <= m < header['start_scan'] + header['num_scans']]
     else:
         fx.printmsg('WARNING: could not find DZX file to read metadata. Trying to read array for marks...')
 
-        tnums = np.ndarray.tolist(data[0])  # the first row of the array is trace number
+        # only the first two samples of each trace are needed, so map the window rather than reading it
+        data = readtraces(header['infile'], header, header['start_scan'], header['num_scans'], mmap=True)
         usr_marks = np.ndarray.tolist(data[1])  # when the system type is SIR3000, the second row should be user marks (otherwise these are in the DZX, see note below)
         i = 0
         for m in usr_marks:
             if m > 0:
                 #print(m)
-                header['marks'].append(i)
+                marks.append(i)
             i += 1
-        if len(header['marks']) == header['shape'][1]:
-            fx.printmsg('number of marks matches the number of traces (%s). this is probably wrong, so throwing out the mark list.' % (len(header['marks'])))
-            header['marks'] = []
+        if len(marks) == data.shape[1]:
+            fx.printmsg('number of marks matches the number of traces (%s). this is probably wrong, so throwing out the mark list.' % (len(marks)))
+            marks = []
         else:
-            fx.printmsg('DZT marks read successfully. marks: %s' % len(header['marks']))
-            fx.printmsg('                            traces: %s' % header['marks'])
+            fx.printmsg('DZT marks read successfully. marks: %s' % len(marks))
+            fx.printmsg('                            traces: %s' % marks)
+    return marks, picks
+
+
+def readdzt(infile, gps=DataFrame(), spm=None, start_scan=0, num_scans=-1,
+            epsr=None, antfreq=[None,None,None,None], verbose=False,
+            zero=[None,None,None,None], mmap=False, dtype=np.int32, lazy=False):
+    """
+    Function to unpack and return things the program needs from the file header, and the data itself. To read only the header, use :py:func:`readdzt_header`.
+
+    :param str infile: The DZT file location
+    :param bool gps: Whether a GPS file exists. Defaults to False, but changed to :py:class:`pandas.DataFrame` if a DZG file with the same name as :code:`infile` exists.
+    :param float spm: User value of samples per meter, if specified. Defaults to None.
+    :param int start_scan: Zero-based first trace to read. Defaults to 0. See :py:func:`readtraces`.
+    :param int num_scans: Number of traces to read. Defaults to -1, which reads from :code:`start_scan` to the end of the file.
+    :param float epsr: User value of relative permittivity, if specified. Defaults to None.
+    :param list[int,int,int,int] zero: List of time-zero values per channel. Defaults to a list of :code:`None` values, which resolves to :code:`rh_zero`.
+    :param bool mmap: If :py:data:`True`, map the data block into memory with :py:class:`numpy.memmap` instead of reading it. Each channel is then a strided, read-only view of the file in its native dtype, which allows files larger than RAM to be opened. Use :py:func:`convert` to get a writable copy for processing. Defaults to False.
+    :param dtype: Working precision of the returned arrays (ignored if :code:`mmap=True`). Defaults to :py:class:`numpy.int32`. Use :py:class:`numpy.float32` for zero-centered data at half the memory of the :py:class:`numpy.float64` that filters would otherwise produce (see :py:func:`convert`).
+    :param bool lazy: If :py:data:`True`, don't read the GPS and DZX files now. They will be read when :code:`header.gps` or :code:`header['marks']` is first accessed (see :py:class:`DZTHeader`), and :py:data:`None` is returned in place of the GPS record. Defaults to False.
+    :param bool verbose: Verbose, defaults to False
+    :rtype: header (:py:class:`DZTHeader`), radar array (:py:class:`numpy.ndarray`), gps (:py:data:`None` or :py:class:`pandas.DataFrame`)
+    """
+    header = readdzt_header(infile, spm=spm, epsr=epsr, antfreq=antfreq, zero=zero, verbose=verbose)
+
+    # bytes between the channel headers and the data are only needed to write the file back out
+    with open(infile, 'rb') as f:
+        f.seek(MINHEADSIZE * header['rh_nchan'])
+        header['header_extra'] = f.read(header['data_offset'] - (MINHEADSIZE * header['rh_nchan']))
+
+    # read in and transpose data
+    header['start_scan'], header['num_scans'] = tracewindow(header, start_scan, num_scans)
+    if verbose and ((header['start_scan'] != 0) or (header['num_scans'] != header['ntraces'])):
+        fx.printmsg('reading traces %s to %s of %s' % (header['start_scan'], header['start_scan'] + header['num_scans'],
+                                                       header['ntraces']))
+    data = readtraces(infile, header, header['start_scan'], header['num_scans'], mmap=mmap)
+    header['shape'] = data.shape
+
+    try:
+        header['sec'] = data.shape[1]/float(header['rhf_sps'])
+    except ZeroDivisionError:
+        header['sec'] = 1.
+
+    # GPS and marks are read from the sidecar files on first access (see DZTHeader)
+    header.snapshot(verbose=verbose)
+    if lazy:
+        gps = None
+    else:
+        gps = header.gps
+        header['marks']
 
     # make a list of data by channel
-    data = arraylist(header, data) 
+    if mmap:
+        data = arraylist(header, data, dtype=None)
+    else:
+        data = arraylist(header, data, dtype=dtype)
 
     return [header, data, gps]
 
+def iter_traces(infile, chunk=1024, overlap=0, start_scan=0, num_scans=-1, dtype=np.int32, mmap=False,
+                spm=None, epsr=None, antfreq=[None,None,None,None], verbose=False, zero=[None,None,None,None]):
+    """
+    Generator that reads a DZT in blocks of :code:`chunk` traces, so that profiles of any length can be processed in bounded memory. Each block is padded with up to :code:`overlap` traces on either side (fewer at the ends of the window), which lets windowed operations like background removal or stacking produce seamless output: process the whole padded block, then keep only the :code:`core` slice.
+
+    ::
+
+        from readgssi.dzt import iter_traces
+
+        for header, block, data in iter_traces('FILE__001.DZT', chunk=2048, overlap=100):
+            ar = data[0][:,block['core']] # channel 0, without the overlap
+            print(block['start'], block['stop'], ar.shape)
+
+    :param str infile: The DZT file location
+    :param int chunk: Number of new traces per block. Defaults to 1024.
+    :param int overlap: Number of traces to pad each side of the block with. Defaults to 0.
+    :param int start_scan: Zero-based first trace to read. Defaults to 0.
+    :param int num_scans: Number of traces to read. Defaults to -1, which reads from :code:`start_scan` to the end of the file.
+    :param dtype: The dtype to convert each block to. If :py:data:`None`, blocks are returned in the file's native dtype. Defaults to :py:class:`numpy.int32`.
+    :param bool mmap: If :py:data:`True`, blocks are mapped rather than read (see :py:func:`readtraces`). Defaults to False.
+    :param float spm: User value of samples per meter, passed to :py:func:`readdzt_header`
+    :param float epsr: Epsilon_r, passed to :py:func:`readdzt_header`
+    :param list[int,int,int,int] antfreq: Antenna frequencies, passed to :py:func:`readdzt_header`
+    :param bool verbose: Verbose, defaults to False
+    :param list[int,int,int,int] zero: Time zero per channel, passed to :py:func:`readdzt_header`
+    :rtype: generator of (header (:py:class:`dict`), block (:py:class:`dict`), data (:py:class:`dict` of per-channel :py:class:`numpy.ndarray`)). :code:`block` contains the absolute trace indices :code:`start` and :code:`stop` of the new traces, :code:`first` and :code:`last` of the padded block, and :code:`core`, the :py:class:`slice` of the block's columns that holds the new traces.
+    """
+    header = readdzt_header(infile, spm=spm, epsr=epsr, antfreq=antfreq, verbose=verbose, zero=zero)
+    start_scan, num_scans = tracewindow(header, start_scan, num_scans)
+    header['start_scan'], header['num_scans'] = start_scan, num_scans
+    chunk, overlap = max(int(chunk), 1), max(int(overlap), 0)
+    end_scan = start_scan + num_scans
+    if verbose:
+        fx.printmsg('reading traces %s-%s in blocks of %s (overlap %s)' % (start_scan, end_scan, chunk, overlap))
+
+    for start in range(start_scan, end_scan, chunk):
+        stop = min(start + chunk, end_scan)
+        first = max(start - overlap, start_scan)
+        last = min(stop + overlap, end_scan)
+        data = readtraces(infile, header, start_scan=first, num_scans=last - first, mmap=mmap)
+        block = {
+            'start': start,
+            'stop': stop,
+            'first': first,
+            'last': last,
+            'core': slice(start - first, stop - first),
+        }
+        yield header, block, arraylist(header, data, dtype=dtype)
+
+
+def readdzt_catalog(infiles):
+    """
+    Decode the channel 0 header of many DZT files in one pass. The first :code:`MINHEADSIZE` bytes of each file are concatenated and decoded with a single :py:func:`numpy.frombuffer` call using :py:data:`readgssi.constants.DZT_HEADER`, and derived values (dates, system, trace count) are computed on whole columns. Useful for building an inventory of a survey.
+
+    :param list infiles: DZT file locations
+    :rtype: :py:class:`pandas.DataFrame` with one row per file
+    """
+    buf = bytearray()
+    sizes = []
+    for infile in infiles:
+        with open(infile, 'rb') as f:
+            buf += f.read(MINHEADSIZE).ljust(MINHEADSIZE, b'\x00')
+        sizes.append(os.path.getsize(infile))
+    hdrs = np.frombuffer(bytes(buf), dtype=DZT_HEADER, count=len(infiles))
+    sizes = np.array(sizes)
+
+    cat = DataFrame({'infile': list(infiles)})
+    for key in ('rh_nchan', 'rh_nsamp', 'rh_bits', 'rh_zero', 'rhf_sps', 'rhf_spm', 'rhf_range', 'rhf_epsr',
+                'rhf_top', 'rhf_depth'):
+        cat[key] = hdrs[key]
+    cat['rh_system'] = hdrs['vsbyte'] >> 3
+    cat['system'] = [UNIT.get(v, 'unknown system type') for v in cat['rh_system']]
+    cat['rh_version'] = hdrs['vsbyte'] & 0x07
+    cat['rh_ant'] = [a.tobytes().decode('utf-8', errors='replace').split('\x00')[0] for a in hdrs['rh_ant']]
+    for key in ('rhb_cdt', 'rhb_mdt'):
+        yr, mo, day, hr, mins, sec2 = unpacktime(hdrs[key])
+        cat[key] = to_datetime(DataFrame({'year': yr, 'month': mo, 'day': day, 'hour': hr,
+                                          'minute': mins, 'second': sec2}), errors='coerce', utc=True)
+    nchan = np.maximum(hdrs['rh_nchan'].astype(np.int64), 1)
+    data_offset = np.where(hdrs['rh_data'] < MINHEADSIZE, MINHEADSIZE * hdrs['rh_data'].astype(np.int64),
+                           MINHEADSIZE * nchan)
+    itemsize = np.where(hdrs['rh_bits'] == 8, 1, np.where(hdrs['rh_bits'] == 16, 2, 4))
+    trace_bytes = np.maximum(hdrs['rh_nsamp'].astype(np.int64) * nchan * itemsize, 1)
+    cat['data_offset'] = data_offset
+    cat['ntraces'] = np.maximum(sizes - data_offset, 0) // trace_bytes
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cat['sec'] = np.where(cat['rhf_sps'] > 0, cat['ntraces'] / cat['rhf_sps'], np.nan)
+    return cat
+
 def readdzt_gprpy(infile):
     r = readdzt(infile)
     data = r[1]
@@ -415,5 +682,8 @@ def header_info(header, data):
     fx.printmsg('"rhf_depth":        %.1f m' % header['rhf_depth'])
     fx.printmsg('offset to data:     %i bytes' % header['data_offset'])
     fx.printmsg('traces:             %i' % int(header['shape'][1]/header['rh_nchan']))
+    if header['num_scans'] != header['ntraces']:
+        fx.printmsg('trace window:       %i to %i of %i' % (header['start_scan'], header['start_scan'] + header['num_scans'],
+                                                          header['ntraces']))
     fx.printmsg('seconds:            %.8f' % (header['sec']))
     fx.printmsg('array dimensions:   %i x %i' % (header['shape'][0], header['shape'][1]))
@@ -1,6 +1,8 @@
 import numpy as np
-from scipy.ndimage.filters import uniform_filter1d
-from scipy.signal import firwin, lfilter
+from functools import lru_cache
+from scipy.ndimage import uniform_filter1d
+from scipy.signal import firwin, butter, sosfilt
+from scipy.fft import rfft, irfft, next_fast_len
 import readgssi.functions as fx
 
 """
@@ -8,13 +10,16 @@ Mathematical filtering routines for array manipulation
 Written in part by François-Xavier Simon (@fxsimon)
 """
 
-def bgr(ar, header, win=0, verbose=False):
+def bgr(ar, header, win=0, threads=1, verbose=False):
     """
     Horizontal background removal (BGR). Subtracts off row averages for full-width or window-length slices. For usage see :ref:`Getting rid of horizontal noise`.
 
+    The array is modified in place. To remove the background from an array that is read in blocks of traces, see :py:func:`bgr_stream`.
+
     :param numpy.ndarray ar: The radar array
     :param dict header: The file header dictionary
     :param int win: The window length to process. 0 resolves to full-width, whereas positive integers dictate the window size in post-stack traces.
+    :param int threads: Number of threads. Rows are split between threads (see :py:func:`readgssi.functions.blockmap`). Defaults to 1.
     :rtype: :py:class:`numpy.ndarray`
     """
     if (int(win) > 1) & (int(win) < ar.shape[1]):
@@ -24,60 +29,171 @@ def bgr(ar, header, win=0, verbose=False):
         how = 'full only'
     if verbose:
         fx.printmsg('removing horizontal background using method=%s...' % (how))
-    i = 0
-    for row in ar:          # each row
-        mean = np.mean(row)
-        ar[i] = row - mean
-        i += 1
     if how != 'full only':
         if window < 10:
             fx.printmsg('WARNING: BGR window size is very short. be careful, this may obscure horizontal layering')
-        if window < 3:
-            window = 3
-        elif (window / 2. == int(window / 2)):
-            window = window + 1
-        ar -= uniform_filter1d(ar, size=window, mode='constant', cval=0, axis=1)
+        window = bgrwindow(window)
+
+    def rowblock(ar):
+        # subtract each row's mean (integer arrays are truncated, the same as assigning floats to them would)
+        np.subtract(ar, ar.mean(axis=1, keepdims=True), out=ar, casting='unsafe')
+        if how != 'full only':
+            # filter a block of rows at a time, so that the moving average is never as large as the array
+            rows = max(1, 2**22 // ar.shape[1])
+            for i in range(0, ar.shape[0], rows):
+                ar[i:i+rows] -= uniform_filter1d(ar[i:i+rows], size=window, mode='constant', cval=0, axis=1)
+        return ar
+
+    return fx.blockmap(rowblock, ar, threads=threads, axis=0)
+
+def bgrwindow(win):
+    """
+    The boxcar window length that a BGR window of :code:`win` traces resolves to: an odd number of at least 3.
+
+    :param int win: The requested window length
+    :rtype: :py:class:`int`
+    """
+    window = int(win)
+    if window < 3:
+        window = 3
+    elif (window / 2. == int(window / 2)):
+        window = window + 1
+    return window
+
+def bgr_stream(ar, state=None, win=0, final=False, verbose=False):
+    """
+    Streaming horizontal background removal, for arrays that are read or recorded in blocks of traces (see :py:func:`readgssi.dzt.iter_traces` and :py:func:`readgssi.readgssi.watch`). Only a running sum per row and a window's worth of traces are kept between blocks, so the whole line is never held in memory. Call this once per block, passing back the returned state, then once with :code:`final=True`: ::
+
+        from readgssi.dzt import iter_traces
+        from readgssi.filtering import bgr_stream
+
+        state = None
+        for header, block, data in iter_traces('FILE__001.DZT', chunk=2048):
+            out, state = bgr_stream(data[0], state, win=75)
+            # do something with out
+        out, state = bgr_stream(None, state, final=True)
+
+    With :code:`win=0`, each trace has the running mean of the line up to and including it subtracted, so there is no delay, and the mean approaches the full-width mean of :py:func:`bgr` as the line gets longer.
 
-    return ar
+    With a window, each trace has the mean of the :code:`win` traces centered on it subtracted. This needs :code:`win//2` traces of look-ahead, so output lags input by that many traces, and the rest are returned by the final call. Away from the ends of the line the result is the same as :py:func:`bgr`; at the ends the window is shortened rather than padded with zeros.
 
-def dewow(ar, verbose=False):
+    :param numpy.ndarray ar: The next block of traces, or :py:data:`None` on the final call
+    :param dict state: The state returned by the previous call. Defaults to None (start of the line).
+    :param int win: The window length, used on the first call. 0 resolves to a running full-width mean, whereas positive integers dictate the window size in traces.
+    :param bool final: Whether this is the last call, which returns the traces held back for look-ahead. Defaults to False.
+    :param bool verbose: Verbose, defaults to False
+    :rtype: background-removed traces (:py:class:`numpy.ndarray`), state (:py:class:`dict`)
+    """
+    if state == None:
+        window = bgrwindow(win) if int(win) > 1 else 0
+        state = {'win': window, 'rows': None, 'dtype': None, 'sum': None, 'count': 0, 'hist': None, 'pend': None}
+        if verbose:
+            fx.printmsg('removing horizontal background using method=%s (streaming)...'
+                        % ('boxcar (%s trace window)' % window if window else 'running mean'))
+    if ar is not None:
+        state['rows'], state['dtype'] = ar.shape[0], ar.dtype
+    empty = np.zeros((state['rows'] or 0, 0), dtype=state['dtype'] or np.float64)
+    window = state['win']
+
+    if not window:
+        if (ar is None) or (ar.shape[1] == 0):
+            return empty, state
+        # running mean of each row, including the traces in this block
+        csum = np.cumsum(ar, axis=1, dtype=np.float64)
+        if state['sum'] is not None:
+            csum += state['sum'][:,None]
+        count = state['count'] + np.arange(1, ar.shape[1] + 1)
+        state['sum'], state['count'] = csum[:,-1].copy(), count[-1]
+        csum /= count
+        return np.subtract(ar, csum, out=csum).astype(state['dtype'], copy=False), state
+
+    half = window // 2
+    pend = state['pend']
+    if ar is not None:
+        pend = ar if pend is None else np.concatenate((pend, ar), axis=1)
+    if pend is None:
+        return empty, state
+    nout = pend.shape[1] if final else max(pend.shape[1] - half, 0)
+    if nout == 0:
+        state['pend'] = pend
+        return empty, state
+    # traces already returned are kept as the left side of the window
+    ext = pend if state['hist'] is None else np.concatenate((state['hist'], pend), axis=1)
+    h = ext.shape[1] - pend.shape[1]
+    csum = np.zeros((ext.shape[0], ext.shape[1] + 1), dtype=np.float64)
+    np.cumsum(ext, axis=1, out=csum[:,1:])
+    j = np.arange(h, h + nout)
+    lo, hi = np.maximum(j - half, 0), np.minimum(j + half + 1, ext.shape[1])
+    out = np.subtract(ext[:,h:h+nout], (csum[:,hi] - csum[:,lo]) / (hi - lo))
+    state['hist'] = ext[:,max(h + nout - half, 0):h+nout].copy()
+    state['pend'] = pend[:,nout:].copy()
+    return out.astype(state['dtype'], copy=False), state
+
+def dewow(ar, order=3, win=None, threads=1, verbose=False):
     """
-    Polynomial dewow filter. Written by fxsimon.
-    
-    .. warning:: This filter is still experimental.
+    Dewow filter. Removes the low-frequency trend ("wow") from each trace, either by subtracting a least-squares polynomial fit or a running mean.
+
+    The polynomial fit is a projection onto the first :code:`order+1` polynomials, which depends only on the trace length. Its pseudo-inverse is computed once per trace length and order (see :py:func:`dewowoperator`), and then applied to every trace in one matrix multiplication. The running mean is a :py:func:`scipy.ndimage.uniform_filter1d` down each trace.
+
+    The array is modified in place. Floating point arrays keep their precision (float32 stays float32); integer arrays are truncated, the same as assigning floats to them would.
 
     :param numpy.ndarray ar: The radar array
+    :param int order: The order of the polynomial trend. Defaults to 3 (cubic).
+    :param int win: If set, subtract a running mean of this many samples instead of a polynomial. Defaults to None.
+    :param int threads: Number of threads. Traces are split between threads (see :py:func:`readgssi.functions.blockmap`). Defaults to 1.
     :param bool verbose: Verbose, default is False
     :rtype: :py:class:`numpy.ndarray`
     """
-    fx.printmsg('WARNING: dewow filter is experimental')
+    dtype = ar.dtype if ar.dtype.kind == 'f' else np.dtype(np.float64)
     if verbose:
-        fx.printmsg('dewowing data...')
-    signal = list(zip(*ar))[10]
-    model = np.polyfit(range(len(signal)), signal, 3)
-    predicted = list(np.polyval(model, range(len(signal))))
-    i = 0
-    for column in ar.T:      # each column
-        ar.T[i] = column + predicted
-        i += 1
-    return ar
+        if win:
+            fx.printmsg('dewowing data (%s sample running mean)...' % (int(win)))
+        else:
+            fx.printmsg('dewowing data (order %s polynomial)...' % (order))
+    if not win:
+        vander, pinv = dewowoperator(ar.shape[0], order)
+        vander, pinv = vander.astype(dtype), pinv.astype(dtype)
+
+    def traces(ar):
+        if win:
+            trend = uniform_filter1d(ar, size=int(win), axis=0, mode='nearest', output=dtype)
+        else:
+            trend = vander @ (pinv @ ar.astype(dtype, copy=False))
+        np.subtract(ar, trend, out=ar, casting='unsafe')
+        return ar
+
+    return fx.blockmap(traces, ar, threads=threads)
+
+@lru_cache(maxsize=16)
+def dewowoperator(nsamp, order=3):
+    """
+    The least-squares operator used by :py:func:`dewow` to fit a polynomial to traces of :code:`nsamp` samples. The polynomial trend of a trace (or of every column of an array) is :code:`vander @ (pinv @ trace)`. Sample positions are scaled to [-1, 1] to keep the fit well conditioned. Results are cached, so this is only computed once per trace length.
+
+    :param int nsamp: The number of samples per trace
+    :param int order: The order of the polynomial. Defaults to 3.
+    :rtype: Vandermonde matrix (:py:class:`numpy.ndarray`, :code:`nsamp` x :code:`order+1`), its pseudo-inverse (:py:class:`numpy.ndarray`, :code:`order+1` x :code:`nsamp`)
+    """
+    vander = np.vander(np.linspace(-1, 1, nsamp), order + 1)
+    pinv = np.linalg.pinv(vander)
+    vander.flags.writeable, pinv.flags.writeable = False, False # shared between calls
+    return vander, pinv
 
-def bp(ar, header, freqmin, freqmax, zerophase=True, verbose=False):
+def bp(ar, header, freqmin, freqmax, zerophase=True, corners=1, threads=1, verbose=False):
     """
-    Vertical butterworth bandpass. This filter is not as effective as :py:func:`triangular` and thus is not available through the command line interface or through :py:func:`readgssi.readgssi.readgssi`.
+    Vertical butterworth bandpass. Available from the command line with :bash:`--filtertype butterworth` or through :py:func:`readgssi.readgssi.readgssi` with :py:data:`filtertype='butterworth'`. Results tend to be less clean than those of :py:func:`triangular`, which is the default.
 
-    Filter design and implementation are dictated by :py:func:`obspy.signal.filter.bandpass`.
+    The filter is designed once as second-order sections (see :py:func:`butterworth`) and applied to all traces at once with :py:func:`scipy.signal.sosfilt` along the sample axis. The zero phase filter is run forwards and then backwards, the same as :py:func:`obspy.signal.filter.bandpass`, which this function used to call once per trace.
 
     :param np.ndarray ar: The radar array
     :param dict header: The file header dictionary
     :param int freqmin: The lower corner of the bandpass
     :param int freqmax: The upper corner of the bandpass
     :param bool zerophase: Whether to run the filter forwards and backwards in order to counteract the phase shift
+    :param int corners: The filter order. Defaults to 1.
+    :param int threads: Number of threads. Traces are split between threads (see :py:func:`readgssi.functions.blockmap`). Defaults to 1.
     :param bool verbose: Verbose, defaults to False
     :rtype: :py:class:`numpy.ndarray`
     """
-    from obspy.signal.filter import bandpass
-
     if verbose:
         fx.printmsg('vertical butterworth bandpass filter')
         fx.printmsg('NOTE: better results are achieved with readgssi.filtering.triangular()')
@@ -85,27 +201,52 @@ def bp(ar, header, freqmin, freqmax, zerophase=True, verbose=False):
     samp_freq = header['samp_freq']
     freqmin = freqmin * 10 ** 6
     freqmax = freqmax * 10 ** 6
-    
-    corners = 1
 
     if verbose:
         fx.printmsg('sampling frequency:       %.2E Hz' % samp_freq)
         fx.printmsg('minimum filter frequency: %.2E Hz' % freqmin)
         fx.printmsg('maximum filter frequency: %.2E Hz' % freqmax)
         fx.printmsg('corners: %s, zerophase: %s' % (corners, zerophase))
-    
-    i = 0
-    for t in ar.T:
-        f = bandpass(data=t, freqmin=freqmin, freqmax=freqmax, df=samp_freq, corners=corners, zerophase=zerophase)
-        ar[:,i] = f
-        i += 1
-    return ar
 
-def triangular(ar, header, freqmin, freqmax, zerophase=True, verbose=False):
+    # keep floating point arrays (e.g. float32) in their own precision rather than promoting to float64
+    sos = butterworth(samp_freq, freqmin, freqmax, corners).astype(ar.dtype if ar.dtype.kind == 'f' else np.float64)
+
+    def traces(ar):
+        far = sosfilt(sos, ar, axis=0)
+        if zerophase:
+            far = sosfilt(sos, far[::-1], axis=0)[::-1]
+        return far
+
+    return fx.blockmap(traces, ar, threads=threads)
+
+@lru_cache(maxsize=32)
+def butterworth(samp_freq, freqmin, freqmax, corners=1):
+    """
+    Design a butterworth bandpass as second-order sections for :py:func:`bp`. Designs are cached, so a filter is only designed once per set of values. As in :py:func:`obspy.signal.filter.bandpass`, a highpass is designed instead if :code:`freqmax` is above the Nyquist frequency.
+
+    :param float samp_freq: The sampling frequency in Hz
+    :param float freqmin: The lower corner in Hz
+    :param float freqmax: The upper corner in Hz
+    :param int corners: The filter order. Defaults to 1.
+    :rtype: second-order sections (:py:class:`numpy.ndarray`)
+    """
+    nyquist = 0.5 * samp_freq
+    if freqmin >= nyquist:
+        raise ValueError('minimum filter frequency (%.2E Hz) is above the Nyquist frequency (%.2E Hz)' % (freqmin, nyquist))
+    if freqmax >= nyquist:
+        fx.printmsg('WARNING: maximum filter frequency (%.2E Hz) is above the Nyquist frequency (%.2E Hz). applying a highpass instead.' % (freqmax, nyquist))
+        sos = butter(corners, freqmin, btype='highpass', fs=samp_freq, output='sos')
+    else:
+        sos = butter(corners, [freqmin, freqmax], btype='bandpass', fs=samp_freq, output='sos')
+    sos.flags.writeable = False # shared between calls
+    return sos
+
+def triangular(ar, header, freqmin, freqmax, zerophase=True, numtaps=25, window='triangle', workers=None,
+               threads=1, verbose=False):
     """
     Vertical triangular FIR bandpass. This filter is designed to closely emulate that of RADAN.
 
-    Filter design is implemented by :py:func:`scipy.signal.firwin` with :code:`numtaps=25` and implemented with :py:func:`scipy.signal.lfilter`.
+    Filter design is implemented by :py:func:`scipy.signal.firwin` (see :py:func:`firtaps`, which caches designs) and applied in the frequency domain by :py:func:`firfilter`.
 
     .. note:: This function is not compatible with scipy versions prior to 1.3.0.
 
@@ -113,7 +254,11 @@ def triangular(ar, header, freqmin, freqmax, zerophase=True, verbose=False):
     :param dict header: The file header dictionary
     :param int freqmin: The lower corner of the bandpass
     :param int freqmax: The upper corner of the bandpass
-    :param bool zerophase: Whether to run the filter forwards and backwards in order to counteract the phase shift
+    :param bool zerophase: Whether to apply the filter forwards and backwards in order to counteract the phase shift
+    :param int numtaps: The length of the filter. Defaults to 25. Longer filters have sharper corners, and cost about the same to apply.
+    :param str window: The window used to design the filter (see :py:func:`scipy.signal.get_window`). Defaults to 'triangle'.
+    :param int workers: Number of threads to use for each FFT (see :py:func:`scipy.fft.rfft`). Defaults to None (one thread).
+    :param int threads: Number of threads. Traces are split between threads (see :py:func:`readgssi.functions.blockmap`). Defaults to 1.
     :param bool verbose: Verbose, defaults to False
     :rtype: :py:class:`numpy.ndarray`
     """
@@ -123,8 +268,6 @@ def triangular(ar, header, freqmin, freqmax, zerophase=True, verbose=False):
     samp_freq = header['samp_freq']
     freqmin = freqmin * 10 ** 6
     freqmax = freqmax * 10 ** 6
-    
-    numtaps = 25
 
     if verbose:
         fx.printmsg('sampling frequency:       %.2E Hz' % samp_freq)
@@ -132,10 +275,55 @@ def triangular(ar, header, freqmin, freqmax, zerophase=True, verbose=False):
         fx.printmsg('maximum filter frequency: %.2E Hz' % freqmax)
         fx.printmsg('numtaps: %s, zerophase: %s' % (numtaps, zerophase))
 
-    filt = firwin(numtaps=numtaps, cutoff=[freqmin, freqmax], window='triangle', pass_zero='bandpass', fs=samp_freq)
+    taps = firtaps(samp_freq, freqmin, freqmax, numtaps=numtaps, window=window)
+    return fx.blockmap(lambda ar: firfilter(ar, taps, zerophase=zerophase, workers=workers), ar, threads=threads)
+
+@lru_cache(maxsize=32)
+def firtaps(samp_freq, freqmin, freqmax, numtaps=25, window='triangle'):
+    """
+    Design a bandpass FIR filter with :py:func:`scipy.signal.firwin`. Designs are cached, so a filter is only designed once per set of values.
+
+    :param float samp_freq: The sampling frequency in Hz
+    :param float freqmin: The lower corner in Hz
+    :param float freqmax: The upper corner in Hz
+    :param int numtaps: The length of the filter. Defaults to 25.
+    :param str window: The window to design the filter with. Defaults to 'triangle'.
+    :rtype: filter taps (:py:class:`numpy.ndarray`)
+    """
+    taps = firwin(numtaps=numtaps, cutoff=[freqmin, freqmax], window=window, pass_zero='bandpass', fs=samp_freq)
+    taps.flags.writeable = False # shared between calls
+    return taps
+
+def firfilter(ar, taps, zerophase=True, workers=None):
+    """
+    Apply an FIR filter down each trace (along axis 0) by multiplication in the frequency domain.
+
+    With :code:`zerophase=True`, the filter is convolved with its own reverse, and that zero phase response is applied in a single pass. This is equivalent to filtering forwards and then backwards, except that the backward pass also sees the tail of the forward pass past the end of the trace. The cost depends on the trace length and hardly at all on the number of taps.
 
-    far = lfilter(filt, 1.0, ar, axis=0).copy()
+    Traces are transformed a block at a time to keep temporary arrays small. Since every trace is filtered on its own, blocks of traces read separately (see :py:func:`readgssi.dzt.iter_traces`) give the same result as the whole array.
+
+    Floating point arrays keep their precision (float32 stays float32); other arrays are filtered in float64.
+
+    :param numpy.ndarray ar: The radar array
+    :param numpy.ndarray taps: The FIR filter taps (see :py:func:`firtaps`)
+    :param bool zerophase: Whether to apply the zero phase response. Defaults to True.
+    :param int workers: Number of threads to use for the FFTs. Defaults to None (one thread).
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    dtype = ar.dtype if ar.dtype.kind == 'f' else np.dtype(np.float64)
+    taps = np.asarray(taps, dtype=np.float64)
     if zerophase:
-        far = lfilter(filt, 1.0, far[::-1], axis=0)[::-1]
+        kernel, delay = np.convolve(taps, taps[::-1]), len(taps) - 1 # centered, so no phase shift
+    else:
+        kernel, delay = taps, 0
+    nsamp = ar.shape[0]
+    nfft = next_fast_len(nsamp + len(kernel) - 1, real=True)
+    response = rfft(kernel, nfft).astype(np.result_type(dtype, np.complex64))
 
+    far = np.empty(ar.shape, dtype=dtype)
+    cols = max(1, 2**22 // nfft) # traces per block
+    for i in range(0, ar.shape[1], cols):
+        block = rfft(ar[:,i:i+cols].astype(dtype, copy=False), nfft, axis=0, workers=workers)
+        block *= response[:,None]
+        far[:,i:i+cols] = irfft(block, nfft, axis=0, workers=workers)[delay:delay+nsamp]
     return far
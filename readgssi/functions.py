@@ -1,5 +1,8 @@
 import math
+import glob
+import numpy as np
 from datetime import datetime
+from multiprocessing.shared_memory import SharedMemory
 from readgssi.constants import *
 import os
 
@@ -49,9 +52,54 @@ def dzterror(e=''):
     printmsg('ERROR TEXT: %s' % e)
     genericerror('DZT')
 
+def expand_inputs(paths):
+    """
+    Expand a list of input paths into a sorted list of DZT files. Paths can be files, directories (all DZT files directly inside are used), or glob patterns such as :code:`survey/*/FILE__*.DZT`.
+
+    DZTs that readgssi wrote itself are left out of directories and glob patterns, so that running a batch twice doesn't process its own outputs. A file counts as an output if its name is the name of another DZT in the set followed by processing tags from :py:func:`naming` (e.g. :code:`FILE__001S2.DZT` next to :code:`FILE__001.DZT`). Files listed by name are always used.
+
+    :param list paths: Input paths
+    :rtype: :py:class:`list` of :py:class:`str`
+    """
+    infiles = []
+    explicit = set()
+    for path in paths:
+        path = os.path.expanduser(path)
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(glob.escape(path), '*.[Dd][Zz][Tt]'))
+        elif os.path.isfile(path):
+            found = [path]
+            explicit.add(path)
+        else:
+            found = glob.glob(path)
+            if not found:
+                printmsg('WARNING: no files found matching %s' % (path))
+        for f in sorted(found):
+            if f not in infiles:
+                infiles.append(f)
+    stems = set(os.path.splitext(f)[0] for f in infiles)
+    outputs = [f for f in infiles if (f not in explicit) and isoutput(f, stems)]
+    if outputs:
+        printmsg('skipping %s file(s) that look like readgssi outputs of other inputs' % (len(outputs)))
+    return [f for f in infiles if f not in outputs]
+
+def isoutput(infile, stems):
+    """
+    Whether a DZT looks like an output of :py:func:`readgssi.readgssi.readgssi` for one of a set of inputs, i.e. whether its name is one of :code:`stems` followed by a processing tag (tags always start with a capital letter, see :py:func:`naming`).
+
+    :param str infile: The DZT
+    :param set stems: Input file paths without their extensions
+    :rtype: :py:class:`bool`
+    """
+    stem = os.path.splitext(infile)[0]
+    for i in range(len(stem) - 1, 0, -1):
+        if stem[i].isupper() and (stem[:i] in stems):
+            return True
+    return False
+
 def naming(outfile=None, infile_basename=None, chans=[1], chan=0, normalize=False, zero=None, stack=1, reverse=False,
            bgr=False, win=None, gain=None, dewow=None, freqmin=None, freqmax=None, plotting=None, zoom=None,
-           absval=False):
+           absval=False, filtertype='triangular', tgain=None, pipeline=None, align=False, bgrrun=False):
     """
     The Dr. Seth W. Campbell Honorary Naming Scheme
 
@@ -71,6 +119,7 @@ def naming(outfile=None, infile_basename=None, chans=[1], chan=0, normalize=Fals
     :param bool reverse: Whether or not the file was reversed. Defaults to False.
     :param bool bgr: Whether or not BGR was applied. Defaults to False.
     :param int win: The BGR window size if applicable. 0 is full-width BGR, greater than 0 is window size. Defaults to None.
+    :param bool bgrrun: Whether full-width BGR subtracted a running mean of the traces so far (as when following a file with :py:func:`readgssi.readgssi.watch`) rather than the mean of the whole line. Defaults to False.
     :param float gain: The gain value applied to the plot. Defaults to None.
     :param bool dewow: Whether or not dewow was applied. Defaults to None.
     :param int freqmin: The lower corner of the bandpass filter if applicable. Defaults to None.
@@ -78,6 +127,10 @@ def naming(outfile=None, infile_basename=None, chans=[1], chan=0, normalize=Fals
     :param int plotting: Stand-in for whether or not a plot was generated. The integer represents the plot height. Defaults to None.
     :param list[int,int,int,int] zoom: The zoom extents applied to the image. Defaults to None.
     :param bool absval: Whether or not the plot is displayed with absolute value of gradient. Defaults to False.
+    :param str filtertype: The type of bandpass filter applied, if any (:py:data:`'triangular'` or :py:data:`'butterworth'`). Defaults to 'triangular'.
+    :param str tgain: The amplitude gain spec applied to the array, if any (see :py:func:`readgssi.gains.parse`). Defaults to None.
+    :param str align: How the direct wave was aligned, if at all (a spec such as :py:data:`'int'`, :py:data:`'fft'`, or :py:data:`'threshold:fft'`; see :py:func:`readgssi.arrayops.alignspec`). Defaults to False.
+    :param readgssi.pipeline.Pipeline pipeline: The processing pipeline applied, if any. Its stages are named in the order they were run, in place of the dewow, bandpass, stacking, background removal, and gain arguments. Defaults to None.
     """
     if outfile == None:
         outfile = '%s' % (os.path.join(infile_basename))
@@ -92,16 +145,29 @@ def naming(outfile=None, infile_basename=None, chans=[1], chan=0, normalize=Fals
         outfile = '%sCh%s' % (outfile, chan)
     if zero and (zero > 0):
         outfile = '%sTz%s' % (outfile, zero)
+    if align:
+        from readgssi.arrayops import alignspec # arrayops uses this module
+        method, fractional = alignspec(align)
+        outfile = '%sAl%s%s' % (outfile, 't' if method == 'threshold' else '', 'f' if fractional else '')
     if normalize:
         outfile = '%sDn' % (outfile)
-    if freqmin and freqmax:
-        outfile = '%sB%s-%s' % (outfile, freqmin, freqmax)
-    if dewow:
-        outfile = '%sDw' % (outfile)
-    if stack > 1:
-        outfile = '%sS%s' % (outfile, stack)
-    if bgr:
-        outfile = '%sBgr%s' % (outfile, win)
+    if pipeline:
+        outfile = '%s%s' % (outfile, pipeline.tag())
+    else:
+        if freqmin and freqmax:
+            if filtertype == 'butterworth':
+                outfile = '%sBw%s-%s' % (outfile, freqmin, freqmax)
+            else:
+                outfile = '%sB%s-%s' % (outfile, freqmin, freqmax)
+        if dewow:
+            outfile = '%sDw' % (outfile)
+        if stack > 1:
+            outfile = '%sS%s' % (outfile, stack)
+        if bgr:
+            outfile = '%sBgr%s' % (outfile, 'Run' if (bgrrun and not win) else win)
+        if tgain:
+            from readgssi.gains import tag # gains uses this module
+            outfile = '%s%s' % (outfile, tag(tgain))
     if reverse:
         outfile = '%sRv' % (outfile)
     if plotting:
@@ -167,4 +233,64 @@ def zoom(zoom, extent, x, z, verbose=False):
     else:
         zoom[2] = extent[2]
         zoom[3] = extent[3]
-    return zoom
\ No newline at end of file
+    return zoom
+
+def share_array(ar):
+    """
+    Copy an array into a new block of shared memory, so that it can be handed to another process without being pickled. The caller is responsible for closing the block (and unlinking it once no process needs it).
+
+    :param numpy.ndarray ar: The array to share
+    :rtype: :py:class:`multiprocessing.shared_memory.SharedMemory`, spec (:py:class:`tuple` of name, shape, and dtype) to pass to :py:func:`attach_array`
+    """
+    shm = SharedMemory(create=True, size=max(ar.nbytes, 1))
+    np.ndarray(ar.shape, dtype=ar.dtype, buffer=shm.buf)[...] = ar
+    return shm, (shm.name, ar.shape, ar.dtype.str)
+
+def attach_array(spec):
+    """
+    Attach to an array shared by :py:func:`share_array`. The array is a view of the shared block, so it must be deleted before the block is closed.
+
+    :param tuple spec: Name, shape, and dtype of the shared array
+    :rtype: :py:class:`multiprocessing.shared_memory.SharedMemory`, :py:class:`numpy.ndarray`
+    """
+    shm = SharedMemory(name=spec[0])
+    return shm, np.ndarray(spec[1], dtype=spec[2], buffer=shm.buf)
+
+def nthreads(threads=1):
+    """
+    Resolve a thread count. :py:data:`'auto'` or 0 is the number of CPUs, and anything that isn't a positive integer is 1.
+
+    :param threads: The requested number of threads
+    :rtype: :py:class:`int`
+    """
+    if str(threads).lower() in ('auto', '0'):
+        return os.cpu_count() or 1
+    try:
+        return max(int(threads), 1)
+    except (TypeError, ValueError):
+        return 1
+
+def blockmap(func, ar, threads=1, axis=1):
+    """
+    Split an array into one block per thread along :code:`axis` (1 for traces, 0 for samples), call :code:`func` on each block in a pool of threads, and put the results back together. This is only worthwhile for functions that spend their time in numpy or scipy code that releases the GIL, which covers the filters in :py:mod:`readgssi.filtering` and :py:mod:`readgssi.gains`. :code:`func` must treat every slice along :code:`axis` independently of the others, so that the result is the same as calling it on the whole array.
+
+    If :code:`func` modifies its block in place and returns it, the result is :code:`ar` itself. Otherwise the blocks are joined into a new array.
+
+    :param func: Function that takes a block of :code:`ar` and returns the processed block
+    :param numpy.ndarray ar: The array to process
+    :param int threads: Number of threads (see :py:func:`nthreads`). Defaults to 1, which calls :code:`func(ar)` directly.
+    :param int axis: The axis to split along. Defaults to 1 (traces).
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    threads = min(nthreads(threads), ar.shape[axis])
+    if threads < 2:
+        return func(ar)
+    bounds = np.linspace(0, ar.shape[axis], threads + 1).astype(int)
+    blocks = [ar[a:b] if axis == 0 else ar[:,a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(func, blocks))
+    if all(r is b for r, b in zip(results, blocks)):
+        return ar # modified in place
+    return np.concatenate(results, axis=axis)
@@ -0,0 +1,234 @@
+import numpy as np
+from functools import lru_cache
+from scipy.ndimage import uniform_filter1d
+import readgssi.functions as fx
+
+"""
+Amplitude gain applied to the radar array itself
+
+unlike the contrast gain of plot.radargram, these change the values that are exported.
+every gain here works down each trace independently of the others, so arrays that are
+read in blocks of traces (iter_traces, watch mode, pipelines) are gained block by block
+with the same result as gaining the whole array. each trace's mean is subtracted first by
+default, since raw 8 and 16 bit data are centered on 0x80 and 0x8000 rather than zero, and
+gaining that offset would drown out the signal.
+"""
+
+GAINS = ('agc', 'tpow', 'exp', 'sec')
+
+
+def samplet(header):
+    """
+    The time between samples in nanoseconds, from the time range of the file (the same one the time axis of :py:func:`readgssi.plot.radargram` uses).
+
+    :param dict header: The file header dictionary
+    :rtype: :py:class:`float`
+    """
+    return float(header['rhf_range']) / header['rh_nsamp']
+
+
+@lru_cache(maxsize=32)
+def gaincurve(nsamp, dt, kind, value):
+    """
+    The gain curve of a time-based gain, as a column that can be broadcast over an array of :code:`nsamp` x traces. Time is counted from time zero (the first row of the array). Curves are cached, so they are only computed once per trace length.
+
+    * :code:`tpow`: :math:`t^n`, where :code:`value` is :math:`n`
+    * :code:`exp`: :math:`e^{at}`, where :code:`value` is :math:`a` (per nanosecond)
+    * :code:`sec`: :math:`t e^{at}` (spherical and exponential compensation), where :code:`value` is :math:`a` (per nanosecond)
+
+    :param int nsamp: The number of samples per trace
+    :param float dt: Time between samples in nanoseconds (see :py:func:`samplet`)
+    :param str kind: :code:`'tpow'`, :code:`'exp'`, or :code:`'sec'`
+    :param float value: The power or exponent
+    :rtype: :py:class:`numpy.ndarray` (:code:`nsamp` x 1)
+    """
+    t = np.arange(nsamp, dtype=np.float64) * dt
+    if kind == 'tpow':
+        curve = t ** value
+    elif kind == 'exp':
+        curve = np.exp(value * t)
+    elif kind == 'sec':
+        curve = t * np.exp(value * t)
+    else:
+        raise ValueError('unknown gain curve "%s"' % (kind))
+    curve = curve.reshape(-1, 1)
+    curve.flags.writeable = False # shared between calls
+    return curve
+
+
+def demean(ar):
+    """
+    Subtract the mean of each trace in place. This removes the offset that unsigned 8 and 16 bit data are centered on (see :py:func:`readgssi.dzt.unsigned_offset`), and any other DC bias, which would otherwise be gained along with the signal.
+
+    :param numpy.ndarray ar: A floating point radar array (or block of traces)
+    :rtype: :py:class:`numpy.ndarray` (the same array)
+    """
+    return np.subtract(ar, ar.mean(axis=0, dtype=np.float64).astype(ar.dtype), out=ar)
+
+
+def curvegain(ar, header, kind, value, threads=1, dc=True, verbose=False):
+    """
+    Multiply each trace by a time-based gain curve (see :py:func:`gaincurve`), after subtracting the trace's mean (unless :code:`dc=False`).
+
+    Floating point arrays are modified in place and keep their precision (float32 stays float32). Integer arrays are returned as a new float64 array.
+
+    :param numpy.ndarray ar: The radar array
+    :param dict header: The file header dictionary
+    :param str kind: :code:`'tpow'`, :code:`'exp'`, or :code:`'sec'`
+    :param float value: The power or exponent
+    :param int threads: Number of threads. Traces are split between threads (see :py:func:`readgssi.functions.blockmap`). Defaults to 1.
+    :param bool dc: Subtract the mean of each trace before gaining (see :py:func:`demean`). Defaults to True.
+    :param bool verbose: Verbose, defaults to False
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    if verbose:
+        fx.printmsg('applying %s gain (%s)...' % (kind, value))
+    curve = gaincurve(ar.shape[0], samplet(header), kind, float(value))
+    if ar.dtype.kind == 'f':
+        curve = curve.astype(ar.dtype)
+        return fx.blockmap(lambda ar: np.multiply(demean(ar) if dc else ar, curve, out=ar), ar, threads=threads)
+    return fx.blockmap(lambda ar: (demean(ar.astype(np.float64)) if dc else ar) * curve, ar, threads=threads)
+
+
+def tpow(ar, header, power=1, threads=1, dc=True, verbose=False):
+    """
+    Time-power gain. Multiplies each sample by :math:`t^n`, where :math:`t` is the time after time zero in nanoseconds, to compensate for geometric spreading.
+
+    :param numpy.ndarray ar: The radar array
+    :param dict header: The file header dictionary
+    :param float power: The power :math:`n`. Defaults to 1.
+    :param bool dc: Subtract the mean of each trace first (see :py:func:`demean`). Defaults to True.
+    :param bool verbose: Verbose, defaults to False
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    return curvegain(ar, header, 'tpow', power, threads=threads, dc=dc, verbose=verbose)
+
+
+def expgain(ar, header, alpha, threads=1, dc=True, verbose=False):
+    """
+    Exponential gain. Multiplies each sample by :math:`e^{at}`, where :math:`t` is the time after time zero in nanoseconds, to compensate for attenuation.
+
+    :param numpy.ndarray ar: The radar array
+    :param dict header: The file header dictionary
+    :param float alpha: The exponent :math:`a`, per nanosecond
+    :param bool dc: Subtract the mean of each trace first (see :py:func:`demean`). Defaults to True.
+    :param bool verbose: Verbose, defaults to False
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    return curvegain(ar, header, 'exp', alpha, threads=threads, dc=dc, verbose=verbose)
+
+
+def sec(ar, header, alpha, threads=1, dc=True, verbose=False):
+    """
+    Spherical and exponential compensation (SEC) gain. Multiplies each sample by :math:`t e^{at}`, where :math:`t` is the time after time zero in nanoseconds, which compensates for both geometric spreading and attenuation.
+
+    :param numpy.ndarray ar: The radar array
+    :param dict header: The file header dictionary
+    :param float alpha: The exponent :math:`a`, per nanosecond
+    :param bool dc: Subtract the mean of each trace first (see :py:func:`demean`). Defaults to True.
+    :param bool verbose: Verbose, defaults to False
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    return curvegain(ar, header, 'sec', alpha, threads=threads, dc=dc, verbose=verbose)
+
+
+def agc(ar, header, win=None, target=None, threads=1, dc=True, verbose=False):
+    """
+    Automatic gain control (AGC). Each sample is divided by the root mean square (RMS) amplitude of a window of :code:`win` samples centred on it, then scaled to :code:`target`, so that weak late arrivals are shown at the same amplitude as strong early ones. The sliding RMS is a :py:func:`scipy.ndimage.uniform_filter1d` of the squared array down each trace, so the cost doesn't depend on the window length. Samples in windows that are all zero stay zero.
+
+    Each trace's mean is subtracted first (unless :code:`dc=False`, see :py:func:`demean`), so that the RMS measures the signal rather than the offset of unsigned data. Traces are gained a block at a time, so only one block's RMS is held in memory. Floating point arrays are modified in place and keep their precision (float32 stays float32). Integer arrays are returned as a new float64 array.
+
+    :param numpy.ndarray ar: The radar array
+    :param dict header: The file header dictionary
+    :param int win: The window length in samples. Defaults to None, which is a tenth of the trace length.
+    :param float target: The RMS amplitude of the output. Defaults to None, which is an eighth of the largest value that the file's bit depth can hold (so that gained data can still be written to a DZT).
+    :param int threads: Number of threads. Traces are split between threads (see :py:func:`readgssi.functions.blockmap`). Defaults to 1.
+    :param bool dc: Subtract the mean of each trace before gaining. Defaults to True.
+    :param bool verbose: Verbose, defaults to False
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    win = max(int(win), 1) if win else max(ar.shape[0] // 10, 1)
+    if target is None:
+        target = 2. ** (header['rh_bits'] - 1) / 8
+    if verbose:
+        fx.printmsg('applying automatic gain control (%s sample window)...' % (win))
+    dtype = ar.dtype if ar.dtype.kind == 'f' else np.dtype(np.float64)
+
+    def traces(ar):
+        out = ar if ar.dtype.kind == 'f' else np.empty(ar.shape, dtype=dtype)
+        cols = max(1, 2**22 // max(ar.shape[0], 1))
+        for i in range(0, ar.shape[1], cols):
+            block = ar[:,i:i+cols].astype(dtype, copy=False)
+            if dc:
+                demean(block) # a copy for integer arrays, and the array itself (gained in place anyway) for float
+            rms = uniform_filter1d(np.square(block), size=win, axis=0, mode='nearest')
+            np.sqrt(rms, out=rms)
+            rms[rms == 0] = np.inf
+            np.divide(block, rms, out=rms)
+            np.multiply(rms, target, out=out[:,i:i+cols])
+        return out
+
+    return fx.blockmap(traces, ar, threads=threads)
+
+
+def parse(spec):
+    """
+    Parse a gain spec into the kind of gain and its value. Specs are the gain name, optionally followed by a colon and a value:
+
+    * :code:`agc` or :code:`agc:50` (:py:func:`agc`, window in samples)
+    * :code:`tpow:2` (:py:func:`tpow`, power)
+    * :code:`exp:0.02` (:py:func:`expgain`, exponent per nanosecond)
+    * :code:`sec:0.02` (:py:func:`sec`, exponent per nanosecond)
+
+    :param str spec: The gain spec
+    :rtype: kind (:py:class:`str`), value (:py:class:`float` or :py:data:`None`)
+    :raises ValueError: if the spec can't be parsed
+    """
+    kind, _, value = str(spec).strip().partition(':')
+    kind = kind.lower()
+    if kind not in GAINS:
+        raise ValueError('unknown gain "%s". available gains are: %s' % (kind, ', '.join(GAINS)))
+    if not value:
+        if kind == 'agc':
+            return kind, None
+        if kind == 'tpow':
+            return kind, 1.
+        raise ValueError('%s gain needs an exponent, e.g. "%s:0.02"' % (kind, kind))
+    try:
+        value = float(value)
+    except ValueError:
+        raise ValueError('gain value must be a number, e.g. "agc:50" or "tpow:2"')
+    if kind == 'agc':
+        value = int(value)
+    return kind, value
+
+
+def apply(ar, header, spec, threads=1, dc=True, verbose=False):
+    """
+    Apply the gain described by a spec (see :py:func:`parse`).
+
+    :param numpy.ndarray ar: The radar array
+    :param dict header: The file header dictionary
+    :param str spec: The gain spec, e.g. :code:`'agc:50'` or :code:`'tpow:2'`
+    :param int threads: Number of threads (see :py:func:`readgssi.functions.blockmap`). Defaults to 1.
+    :param bool dc: Subtract the mean of each trace before gaining (see :py:func:`demean`). Defaults to True.
+    :param bool verbose: Verbose, defaults to False
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    kind, value = parse(spec)
+    if kind == 'agc':
+        return agc(ar, header, win=value, threads=threads, dc=dc, verbose=verbose)
+    return curvegain(ar, header, kind, value, threads=threads, dc=dc, verbose=verbose)
+
+
+def tag(spec):
+    """
+    The characters that a gain adds to output file names (see :py:func:`readgssi.functions.naming`), e.g. :code:`Agc50` or :code:`Tpow2`.
+
+    :param str spec: The gain spec
+    :rtype: :py:class:`str`
+    """
+    kind, value = parse(spec)
+    if value is None:
+        return kind.capitalize()
+    return '%s%s' % (kind.capitalize(), ('%g' % value))
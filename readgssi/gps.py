@@ -1,14 +1,16 @@
 from datetime import datetime, timedelta
 import pynmea2
-import math
 import os
 import numpy as np
 import pandas as pd
-from geopy.distance import geodesic
 import readgssi.functions as fx
+from readgssi import distance, __version__
+from readgssi.cache import fingerprint
 from readgssi.constants import TZ
-from math import sin, cos, sqrt, atan2, radians
 from shutil import copyfile
+from io import StringIO
+from csv import QUOTE_NONE
+import re
 
 """
 contains functions for reading gps data from various formats
@@ -25,24 +27,304 @@ def msgparse(msg):
     """
     return msg.timestamp, msg.latitude, msg.longitude
 
-def readdzg(fi, frmt, header, verbose=False):
+GPSCOLUMNS = ['datetimeutc', 'trace', 'longitude', 'latitude', 'altitude', 'velocity', 'sec_elapsed', 'meters']
+RECORDCOLUMNS = ['kind', 'trace', 'tod', 'date', 'latitude', 'longitude', 'altitude', 'sog']
+GSSISTRACE = re.compile(r',\s*(\d+)') # the trace number at the start of a $GSSIS sentence, after the name
+NMEAFIELDS = 16 # enough for RMC and GGA. longer sentences are skipped
+GPSCACHE = '%s-gps.npz' # the parsed GPS table is kept next to the DZG, e.g. FILE__001.DZG-gps.npz
+
+def emptygps():
+    """
+    An empty GPS table with the fields of :py:func:`readdzg`.
+
+    :rtype: :py:class:`pandas.DataFrame`
+    """
+    array = pd.DataFrame(columns=GPSCOLUMNS)
+    array['datetimeutc'] = pd.to_datetime(array['datetimeutc'], utc=True)
+    return array.set_index('datetimeutc')
+
+def nmeadegrees(dm, hemisphere):
+    """
+    Convert NMEA :code:`ddmm.mmmm` (or :code:`dddmm.mmmm`) coordinates to signed decimal degrees.
+
+    :param numpy.ndarray dm: Degrees and decimal minutes as numbers
+    :param numpy.ndarray hemisphere: Hemisphere letters (:code:`'S'` and :code:`'W'` are negative)
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    dm = np.asarray(dm, dtype=np.float64)
+    deg = np.floor(dm / 100)
+    deg += (dm - deg * 100) / 60
+    return np.where(np.isin(np.asarray(hemisphere, dtype=object), ['S', 'W']), -deg, deg)
+
+def nmeaseconds(hms):
+    """
+    Convert NMEA :code:`hhmmss.ss` times to seconds since midnight.
+
+    :param numpy.ndarray hms: Times as numbers
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    hms = np.asarray(hms, dtype=np.float64)
+    hh, mm = np.floor(hms / 10000), np.floor(hms / 100) % 100
+    return np.round(hh * 3600 + mm * 60 + (hms - np.floor(hms / 100) * 100), 6)
+
+def nmeadate(dmy):
+    """
+    Convert NMEA :code:`ddmmyy` dates to :py:class:`numpy.datetime64` days. Two digit years from 69 to 99 are in the 1900s, the same as :py:func:`datetime.datetime.strptime`.
+
+    :param numpy.ndarray dmy: Dates as numbers
+    :rtype: :py:class:`pandas.DatetimeIndex`
+    """
+    dmy = np.asarray(dmy, dtype=np.float64)
+    yy = dmy % 100
+    return pd.to_datetime(pd.DataFrame({'year': np.where(yy < 69, 2000 + yy, 1900 + yy),
+                                        'month': np.floor(dmy / 100) % 100,
+                                        'day': np.floor(dmy / 10000)}), errors='coerce')
+
+def numbers(fields):
+    """
+    Convert a column of NMEA fields (strings, with :py:data:`numpy.nan` for empty fields) to numbers. Fields that aren't numbers become :py:data:`numpy.nan`.
+
+    :param numpy.ndarray fields: The fields
+    :rtype: :py:class:`numpy.ndarray`
+    """
+    try:
+        return fields.astype(np.float64)
+    except ValueError: # only when some field isn't a number
+        return pd.to_numeric(fields, errors='coerce').astype(np.float64)
+
+def nmeafallback(ln):
+    """
+    Parse a single RMC or GGA sentence that the columnar parser couldn't read, using :py:func:`pynmea2.parse`.
+
+    :param str ln: The sentence
+    :rtype: :py:class:`dict` of the fields of :py:func:`parsedzg` that could be read, or :py:data:`None`
+    """
+    try:
+        msg = pynmea2.parse(ln)
+        if not (msg.timestamp and (msg.latitude or msg.longitude)):
+            return None
+        t = msg.timestamp
+        rec = {'tod': t.hour * 3600 + t.minute * 60 + t.second + t.microsecond / 1e6,
+               'latitude': float(msg.latitude), 'longitude': float(msg.longitude)}
+        if msg.sentence_type == 'RMC':
+            rec['date'] = pd.Timestamp(msg.datestamp) if msg.datestamp else pd.NaT
+            rec['sog'] = float(msg.spd_over_grnd or 0)
+        else:
+            rec['altitude'] = float(msg.altitude) if msg.altitude is not None else np.nan
+        return rec
+    except (pynmea2.ParseError, AttributeError, TypeError, ValueError):
+        return None
+
+def readtext(fi):
+    """
+    Read a DZG (or any NMEA file) as text, ignoring bytes that aren't ASCII.
+
+    :param str fi: The file
+    :rtype: :py:class:`str`
+    """
+    with open(fi, 'rb') as gf:
+        return gf.read().decode('ascii', errors='ignore')
+
+def parsedzg(fi, verbose=False, text=None):
+    """
+    Read the RMC and GGA sentences of a DZG into a table with one row per sentence, in the order they appear in the file. The file is read once, the RMC, GGA, and :code:`$GSSIS` lines are picked out, and they are split into fields by the C tokenizer of :py:func:`pandas.read_csv`, and the fields that are needed are converted to numbers a column at a time with :py:func:`pandas.to_numeric` and :py:mod:`numpy`, rather than one sentence at a time. Sentences with fields that can't be read this way are passed to :py:func:`pynmea2.parse` as they appear in the file (see :py:func:`nmeafallback`), and dropped if that fails too.
+
+    :param str fi: The DZG file
+    :param bool verbose: Verbose, defaults to False
+    :param str text: The contents of the DZG, if they have already been read (see :py:func:`readtext`). Defaults to None, which reads :code:`fi`.
+    :rtype: :py:class:`pandas.DataFrame` with the fields:
+
+        * kind (:code:`'RMC'` or :code:`'GGA'`)
+        * trace (:py:class:`int`, from the last :code:`$GSSIS` sentence before it)
+        * tod (:py:class:`float` seconds since midnight UTC)
+        * date (:py:class:`numpy.datetime64`, RMC only)
+        * latitude, longitude (:py:class:`float` decimal degrees)
+        * altitude (:py:class:`float` meters, GGA only)
+        * sog (:py:class:`float` speed over ground in knots, RMC only)
+    """
+    if text is None:
+        text = readtext(fi)
+    # only the sentences that are used are tokenized, one row per line, so that each row's original text is lines[row]
+    lines = [ln for ln in (ln.strip() for ln in text.splitlines())
+             if ln[:1] == '$' and (ln[3:6] in ('RMC', 'GGA') or ln[:6] == '$GSSIS') and ln.count(',') < NMEAFIELDS]
+    if not lines:
+        return pd.DataFrame(columns=RECORDCOLUMNS)
+    fields = pd.read_csv(StringIO('\n'.join(lines)), header=None, names=range(NMEAFIELDS), dtype=object,
+                         quoting=QUOTE_NONE, index_col=False, engine='c')
+    ids = fields[0].fillna('')
+    kind = ids.map({i: i[3:6] if i.startswith('$') else '' for i in ids.unique()})
+    gssis = ids == '$GSSIS'
+    trace = pd.Series(numbers(fields[1].where(gssis).values), index=fields.index).ffill().fillna(0).astype(np.int64)
+    columns = {'RMC': {1: 'tod', 3: 'latitude', 4: 'lathem', 5: 'longitude', 6: 'lonhem', 7: 'sog', 9: 'date'},
+               'GGA': {1: 'tod', 2: 'latitude', 3: 'lathem', 4: 'longitude', 5: 'lonhem', 9: 'altitude'}}
+    parts = []
+    for k in columns:
+        f = fields.loc[(kind == k) & ~gssis, list(columns[k])].rename(columns=columns[k])
+        if f.empty:
+            continue
+        num = lambda c: numbers(f[c].values)
+        rec = pd.DataFrame({'kind': k, 'trace': trace[f.index].values, 'tod': nmeaseconds(num('tod')),
+                            'date': nmeadate(num('date')).values if k == 'RMC' else pd.NaT,
+                            'latitude': nmeadegrees(num('latitude'), f['lathem'].values),
+                            'longitude': nmeadegrees(num('longitude'), f['lonhem'].values),
+                            'altitude': num('altitude') if k == 'GGA' else np.nan,
+                            'sog': np.nan_to_num(num('sog')) if k == 'RMC' else np.nan}, index=f.index)
+        parts.append(rec)
+    records = pd.concat(parts).sort_index() if parts else pd.DataFrame(columns=RECORDCOLUMNS)
+    bad = records[['tod', 'latitude', 'longitude']].isna().any(axis=1) | ((records['kind'] == 'RMC') & records['date'].isna())
+    if bad.any():
+        for i in records.index[bad]:
+            rec = nmeafallback(lines[i])
+            if rec:
+                records.loc[i, list(rec)] = list(rec.values())
+        bad = records[['tod', 'latitude', 'longitude']].isna().any(axis=1) | ((records['kind'] == 'RMC') & records['date'].isna())
+        if verbose and bad.any():
+            fx.printmsg('skipped %s unreadable gps sentences' % (bad.sum()))
+        records = records[~bad]
+    return records.reset_index(drop=True)
+
+def gpsframe(records, header, verbose=False):
+    """
+    Build the GPS table returned by :py:func:`readdzg` from the sentences read by :py:func:`parsedzg`, in one pass over whole columns.
+
+    RMC sentences are used as fixes if there are any, since they carry a date. Their speed over ground is integrated over time to get distance, and the altitude of each comes from the GGA sentence with the same position in the file (RMC has no altitude). Otherwise GGA sentences are used, dated with the creation date of the DZT, and distance is measured between consecutive positions (including the change in altitude).
+
+    :param pandas.DataFrame records: Sentences from :py:func:`parsedzg`
+    :param dict header: File header produced by :py:func:`readgssi.dzt.readdzt`
+    :param bool verbose: Verbose, defaults to False
+    :rtype: GPS data (:py:class:`pandas.DataFrame`, see :py:func:`readdzg`)
+    """
+    rmc = records[records['kind'] == 'RMC']
+    gga = records[records['kind'] == 'GGA']
+    if rmc.empty:
+        fx.printmsg('WARNING: no RMC sentences found in GPS records. this could become an issue if your file goes through 00:00:00.')
+        fx.printmsg("         if you get a time jump error please open a github issue at https://github.com/iannesbitt/readgssi/issues")
+        fx.printmsg("         and attach the verbose output of this script plus a zip of the DZT and DZG files you're working with.")
+    elif (not gga.empty) and (len(rmc) != len(gga)) and verbose:
+        fx.printmsg('WARNING: GGA and RMC sentences are not recorded at the same rate! This could cause unforseen problems!')
+        fx.printmsg('    rmc: %i records' % len(rmc))
+        fx.printmsg('    gga: %i records' % len(gga))
+    fixes = gga if rmc.empty else rmc
+    if fixes.empty:
+        return emptygps()
+
+    if rmc.empty:
+        day = pd.Timestamp(header['rhb_cdt']).tz_localize(None).normalize() # GGA has no date, so the day the DZT was recorded is used
+        times = day + pd.to_timedelta(fixes['tod'].values, unit='s')
+        altitude = fixes['altitude'].fillna(0.).values
+    else:
+        times = pd.DatetimeIndex(fixes['date'].values) + pd.to_timedelta(fixes['tod'].values, unit='s')
+        altitude = np.zeros(len(fixes))
+        if not gga.empty:
+            # the altitude of the GGA sentence that goes with each RMC sentence
+            galt = gga['altitude'].fillna(0.).values
+            altitude = galt[np.minimum(np.arange(len(fixes)), len(galt) - 1)]
+    times = times.tz_localize(TZ)
+    elapsed = (times - times[0]).total_seconds().values
+    dt = np.diff(elapsed)
+    if rmc.empty:
+        seg = distance.segments(fixes['latitude'].values, fixes['longitude'].values, altitude)
+        velocity = np.concatenate(([0.], np.divide(seg, dt, out=np.zeros(dt.shape), where=dt != 0)))
+        meters = np.concatenate(([0.], np.cumsum(seg)))
+        if np.any(elapsed > 3600.0):
+            i = int(np.argmax(elapsed > 3600.0))
+            fx.printmsg("WARNING: Time jumps by more than an hour in this GPS dataset and there are no RMC sentences to anchor the datestamp!")
+            fx.printmsg("         This dataset may cross over the UTC midnight dateline!\nprevious timestamp: %s\ncurrent timestamp:  %s" % (times[i-1], times[i]))
+            fx.printmsg("         trace number:       %s" % fixes['trace'].iat[i])
+    else:
+        velocity = fixes['sog'].values * 0.514444444 # convert from knots to m/s
+        velocity[0] = 0
+        meters = np.concatenate(([0.], np.cumsum(velocity[1:] * dt)))
+    if verbose:
+        lathem = 'south' if fixes['latitude'].iat[0] < 0 else 'north'
+        lonhem = 'west' if fixes['longitude'].iat[0] < 0 else 'east'
+        fx.printmsg('record starts in %s and %s hemispheres' % (lonhem, lathem))
+        if len(dt) and dt[0] > 0:
+            fx.printmsg('found %i %s GPS epochs at rate of ~%.2f Hz' % (len(fixes), fixes['kind'].iat[0], 1 / dt[0]))
+    array = pd.DataFrame({'datetimeutc': times, 'trace': fixes['trace'].values,
+                          'longitude': fixes['longitude'].values, 'latitude': fixes['latitude'].values,
+                          'altitude': altitude, 'velocity': velocity, 'sec_elapsed': elapsed, 'meters': meters},
+                         columns=GPSCOLUMNS)
+    return array.set_index('datetimeutc')
+
+def gpskey(fi, header):
+    """
+    The key that a cached GPS table (see :py:func:`loadgps`) must match to be used: the fingerprint of the DZG (its size, modification time, and a hash of its contents, see :py:func:`readgssi.cache.fingerprint`), the date of the DZT (which is used as the date of GGA fixes), and the readgssi version.
+
+    :param str fi: The DZG file
+    :param dict header: File header produced by :py:func:`readgssi.dzt.readdzt`
+    :rtype: :py:class:`str`
+    """
+    return '%s %s %s' % (fingerprint(fi), header.get('rhb_cdt'), __version__)
+
+def loadgps(fi, key, verbose=False):
+    """
+    Load the GPS table cached next to a DZG by :py:func:`savegps`, if there is one and it was made from the DZG as it is now.
+
+    :param str fi: The DZG file
+    :param str key: The key from :py:func:`gpskey`
+    :param bool verbose: Verbose, defaults to False
+    :rtype: GPS data (:py:class:`pandas.DataFrame`, see :py:func:`readdzg`), or :py:data:`None` if there is no valid cache
+    """
+    try:
+        with np.load(GPSCACHE % (fi), allow_pickle=False) as npz:
+            if str(npz['key']) != key:
+                return None
+            index = pd.DatetimeIndex(npz['datetimeutc'], name='datetimeutc').tz_localize(TZ)
+            array = pd.DataFrame({c: npz[c] for c in GPSCOLUMNS[1:]}, index=index, columns=GPSCOLUMNS[1:])
+    except (OSError, KeyError, ValueError, EOFError):
+        return None
+    if verbose:
+        fx.printmsg('read %i gps epochs from %s' % (array.shape[0], GPSCACHE % (fi)))
+    return array
+
+def savegps(fi, key, array, verbose=False):
+    """
+    Cache a GPS table next to its DZG as an uncompressed :py:func:`numpy.savez` file, so that the next :py:func:`readdzg` doesn't need to parse the DZG again. The file is written under a temporary name and moved into place, so other processes reading the same DZG never see a partial cache. If the cache can't be written (for example if the DZG is on read-only media), the DZG is simply parsed again next time.
+
+    :param str fi: The DZG file
+    :param str key: The key from :py:func:`gpskey`
+    :param pandas.DataFrame array: The GPS table
+    :param bool verbose: Verbose, defaults to False
+    """
+    out = GPSCACHE % (fi)
+    tmp = '%s.%s.tmp' % (out, os.getpid())
+    columns = {c: array[c].values for c in GPSCOLUMNS[1:]}
+    try:
+        with open(tmp, 'wb') as f:
+            np.savez(f, key=np.array(key), datetimeutc=array.index.tz_convert(None).values, **columns)
+        os.replace(tmp, out)
+    except OSError as e:
+        if verbose:
+            fx.printmsg('could not cache GPS table: %s' % (e))
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return
+    if verbose:
+        fx.printmsg('cached gps table to %s' % (out))
+
+def readdzg(fi, frmt, header, verbose=False, cache=True, csv=False):
     """
     A parser to extract gps data from DZG file format. DZG contains raw NMEA sentences, which should include at least RMC and GGA.
 
     NMEA RMC sentence string format:
-    :py:data:`$xxRMC,UTC hhmmss,status,lat DDmm.sss,lon DDDmm.sss,SOG,COG,date ddmmyy,checksum \*xx`
+    :py:data:`$xxRMC,UTC hhmmss,status,lat DDmm.sss,lon DDDmm.sss,SOG,COG,date ddmmyy,checksum \\*xx`
 
     NMEA GGA sentence string format:
-    :py:data:`$xxGGA,UTC hhmmss.s,lat DDmm.sss,lon DDDmm.sss,fix qual,numsats,hdop,mamsl,wgs84 geoid ht,fix age,dgps sta.,checksum \*xx`
+    :py:data:`$xxGGA,UTC hhmmss.s,lat DDmm.sss,lon DDDmm.sss,fix qual,numsats,hdop,mamsl,wgs84 geoid ht,fix age,dgps sta.,checksum \\*xx`
     
     Shared message variables between GGA and RMC: timestamp, latitude, and longitude
 
     RMC contains a datestamp which makes it preferable, but this parser will read either.
 
+    Sentences are read by :py:func:`parsedzg` and the table is built from them by :py:func:`gpsframe`. The table is then cached next to the DZG (see :py:func:`savegps`), and read from there instead of parsing the DZG again until the DZG changes.
+
     :param str fi: File containing gps information
     :param str frmt: GPS information format ('dzg' = DZG file containing gps sentence strings (see below); 'csv' = comma separated file with: lat,lon,elev,time)
     :param dict header: File header produced by :py:func:`readgssi.dzt.readdzt`
     :param bool verbose: Verbose, defaults to False
+    :param bool cache: Whether to read and write the cached table (DZG only). Defaults to True.
+    :param bool csv: Whether to also write the table to a CSV next to the GPS file (e.g. :code:`FILE__001.DZG-gps.csv`). Defaults to False.
     :rtype: GPS data (pandas.DataFrame)
 
         The dataframe contains the following fields:
@@ -56,192 +338,27 @@ def readdzg(fi, frmt, header, verbose=False):
         * meters (:py:class:`float` meters traveled)
 
     """
-    if header['rhf_spm'] == 0:
-        spu = header['rhf_sps']
-    else:
-        spu = header['rhf_spm']
-    array = pd.DataFrame(columns=['datetimeutc', 'trace', 'longitude', 'latitude', # our dataframe
-                                  'altitude', 'velocity', 'sec_elapsed', 'meters'])
-
-    trace = 0 # the elapsed number of traces iterated through
-    tracenum = 0 # the sequential increase in trace number
-    rownp = 0 # array row number
-    rowrmc = 0 # rmc record iterated through (gps file)
-    rowgga = 0 # gga record
-    sec_elapsed = 0 # number of seconds since the start of the line
-    m = 0 # meters traveled over entire line
-    m0, m1 = 0, 0 # meters traveled as of last, current loop
-    u = 0 # velocity
-    u0 = 0 # velocity on last loop
-    timestamp = False
-    prevtime = False
-    init_time = False
-    td = False
-    prevtrace = False
-    rmc, gga = False, False
-    rmcwarn = True
-    lathem = 'north'
-    lonhem = 'east'
-    x0, x1, y0, y1 = False, False, False, False # coordinates
-    z0, z1 = 0, 0
-    x2, y2, z2, sec2 = 0, 0, 0, 0
-    with open(fi, 'r') as gf:
-        if verbose:
-            fx.printmsg('using gps file:     %s' % (fi))
-        if frmt == 'dzg': # if we're working with DZG format
-            for ln in gf: # loop through the first few sentences, check for RMC
-                if 'RMC' in ln: # check to see if RMC sentence (should occur before GGA)
-                    rmc = True
-                    if rowrmc == 0:
-                        msg = pynmea2.parse(ln.rstrip()) # convert gps sentence to pynmea2 named tuple
-                        ts0 = datetime.combine(msg.datestamp, msg.timestamp).replace(tzinfo=TZ) # row 0's timestamp (not ideal)
-                    if rowrmc == 1:
-                        msg = pynmea2.parse(ln.rstrip())
-                        ts1 = datetime.combine(msg.datestamp, msg.timestamp).replace(tzinfo=TZ) # row 1's timestamp (not ideal)
-                        td = ts1 - ts0 # timedelta = datetime1 - datetime0
-                    rowrmc += 1
-                if 'GGA' in ln:
-                    gga = True
-                    if rowgga == 0:
-                        msg = pynmea2.parse(ln.rstrip()) # convert gps sentence to pynmea2 named tuple
-                        ts0 = datetime.combine(datetime(1980, 1, 1), msg.timestamp).replace(tzinfo=TZ) # row 0's timestamp (not ideal)
-                    if rowgga == 1:
-                        msg = pynmea2.parse(ln.rstrip())
-                        ts1 = datetime.combine(datetime(1980, 1, 1), msg.timestamp).replace(tzinfo=TZ) # row 1's timestamp (not ideal)
-                        td = ts1 - ts0 # timedelta = datetime1 - datetime0
-                    rowgga += 1
-            gpssps = 1 / td.total_seconds() # GPS samples per second
-            if (rmcwarn) and (rowrmc == 0):
-                fx.printmsg('WARNING: no RMC sentences found in GPS records. this could become an issue if your file goes through 00:00:00.')
-                fx.printmsg("         if you get a time jump error please open a github issue at https://github.com/iannesbitt/readgssi/issues")
-                fx.printmsg("         and attach the verbose output of this script plus a zip of the DZT and DZG files you're working with.")
-                rmcwarn = False
-            if (rmc and gga) and (rowrmc != rowgga):
-                if verbose:
-                    fx.printmsg('WARNING: GGA and RMC sentences are not recorded at the same rate! This could cause unforseen problems!')
-                    fx.printmsg('    rmc: %i records' % rowrmc)
-                    fx.printmsg('    gga: %i records' % rowgga)
+    if verbose:
+        fx.printmsg('using gps file:     %s' % (fi))
+    if frmt == 'dzg': # if we're working with DZG format
+        key = gpskey(fi, header) if cache else None
+        array = loadgps(fi, key, verbose=verbose) if cache else None
+        if array is None:
+            records = parsedzg(fi, verbose=verbose)
             if verbose:
-                ss0, ss1, ss2 = '', '', ''
-                if gga:
-                    ss0 = 'GGA'
-                if rmc:
-                    ss2 = 'RMC'
-                if gga and rmc:
-                    ss1 = ' and '
-                fx.printmsg('found %i %s%s%s GPS epochs at rate of ~%.2f Hz' % (rowrmc, ss0, ss1, ss2, gpssps))
                 fx.printmsg('reading gps locations to data frame...')
-
-            gf.seek(0) # back to beginning of file
-            rowgga, rowrmc = 0, 0
-            for ln in gf: # loop over file line by line
-                if '$GSSIS' in ln:
-                    # if it's a GSSI sentence, grab the scan/trace number
-                    trace = int(ln.split(',')[1])
-
-                if (rmc and gga) and ('GGA' in ln):
-                    # RMC doesn't use altitude so if it exists we include it from a neighboring GGA
-                    z1 = pynmea2.parse(ln.rstrip()).altitude
-                    if rowrmc != rowgga:
-                        # this takes care of the case where RMC lines occur above GGA
-                        z0 = array['altitude'].iat[rowgga]
-                        array['altitude'].iat[rowgga] = z1
-                    rowgga += 1
-
-                if rmc == True: # if there is RMC, we can use the full datestamp but there is no altitude
-                    if 'RMC' in ln:
-                        msg = pynmea2.parse(ln.rstrip())
-                        timestamp = datetime.combine(msg.datestamp, msg.timestamp).replace(tzinfo=TZ) # set t1 for this loop
-                        u = msg.spd_over_grnd * 0.514444444 # convert from knots to m/s
-
-                        sec1 = timestamp.timestamp()
-                        x1, y1 = float(msg.longitude), float(msg.latitude)
-                        if msg.lon_dir in 'W':
-                            lonhem = 'west'
-                        if msg.lat_dir in 'S':
-                            lathem = 'south'
-                        if rowrmc != 0:
-                            elapsedelta = timestamp - prevtime # t1 - t0 in timedelta format
-                            elapsed = float((timestamp-init_time).total_seconds()) # seconds elapsed
-                            m += u * elapsedelta.total_seconds()
-                        else:
-                            u = 0
-                            m = 0
-                            elapsed = 0
-                            if verbose:
-                                fx.printmsg('record starts in %s and %s hemispheres' % (lonhem, lathem))
-                        x0, y0, z0, sec0, m0 = x1, y1, z1, sec1, m # set xyzs0 for next loop
-                        prevtime = timestamp # set t0 for next loop
-                        if rowrmc == 0:
-                            init_time = timestamp
-                        prevtrace = trace
-                        array = array.append({'datetimeutc':timestamp.strftime('%Y-%m-%d %H:%M:%S.%f %z'),
-                                              'trace':trace, 'longitude':x1, 'latitude':y1, 'altitude':z1,
-                                              'velocity':u, 'sec_elapsed':elapsed, 'meters':m}, ignore_index=True)
-                        rowrmc += 1
-
-                else: # if no RMC, we hope there is no UTC 00:00:00 in the file.........
-                    if 'GGA' in ln:
-                        msg = pynmea2.parse(ln.rstrip())
-                        if  msg.timestamp:
-                            timestamp = datetime.combine(header['rhb_cdt'], msg.timestamp).replace(tzinfo=TZ) # set t1 for this loop
-    
-                            sec1 = timestamp.timestamp()
-                            x1, y1 = float(msg.longitude), float(msg.latitude)
-                            try:
-                                z1 = float(msg.altitude)
-                            except AttributeError:
-                                z1 = 0
-                            if msg.lon_dir in 'W':
-                                lonhem = 'west'
-                            if msg.lat_dir in 'S':
-                                lathem = 'south'
-                            if rowgga != 0:
-								#If the difference in Altitude (z) between points is not 0, uses Pythagorean Theorem to better calculate the distance 
-                                if abs(z1 - z0) > 1e-6:
-                                    m_geodesic = geodesic((y1, x1), (y0, x0)).meters 
-                                    m += math.sqrt(m_geodesic**2 + (z1 - z0)**2)
-                                else:
-                                    m += geodesic((y1, x1, z1), (y0, x0, z0)).meters
-                                if rmc == False:
-                                    u = float((m - m0) / (sec1 - sec0))
-                                elapsedelta = timestamp - prevtime # t1 - t0 in timedelta format
-                                elapsed = float((timestamp-init_time).total_seconds()) # seconds elapsed
-                                if elapsed > 3600.0:
-                                    fx.printmsg("WARNING: Time jumps by more than an hour in this GPS dataset and there are no RMC sentences to anchor the datestamp!")
-                                    fx.printmsg("         This dataset may cross over the UTC midnight dateline!\nprevious timestamp: %s\ncurrent timestamp:  %s" % (prevtime, timestamp))
-                                    fx.printmsg("         trace number:       %s" % trace)
-                            else:
-                                u = 0
-                                m = 0
-                                elapsed = 0
-                                if verbose:
-                                    fx.printmsg('record starts in %s and %s hemispheres' % (lonhem, lathem))
-                            x0, y0, z0, sec0, m0 = x1, y1, z1, sec1, m # set xyzs0 for next loop
-                            prevtime = timestamp # set t0 for next loop
-                            if rowgga == 0:
-                                init_time = timestamp
-                            prevtrace = trace
-                            array = pd.concat([array, pd.Series(
-                                                {'datetimeutc':timestamp.strftime('%Y-%m-%d %H:%M:%S.%f %z'),
-                                                'trace':trace, 'longitude':x1, 'latitude':y1, 'altitude':z1,
-                                                'velocity':u, 'sec_elapsed':elapsed, 'meters':m}).to_frame().T], ignore_index=True)
-                            rowgga += 1
-
+            array = gpsframe(records, header, verbose=verbose)
             if verbose:
-                if rmc:
-                    fx.printmsg('processed %i gps epochs (RMC)' % (rowrmc))
-                else:
-                    fx.printmsg('processed %i gps epochs (GGA)' % (rowgga))
-
-        elif frmt == 'csv':
+                fx.printmsg('processed %i gps epochs (%s)' % (array.shape[0], 'GGA' if (records['kind'] != 'RMC').all() else 'RMC'))
+            if cache and not array.empty:
+                savegps(fi, key, array, verbose=verbose)
+    else:
+        if frmt == 'csv':
             with open(fi, 'r') as f:
                 gps = np.fromfile(f)
+        array = emptygps()
 
-    array['datetimeutc'] = pd.to_datetime(array['datetimeutc'], format='%Y-%m-%d %H:%M:%S.%f +0000', utc=True)
-    array.set_index('datetimeutc', inplace=True)
-    ## testing purposes
-    if True:
+    if csv:
         if verbose:
             fx.printmsg('writing GPS to %s-gps.csv' % (fi))
         array.to_csv('%s-gps.csv' % (fi))
@@ -249,6 +366,158 @@ def readdzg(fi, frmt, header, verbose=False):
 
 
 
+def tail_dzg(fi, offset=0, state=None, date=None, verbose=False):
+    """
+    Read the NMEA sentences that have been appended to a DZG since the last call, for following a file that is still being recorded (see :py:func:`readgssi.readgssi.watch`). Reading starts at byte :code:`offset` and stops after the last complete line, so a sentence that is still being written is left for the next call. The running trace number, time, and distance are kept in :code:`state`, so records are numbered as if the whole file had been read by :py:func:`readdzg`.
+
+    Like :py:func:`readdzg`, RMC sentences are used as fixes if the file has them, with the altitude taken from the most recent GGA sentence. If two GGA sentences are read before any RMC, GGA sentences are used as fixes instead.
+
+    ::
+
+        offset, state = 0, None
+        while recording:
+            new, offset, state = tail_dzg('FILE__001.DZG', offset, state)
+
+    :param str fi: The DZG file
+    :param int offset: Byte offset to start reading from (the value returned by the previous call). Defaults to 0.
+    :param dict state: Running values returned by the previous call. Defaults to None, which starts a new record.
+    :param datetime.date date: Date to use for GGA timestamps, which have no date. Defaults to None (1980-01-01).
+    :param bool verbose: Verbose, defaults to False
+    :rtype: new GPS records (:py:class:`pandas.DataFrame`, with the same fields as :py:func:`readdzg`), new offset (:py:class:`int`), state (:py:class:`dict`)
+    """
+    if state == None:
+        state = {'trace': 0, 'fixes': None, 'pending': None, 'altitude': 0., 'meters': 0.,
+                 'init_time': None, 'prevtime': None, 'prevfix': None}
+    if date == None:
+        date = datetime(1980, 1, 1).date()
+    rows = []
+    start, gdt = state['prevfix'], []
+
+    def fix(msg, trace, rmc):
+        # add a record and update the running values
+        if rmc:
+            timestamp = datetime.combine(msg.datestamp, msg.timestamp).replace(tzinfo=TZ)
+        else:
+            timestamp = datetime.combine(date, msg.timestamp).replace(tzinfo=TZ)
+        x1, y1, z1 = float(msg.longitude), float(msg.latitude), state['altitude']
+        u = 0
+        if state['prevtime'] == None:
+            state['init_time'] = timestamp
+        else:
+            dt = (timestamp - state['prevtime']).total_seconds()
+            if rmc:
+                if msg.spd_over_grnd:
+                    u = msg.spd_over_grnd * 0.514444444 # convert from knots to m/s
+                state['meters'] += u * dt
+            else:
+                gdt.append(dt) # GGA distances are measured all at once after the loop
+        state['prevtime'], state['prevfix'] = timestamp, (x1, y1, z1)
+        rows.append({'datetimeutc': timestamp, 'trace': trace, 'longitude': x1, 'latitude': y1, 'altitude': z1,
+                     'velocity': u, 'sec_elapsed': (timestamp - state['init_time']).total_seconds(),
+                     'meters': state['meters']})
+
+    try:
+        with open(fi, 'rb') as gf:
+            gf.seek(offset)
+            new = gf.read()
+    except OSError:
+        new = b''
+    end = new.rfind(b'\n') + 1 # only complete lines
+    for ln in new[:end].decode('ascii', errors='ignore').splitlines():
+        ln = ln.strip()
+        if ln.startswith('$GSSIS'):
+            # scan/trace number
+            try:
+                state['trace'] = int(ln.split(',')[1])
+            except (IndexError, ValueError):
+                pass
+            continue
+        rmc = 'RMC' in ln
+        if not (rmc or ('GGA' in ln)):
+            continue
+        try:
+            msg = pynmea2.parse(ln)
+        except (pynmea2.ParseError, ValueError):
+            continue
+        if not msg.timestamp:
+            continue
+        if rmc:
+            if state['fixes'] == None:
+                state['fixes'], state['pending'] = 'RMC', None
+            if (state['fixes'] == 'RMC') and msg.datestamp:
+                fix(msg, state['trace'], rmc=True)
+        else:
+            try:
+                state['altitude'] = float(msg.altitude)
+            except (AttributeError, TypeError, ValueError):
+                pass
+            if state['fixes'] == None:
+                if state['pending'] == None:
+                    # wait to see whether this file has RMC sentences
+                    state['pending'] = (msg, state['trace'], state['altitude'])
+                    continue
+                # no RMC so far, so this file is GGA only
+                state['fixes'] = 'GGA'
+                pmsg, ptrace, altitude = state['pending']
+                altitude, state['altitude'] = state['altitude'], altitude
+                fix(pmsg, ptrace, rmc=False)
+                state['altitude'], state['pending'] = altitude, None
+            if state['fixes'] == 'GGA':
+                fix(msg, state['trace'], rmc=False)
+    if (state['fixes'] == 'GGA') and rows:
+        pos = np.array([(r['latitude'], r['longitude'], r['altitude']) for r in rows])
+        if start != None: # measure from the last fix of the previous call
+            pos = np.vstack(([[start[1], start[0], start[2]]], pos))
+        seg, dt = distance.segments(pos[:,0], pos[:,1], pos[:,2]), np.array(gdt)
+        velocity = np.divide(seg, dt, out=np.zeros(seg.shape), where=dt > 0)
+        meters = state['meters'] + np.cumsum(seg)
+        if start == None: # the first fix of the file
+            velocity, meters = np.concatenate(([0.], velocity)), np.concatenate(([state['meters']], meters))
+        for r, u, m in zip(rows, velocity, meters):
+            r['velocity'], r['meters'] = u, m
+        state['meters'] = float(meters[-1])
+    if verbose and rows:
+        fx.printmsg('read %s new gps epochs from %s' % (len(rows), fi))
+    array = pd.DataFrame(rows, columns=['datetimeutc', 'trace', 'longitude', 'latitude', 'altitude',
+                                        'velocity', 'sec_elapsed', 'meters'])
+    array['datetimeutc'] = pd.to_datetime(array['datetimeutc'], utc=True)
+    array.set_index('datetimeutc', inplace=True)
+    return array, offset + end, state
+
+
+def pauses(gps, threshold=0.25, epochs=3):
+    """
+    Find the pauses in a GPS record: runs of more than :code:`epochs` consecutive fixes slower than :code:`threshold`, not counting the first and last :code:`epochs` fixes of the record.
+
+    :param pandas.DataFrame gps: GPS data from :py:func:`gpsframe`
+    :param float threshold: Velocity in m/s under which the antenna is considered to be stopped. Defaults to 0.25.
+    :param int epochs: Pauses must be longer than this many fixes. Defaults to 3.
+    :rtype: :py:class:`list` of [start time, end time, start trace, end trace]
+    """
+    slow = (gps['velocity'].values < threshold)
+    slow[:epochs] = False
+    slow[max(len(slow) - epochs, 0):] = False
+    edges = np.diff(np.concatenate(([0], slow.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+    keep = (ends - starts + 1) > epochs
+    return [[gps.index[a], gps.index[b], int(gps['trace'].iat[a]), int(gps['trace'].iat[b])]
+            for a, b in zip(starts[keep], ends[keep])]
+
+def renumber(traces, bounds):
+    """
+    The trace numbers that GPS records would have if the traces recorded during pauses were removed, and which records are outside of pauses. Traces after each pause are moved back by the length of the pause.
+
+    :param numpy.ndarray traces: Trace numbers
+    :param list bounds: Pauses from :py:func:`pauses`
+    :rtype: new trace numbers (:py:class:`numpy.ndarray`), records to keep (:py:class:`numpy.ndarray` of :py:class:`bool`)
+    """
+    traces = np.asarray(traces, dtype=np.int64)
+    new, keep = traces.copy(), np.ones(traces.shape, dtype=bool)
+    for pause in bounds:
+        new -= (traces >= pause[3]) * (pause[3] - pause[2])
+        keep &= ~((traces >= pause[2]) & (traces <= pause[3]))
+    return new, keep
+
 def pause_correct(header, dzg_file, verbose=False, **kwargs):
     '''
     This is a streamlined way of removing pauses from DZG files and re-assigning trace values.
@@ -290,29 +559,10 @@ def pause_correct(header, dzg_file, verbose=False, **kwargs):
                 if (type(kwargs[arg]) == float) or (type(kwargs[arg]) == int):
                     threshold = float(kwargs[arg])
 
-        # pandas ninja maneuvers to get a list of pause boundaries
-        orig_gps = readdzg(fi=backup_file, frmt='dzg', header=header, verbose=False)    # get original GPS values
-        orig_gps['groups'] = pd.cut(orig_gps.velocity,[-1,threshold,100000])            # segment file into groups based on velocity
-        orig_gps['cats'] = (orig_gps.groups != orig_gps.groups.shift()).cumsum()        # give each group a number
-        orig_gps['threshold'] = 0                                                       # create threshold column
-        orig_gps.loc[3:-3, 'threshold'] = threshold                                     # ignoring start and end epochs, assign threshold
-        orig_gps['mask'] = orig_gps['velocity'] < orig_gps['threshold']                 # where does velocity fall beneath threshold
-        exceeds = orig_gps[orig_gps['mask'] == True]                                    # create a view based on non exceedence rows
-        bounds = []
-        if exceeds.cats.count() > 0:                                                    # test whether any exceedences were detected
-            for i in range(exceeds.cats.max() + 1):                                     # for each group in the view
-                if exceeds[exceeds['cats'] == i].count().cats > 3:                      # are there more than 3 epochs in the group?
-                    bounds.append([exceeds[exceeds['cats'] == i].iloc[0].name,          # if so create a data point in the list
-                                   exceeds[exceeds['cats'] == i].iloc[-1].name,         # with time and trace number of boundary
-                                   exceeds[exceeds['cats'] == i].iloc[0].trace,
-                                   exceeds[exceeds['cats'] == i].iloc[-1].trace])
-
-        def new_row_value(trace):   # quick and dirty function to figure out new trace number
-            subtract = 0
-            for pause in bounds:
-                if (trace >= pause[2]) and (trace >= pause[3]):
-                    subtract = subtract + pause[3] - pause[2]
-            return trace - subtract
+        # the backup is read and parsed once. the corrected GPS table comes from the same sentences, renumbered
+        text = readtext(backup_file)
+        records = parsedzg(backup_file, text=text)
+        bounds = pauses(gpsframe(records, header), threshold=threshold)
 
         if verbose:
             fx.printmsg('found %s pause periods' % len(bounds))
@@ -326,27 +576,29 @@ def pause_correct(header, dzg_file, verbose=False, **kwargs):
 
             if verbose:
                 fx.printmsg('transcribing DZG file with new trace values...')
-            with open(dzg_file, 'r') as gf:         # gps file
-                with open(output_file, 'w') as tf:  # transcription file
-                    subtract_amount = 0
-                    for ln in gf: # loop over backup file line by line
-                        if '$GSSIS' in ln:
-                            write = True            # assume this line will get written 
-                            # if it's a GSSI sentence, grab the scan/trace number
-                            trace = int(ln.split(',')[1])
-                            for pause in bounds:    # for each pause period
-                                if (trace >= pause[2]) and (trace <= pause[3]): # if trace is in pause bounds
-                                    write = False   # do not write this group of sentences to file
-                            if write:               # if it is outside of a pause period
-                                tf.write(ln.replace(str(trace), str(new_row_value(trace))))   # replace trace value and write line to file
-                        else:                       # if it's not a GSSI proprietary line
-                            if write:               # and it's outside a pause priod
-                                tf.write(ln)        # transcribe line to new file
-
+            # each $GSSIS sentence starts a group of sentences that belong to its trace
+            groups = text.split('$GSSIS')
+            found = [GSSISTRACE.match(g) for g in groups[1:]]
+            traces = np.array([int(m.group(1)) if m else -1 for m in found], dtype=np.int64)
+            new, keep = renumber(traces, bounds)
+            keep |= traces < 0 # leave groups without a trace number alone
+            out = [groups[0]]
+            for g, m, t, k in zip(groups[1:], found, new, keep):
+                if k:           # if it is outside of a pause period, write it with its new trace number
+                    out.append('$GSSIS,%s%s' % (t, g[m.end():]) if m else '$GSSIS' + g)
+            out = ''.join(out)
+            if readtext(output_file) != out: # a DZG already corrected the same way is left alone, so its mtime doesn't change
+                with open(output_file, 'w', newline='') as tf:  # transcription file. line endings are written as they were read
+                    tf.write(out)
+            elif verbose:
+                fx.printmsg('%s is already corrected' % (output_file))
+
+            records['trace'], keep = renumber(records['trace'].values, bounds)
+            records = records[keep].reset_index(drop=True)
             if verbose:
-                fx.printmsg('done. reading new values into array...')
+                fx.printmsg('done. building corrected GPS table...')
+        return gpsframe(records, header, verbose=verbose)
 
     else:
         fx.printmsg('no dzg file found at (%s)' % (dzg_file))
-
-    return readdzg(fi=output_file, frmt='dzg', header=header, verbose=verbose)
+        return emptygps()
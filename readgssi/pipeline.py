@@ -0,0 +1,418 @@
+import numpy as np
+import readgssi.functions as fx
+from readgssi import filtering, gains
+from readgssi.arrayops import autostack, stack_stream
+from readgssi.dzt import convert, unsigned_offset, iter_traces
+
+"""
+declarative processing pipelines that run in one pass over blocks of traces
+
+a pipeline is a list of stages, written as a comma separated spec such as
+"dewow,bandpass:70-130,stack:4,bgr:100". each block of traces goes through every stage
+before the next block is read, so only one block (plus whatever a stage holds back) is
+in memory at a time, and stages can be put in any order.
+"""
+
+
+class Stage(object):
+    """
+    One step of a :py:class:`Pipeline`. Stages keep no data themselves; anything carried from one block to the next (traces left over from stacking, running means, etc.) lives in a state object that the pipeline passes back in.
+
+    Subclasses set:
+
+    * :code:`names`, the spec names of the stage
+    * :code:`halo`, the number of traces of look-ahead the stage needs. Its output lags its input by this many traces, which it returns on the final call.
+    * :code:`factor`, the number of input traces per output trace (e.g. the stacking value)
+
+    :param str arg: The argument given after the colon in the spec, if any
+    """
+    names = ()
+    halo = 0
+    factor = 1
+
+    def __init__(self, arg=None):
+        self.arg = arg
+
+    def __str__(self):
+        if self.arg in (None, ''):
+            return self.names[0]
+        return '%s:%s' % (self.names[0], self.arg)
+
+    def update(self, header, shape=None):
+        """
+        Change the header values that this stage affects. Called once before the first block.
+
+        :param dict header: The processed file header, modified in place
+        :param tuple shape: Shape (samples, traces) of the whole line going into this stage, if known
+        """
+        pass
+
+    def apply(self, ar, header, state, final=False, threads=1):
+        """
+        Process a block of traces.
+
+        :param numpy.ndarray ar: The block of traces (may have zero traces)
+        :param dict header: The processed file header
+        :param state: The state returned by the last call, or :py:data:`None` on the first
+        :param bool final: Whether this is the last block
+        :param int threads: Number of threads for filters that can use them (see :py:func:`readgssi.functions.blockmap`)
+        :rtype: processed traces (:py:class:`numpy.ndarray`), state
+        """
+        return ar, state
+
+    def tag(self):
+        """
+        The characters that this stage adds to output file names (see :py:func:`readgssi.functions.naming`).
+
+        :rtype: :py:class:`str`
+        """
+        return ''
+
+
+class Dewow(Stage):
+    """
+    Dewow (:py:func:`readgssi.filtering.dewow`). :code:`dewow` removes a cubic trend from each trace, and :code:`dewow:50` removes a 50 sample running mean.
+    """
+    names = ('dewow', 'dw')
+
+    def __init__(self, arg=None):
+        Stage.__init__(self, arg)
+        self.win = int(arg) if arg else None
+
+    def apply(self, ar, header, state, final=False, threads=1):
+        return filtering.dewow(ar, win=self.win, threads=threads), state
+
+    def tag(self):
+        return 'Dw'
+
+
+class Bandpass(Stage):
+    """
+    Vertical triangular FIR bandpass (:py:func:`readgssi.filtering.triangular`), e.g. :code:`bandpass:70-130` (MHz).
+    """
+    names = ('bandpass', 'bp', 'triangular')
+    filtertype = 'triangular'
+
+    def __init__(self, arg=None):
+        Stage.__init__(self, arg)
+        try:
+            self.freqmin, self.freqmax = [int(f) for f in str(arg).split('-')]
+        except ValueError:
+            raise ValueError('%s needs a frequency range in MHz, e.g. "%s:70-130"' % (self.names[0], self.names[0]))
+
+    def apply(self, ar, header, state, final=False, threads=1):
+        if self.filtertype == 'butterworth':
+            return filtering.bp(ar, header, self.freqmin, self.freqmax, threads=threads), state
+        return filtering.triangular(ar, header, self.freqmin, self.freqmax, threads=threads), state
+
+    def tag(self):
+        return '%s%s-%s' % ('Bw' if self.filtertype == 'butterworth' else 'B', self.freqmin, self.freqmax)
+
+
+class Butterworth(Bandpass):
+    """
+    Vertical butterworth bandpass (:py:func:`readgssi.filtering.bp`), e.g. :code:`butterworth:70-130` (MHz).
+    """
+    names = ('butterworth', 'bw')
+    filtertype = 'butterworth'
+
+
+class Stack(Stage):
+    """
+    Horizontal stacking (:py:func:`readgssi.arrayops.stack_stream`), e.g. :code:`stack:4`. Traces left over from an incomplete stack are carried to the next block, and the last, partial stack is returned on the final call, so the result is the same as stacking the whole line at once. :code:`stack:auto` is resolved from the length of the line when it is known.
+    """
+    names = ('stack', 's')
+
+    def __init__(self, arg=None):
+        Stage.__init__(self, arg)
+        if str(arg).lower() == 'auto':
+            self.factor = 'auto'
+        else:
+            try:
+                self.factor = max(int(arg), 1)
+            except ValueError:
+                raise ValueError('stack needs an integer or "auto", e.g. "stack:4"')
+
+    def __str__(self):
+        return 'stack:%s' % (self.factor) # automatic stacking as resolved, once it has been
+
+    def update(self, header, shape=None):
+        if self.factor == 'auto':
+            if shape == None:
+                raise ValueError('"stack:auto" needs the length of the line, which is not known when following a file')
+            self.factor = autostack(shape)
+        if header['rhf_sps'] != 0:
+            header['rhf_sps'] = header['rhf_sps'] / self.factor
+        if header['rhf_spm'] != 0:
+            header['rhf_spm'] = header['rhf_spm'] / self.factor
+
+    def apply(self, ar, header, state, final=False, threads=1):
+        if self.factor == 1:
+            return ar, state
+        return stack_stream(ar, state, stack=self.factor, final=final)
+
+    def tag(self):
+        return 'S%s' % (self.factor) if self.factor != 1 else ''
+
+
+class BGR(Stage):
+    """
+    Horizontal background removal (:py:func:`readgssi.filtering.bgr_stream`). :code:`bgr` subtracts a running full-width mean, and :code:`bgr:100` a 100 trace moving window, which needs half a window of look-ahead.
+    """
+    names = ('bgr',)
+
+    def __init__(self, arg=None):
+        Stage.__init__(self, arg)
+        try:
+            self.win = abs(int(arg)) if arg else 0
+        except ValueError:
+            raise ValueError('bgr needs a window size in traces (or nothing for full width), e.g. "bgr:100"')
+        self.halo = filtering.bgrwindow(self.win) // 2 if self.win > 1 else 0
+
+    def apply(self, ar, header, state, final=False, threads=1):
+        return filtering.bgr_stream(ar, state, win=self.win, final=final)
+
+    def tag(self):
+        return 'Bgr%s' % (self.win) if self.win else 'BgrRun' # a running mean, not the mean of the whole line
+
+
+class Gain(Stage):
+    """
+    Amplitude gain applied down each trace (:py:func:`readgssi.gains.apply`). The argument is a gain spec, e.g. :code:`gain:agc:50`, :code:`gain:tpow:2`, :code:`gain:exp:0.02`, or :code:`gain:sec:0.02`.
+    """
+    names = ('gain',)
+
+    def __init__(self, arg=None):
+        Stage.__init__(self, arg)
+        gains.parse(arg or '')
+
+    def apply(self, ar, header, state, final=False, threads=1):
+        return gains.apply(ar, header, self.arg, threads=threads), state
+
+    def tag(self):
+        return gains.tag(self.arg)
+
+
+STAGES = {}
+for stage in (Dewow, Bandpass, Butterworth, Stack, BGR, Gain):
+    for n in stage.names:
+        STAGES[n] = stage
+
+
+class Pipeline(object):
+    """
+    A chain of processing stages that is run in one pass over blocks of traces. Build one from a spec string, in which stages are separated by commas and arguments follow a colon: ::
+
+        from readgssi.pipeline import Pipeline
+
+        pipe = Pipeline('dewow,bandpass:70-130,stack:4,bgr:100')
+        header, ar = pipe.run(data[0], header)
+
+    Available stages are :code:`dewow` (:py:class:`Dewow`), :code:`bandpass` (:py:class:`Bandpass`), :code:`butterworth` (:py:class:`Butterworth`), :code:`stack` (:py:class:`Stack`), :code:`bgr` (:py:class:`BGR`), and :code:`gain` (:py:class:`Gain`).
+
+    Every stage works on one block at a time and carries what it needs between blocks, so the whole line never has to be in memory (see :py:meth:`run_file`). The result is the same as processing the whole array, except that full-width background removal uses a running mean.
+
+    A pipeline holds the state of one channel. :py:meth:`start` resets it.
+
+    :param spec: A spec string, or a list of :py:class:`Stage` objects
+    :param int threads: Number of threads that each block's filters are split between (see :py:func:`readgssi.functions.blockmap`). Defaults to 1.
+    """
+    def __init__(self, spec, threads=1):
+        if isinstance(spec, str):
+            self.stages = []
+            for s in spec.split(','):
+                name, _, arg = s.strip().partition(':')
+                if not name:
+                    continue
+                if name.lower() not in STAGES:
+                    raise ValueError('unknown pipeline stage "%s". available stages are: %s' % (name, ', '.join(sorted(STAGES))))
+                self.stages.append(STAGES[name.lower()](arg.strip() or None))
+        else:
+            self.stages = list(spec)
+        self.states = [None] * len(self.stages)
+        self.header = None
+        self.last = None
+        self.threads = threads
+
+    @classmethod
+    def from_args(cls, dewow=False, freqmin=None, freqmax=None, filtertype='triangular', stack=1, bgr=False, win=0,
+                  tgain=None, threads=1):
+        """
+        Build the pipeline that is equivalent to the individual processing arguments of :py:func:`readgssi.readgssi.readgssi`, in the order they are applied there: dewow, bandpass, stacking, background removal, gain.
+
+        :rtype: :py:class:`Pipeline`
+        """
+        stages = []
+        if dewow:
+            stages.append(Dewow())
+        if freqmin and freqmax:
+            stages.append((Butterworth if filtertype == 'butterworth' else Bandpass)('%s-%s' % (freqmin, freqmax)))
+        if str(stack).lower() == 'auto' or int(stack) > 1:
+            stages.append(Stack(stack))
+        if bgr:
+            stages.append(BGR(win))
+        if tgain:
+            stages.append(Gain(tgain))
+        return cls(stages, threads=threads)
+
+    def __str__(self):
+        return ','.join(str(s) for s in self.stages)
+
+    def __repr__(self):
+        return "Pipeline('%s')" % (self)
+
+    @property
+    def halo(self):
+        """
+        The total look-ahead of the pipeline, in input traces: how far the output lags the input.
+
+        :rtype: :py:class:`int`
+        """
+        halo, factor = 0, 1
+        for stage in self.stages:
+            if stage.factor != 'auto':
+                factor *= stage.factor
+            halo += stage.halo * factor
+        return halo
+
+    @property
+    def stack(self):
+        """
+        The combined stacking value of all stages.
+
+        :rtype: :py:class:`int`
+        """
+        factor = 1
+        for stage in self.stages:
+            if stage.factor != 'auto':
+                factor *= stage.factor
+        return factor
+
+    def win(self):
+        """
+        The background removal window of the last :code:`bgr` stage, or :py:data:`None` if there isn't one (used for plot titles).
+
+        :rtype: :py:class:`int` or :py:data:`None`
+        """
+        wins = [s.win for s in self.stages if isinstance(s, BGR)]
+        return wins[-1] if wins else None
+
+    def tag(self):
+        """
+        The characters that the pipeline adds to output file names, one group per stage in the order they are run.
+
+        :rtype: :py:class:`str`
+        """
+        return ''.join(s.tag() for s in self.stages)
+
+    def outlen(self, ntraces):
+        """
+        The number of traces that :code:`ntraces` input traces result in.
+
+        :param int ntraces: Number of input traces
+        :rtype: :py:class:`int`
+        """
+        for stage in self.stages:
+            ntraces = -(-ntraces // stage.factor) # partial stacks are kept
+        return ntraces
+
+    def start(self, header, shape=None):
+        """
+        Reset the pipeline for a new line, and return a copy of the header with the values changed by processing.
+
+        :param dict header: The file header dictionary
+        :param tuple shape: Shape (samples, traces) of the whole line, if known (needed for :code:`stack:auto`)
+        :rtype: processed header (:py:class:`dict`)
+        """
+        self.header = header.copy()
+        for stage in self.stages:
+            stage.update(self.header, shape=shape)
+            if shape != None:
+                shape = (shape[0], -(-shape[1] // stage.factor))
+        self.states = [None] * len(self.stages)
+        self.last = None
+        return self.header
+
+    def feed(self, ar, final=False):
+        """
+        Run a block of traces through every stage. Call :py:meth:`start` first, and call with :code:`final=True` on the last block (or afterwards with an empty block) to get the traces that stages held back.
+
+        :param numpy.ndarray ar: The next block of traces
+        :param bool final: Whether this is the last block
+        :rtype: processed traces (:py:class:`numpy.ndarray`)
+        """
+        self.last = (ar.shape[0], ar.dtype)
+        for i, stage in enumerate(self.stages):
+            ar, self.states[i] = stage.apply(ar, self.header, self.states[i], final=final, threads=self.threads)
+        return ar
+
+    def flush(self):
+        """
+        Return the traces that stages are still holding back (the look-ahead of windowed background removal, an incomplete stack), once there are no more blocks to :py:meth:`feed`.
+
+        :rtype: processed traces (:py:class:`numpy.ndarray`)
+        """
+        return self.feed(np.empty((self.last[0], 0), dtype=self.last[1]), final=True)
+
+    def run(self, ar, header, chunk=4096, dtype=None, verbose=False):
+        """
+        Process a whole array, :code:`chunk` traces at a time. The output array is allocated once and filled block by block.
+
+        Arrays that are read-only (such as memory-mapped channels from :py:func:`readgssi.dzt.readdzt`) are converted to :code:`dtype` one block at a time, so only the output is ever held in memory. Otherwise, like the filters themselves, stages may modify :code:`ar` in place.
+
+        :param numpy.ndarray ar: The radar array
+        :param dict header: The file header dictionary
+        :param int chunk: Number of traces per block. Defaults to 4096.
+        :param dtype: Working dtype for read-only arrays (see :py:func:`readgssi.dzt.convert`). Defaults to None (:py:class:`numpy.int32`).
+        :param bool verbose: Verbose, defaults to False
+        :rtype: processed header (:py:class:`dict`), processed array (:py:class:`numpy.ndarray`)
+        """
+        header = self.start(header, shape=ar.shape)
+        if verbose:
+            fx.printmsg('running pipeline %s over %s traces in blocks of %s' % (self, ar.shape[1], chunk))
+        readonly = not ar.flags.writeable
+        dtype = dtype or np.int32
+        chunk = max(int(chunk), 1)
+        out, j = None, 0
+        for i in range(0, max(ar.shape[1], 1), chunk):
+            block = ar[:,i:i+chunk]
+            if readonly:
+                block = convert(block, dtype=dtype, offset=unsigned_offset(header))
+            block = self.feed(block, final=(i + chunk >= ar.shape[1]))
+            if out is None:
+                out = np.empty((block.shape[0], self.outlen(ar.shape[1])), dtype=block.dtype)
+            out[:,j:j+block.shape[1]] = block
+            j += block.shape[1]
+        return self.header, out[:,:j]
+
+    def run_file(self, infile, chunk=4096, dtype=np.int32, verbose=False, **kwargs):
+        """
+        Generator that reads a DZT in blocks (see :py:func:`readgssi.dzt.iter_traces`) and runs every channel through its own copy of the pipeline, so profiles of any length are processed in one pass and bounded memory. For example, to write a processed DZT: ::
+
+            from readgssi import translate
+            from readgssi.pipeline import Pipeline
+
+            with open('FILE__001-P.DZT', 'wb') as f:
+                for header, data in Pipeline('dewow,bandpass:70-130,stack:4').run_file('FILE__001.DZT'):
+                    if f.tell() == 0:
+                        f.write(translate.dzt_header(header))
+                    f.write(translate.dzt_traces(data, header))
+
+        :param str infile: The DZT file location
+        :param int chunk: Number of traces per block. Defaults to 4096.
+        :param dtype: Working dtype. Defaults to :py:class:`numpy.int32`.
+        :param bool verbose: Verbose, defaults to False
+        :param kwargs: Other arguments for :py:func:`readgssi.dzt.iter_traces` (:code:`start_scan`, :code:`num_scans`, :code:`zero`, etc.)
+        :rtype: generator of (processed header (:py:class:`dict`), processed traces by channel (:py:class:`dict` of :py:class:`numpy.ndarray`))
+        """
+        pipes, header = {}, None
+        for header, block, data in iter_traces(infile, chunk=chunk, dtype=dtype, verbose=verbose, **kwargs):
+            final = block['stop'] == header['start_scan'] + header['num_scans']
+            if not pipes:
+                for chan in data:
+                    pipes[chan] = Pipeline(str(self), threads=self.threads)
+                    pipes[chan].start(header, shape=(data[chan].shape[0], header['num_scans']))
+                if verbose:
+                    fx.printmsg('running pipeline %s' % (self))
+            out = dict((chan, pipes[chan].feed(data[chan], final=final)) for chan in data)
+            yield pipes[0].header, out
@@ -17,18 +17,22 @@
 # if you did not receive a copy of the license upon obtaining this software, please visit
 # (https://opensource.org/licenses/AGPL-3.0) to obtain a copy.
 
-import sys, getopt, os
+import sys, getopt, os, time
 import numpy as np
+import pandas as pd
 from datetime import datetime, timedelta
 import readgssi.functions as fx
 import readgssi.plot as plot
 from readgssi import translate
 from readgssi import filtering
+from readgssi import gains
 from readgssi import arrayops
 from readgssi import config
+from readgssi import cache as arraycache
 from readgssi.constants import *
 from readgssi.dzt import *
-from readgssi.gps import pause_correct
+from readgssi.gps import pause_correct, tail_dzg
+from readgssi.pipeline import Pipeline
 
 
 def readgssi(infile, outfile=None, verbose=False, antfreq=None, frmt='python',
@@ -38,7 +42,8 @@ def readgssi(infile, outfile=None, verbose=False, antfreq=None, frmt='python',
              reverse=False, bgr=False, win=0, dewow=False, absval=False,
              normalize=False, specgram=False, noshow=False, spm=None,
              start_scan=0, num_scans=-1, epsr=None, title=True, zoom=[0,0,0,0],
-             pausecorrect=False, showmarks=False):
+             pausecorrect=False, showmarks=False, mmap=False, dtype=np.int32, parallel=False, cache=False,
+             filtertype='triangular', tgain=None, pipeline=None, threads=1, align=False, gpscsv=False):
     """
     This is the primary directive function. It coordinates calls to reading, filtering, translation, and plotting functions, and should be used as the overarching processing function in most cases.
 
@@ -59,12 +64,12 @@ def readgssi(infile, outfile=None, verbose=False, antfreq=None, frmt='python',
     :param bool colorbar: Whether to display a graded color bar at plot time.
     :param list[int,int,int,int] zero: A list of values representing the amount of samples to slice off each channel. Defaults to :py:data:`None` for all channels, which will end up being set by the :code:`rh_zero` variable in :py:func:`readgssi.dzt.readdzt`.
     :param int gain: The amount of gain applied to plots. Defaults to 1. Gain is applied as a ratio of the standard deviation of radargram values to the value set here.
-    :param int freqmin: Minimum frequency value to feed to the vertical triangular FIR bandpass filter :py:func:`readgssi.filtering.triangular`. Defaults to :py:data:`None` (no filter).
-    :param int freqmax: Maximum frequency value to feed to the vertical triangular FIR bandpass filter :py:func:`readgssi.filtering.triangular`. Defaults to :py:data:`None` (no filter).
+    :param int freqmin: Minimum frequency value to feed to the vertical bandpass filter (see :py:data:`filtertype`). Defaults to :py:data:`None` (no filter).
+    :param int freqmax: Maximum frequency value to feed to the vertical bandpass filter (see :py:data:`filtertype`). Defaults to :py:data:`None` (no filter).
     :param bool reverse: Whether to read the array backwards (i.e. flip horizontally; :py:func:`readgssi.arrayops.flip`). Defaults to :py:data:`False`. Useful for lining up travel directions of files run opposite each other.
     :param int bgr: Background removal filter applied after stacking (:py:func:`readgssi.filtering.bgr`). Defaults to :py:data:`False` (off). :py:data:`bgr=True` must be accompanied by a valid value for :py:data:`win`.
     :param int win: Window size for background removal filter (:py:func:`readgssi.filtering.bgr`). If :py:data:`bgr=True` and :py:data:`win=0`, the full-width row average will be subtracted from each row. If :py:data:`bgr=True` and :py:data:`win=50`, a moving window will calculate the average of 25 cells on either side of the current cell, and subtract that average from the cell value, using :py:func:`scipy.ndimage.uniform_filter1d` with :py:data:`mode='constant'` and :py:data:`cval=0`. This is useful for removing non-uniform horizontal average, but the tradeoff is that it creates ghost data half the window size away from vertical figures, and that a window size set too low will obscure any horizontal layering longer than the window size.
-    :param bool dewow: Whether to apply a vertical dewow filter (experimental). See :py:func:`readgssi.filtering.dewow`.
+    :param bool dewow: Whether to apply a vertical dewow filter (removes a cubic trend from each trace). See :py:func:`readgssi.filtering.dewow`.
     :param bool absval: If :py:data:`True`, displays the absolute value of the vertical gradient of the array when plotting. Good for displaying faint array features.
     :param bool normalize: Distance normalization (:py:func:`readgssi.arrayops.distance_normalize`). Defaults to :py:data:`False`.
     :param bool specgram: Produce a spectrogram of a trace in the array using :py:func:`readgssi.plot.spectrogram`. Defaults to :py:data:`False` (if :py:data:`True`, defaults to a trace roughly halfway across the profile). This is mostly for debugging and is not currently accessible from the command line.
@@ -75,9 +80,19 @@ def readgssi(infile, outfile=None, verbose=False, antfreq=None, frmt='python',
     :param float epsr: Epsilon_r, otherwise known as relative permittivity, or dielectric constant. This determines the speed at which waves travel through the first medium they encounter. It is used to calculate the profile depth if depth units are specified on the Z-axis of plots.
     :param bool title: Whether to display descriptive titles on plots. Defaults to :py:data:`True`.
     :param list[int,int,int,int] zoom: Zoom extents to set programmatically for matplotlib plots. Must pass a list of four integers: :py:data:`[left, right, up, down]`. Since the z-axis begins at the top, the "up" value is actually the one that displays lower on the page. All four values are axis units, so if you are working in nanoseconds, 10 will set a limit 10 nanoseconds down. If your x-axis is in seconds, 6 will set a limit 6 seconds from the start of the survey. It may be helpful to display the matplotlib interactive window at full extents first, to determine appropriate extents to set for this parameter. If extents are set outside the boundaries of the image, they will be set back to the boundaries. If two extents on the same axis are the same, the program will default to plotting full extents for that axis.
-    :rtype: header (:py:class:`dict`), radar arrays by channel :py:class:`dict` {0: :py:class:`numpy.ndarray`, 1: :py:class:`numpy.ndarray`, etc.}, gps (False or :py:class:`pandas.DataFrame`)
+    :rtype: header (:py:class:`dict`), radar arrays by channel :py:class:`dict` {0: :py:class:`numpy.ndarray`, 1: :py:class:`numpy.ndarray`, etc.}, gps (:py:class:`pandas.DataFrame`, the same table as :code:`header.gps`, empty if there is no GPS file)
     :param bool pausecorrect: If :py:data:`True` or minimum speed given as :py:data:`+float`, search the DZG file for pauses, where GPS keeps recording but radar unit does not, and correct them if necessary. Defaults to :py:data:`False`. Minimum speed defaults to 0.25 m/s.
     :param bool showmarks: If :py:data:`True`, display mark locations in plot. Defaults to :py:data:`False`.
+    :param bool gpscsv: If :py:data:`True`, write the GPS table (after pause correction, if any) to a CSV next to the DZG, e.g. :code:`FILE__001.DZG-gps.csv`. Defaults to :py:data:`False`.
+    :param bool mmap: If :py:data:`True`, memory-map the DZT instead of reading it (see :py:func:`readgssi.dzt.readdzt`). Channels are only copied to a working dtype once a filter needs to modify them, so header display and plotting of very large files use little memory. Defaults to :py:data:`False`.
+    :param dtype: Working precision of the radar arrays. Defaults to :py:class:`numpy.int32`. Setting :py:data:`dtype='float32'` removes the unsigned offset from 8 and 16 bit data during conversion and keeps arrays in single precision through all filters, which halves memory use compared to the :py:class:`numpy.float64` arrays that filters otherwise produce. See :py:func:`readgssi.dzt.convert`.
+    :param bool parallel: If :py:data:`True`, process the channels of multichannel files at the same time in separate processes (see :py:func:`process_parallel`). Falls back to processing in sequence if plots are to be shown interactively. Defaults to :py:data:`False`.
+    :param str filtertype: The vertical bandpass filter to apply if :py:data:`freqmin` and :py:data:`freqmax` are set: :py:data:`'triangular'` for the triangular FIR filter :py:func:`readgssi.filtering.triangular`, or :py:data:`'butterworth'` for the butterworth filter :py:func:`readgssi.filtering.bp`. Defaults to :py:data:`'triangular'`.
+    :param str tgain: Amplitude gain applied to the array itself after background removal, so that it is exported as well as plotted (unlike :py:data:`gain`, which only changes the plot contrast). A gain spec such as :py:data:`'agc:50'`, :py:data:`'tpow:2'`, :py:data:`'exp:0.02'`, or :py:data:`'sec:0.02'` (see :py:mod:`readgssi.gains`). Defaults to :py:data:`None`.
+    :param int threads: Number of threads that each filter splits the array between (see :py:func:`readgssi.functions.blockmap`). :py:data:`'auto'` or 0 uses one per CPU. This is separate from :py:data:`parallel`, which processes channels in separate processes, and the two can be combined. Defaults to 1.
+    :param pipeline: A processing pipeline (:py:class:`readgssi.pipeline.Pipeline` or a spec string such as :py:data:`'dewow,bandpass:70-130,stack:4,bgr:100'`) to run in one pass over blocks of traces, in place of :py:data:`dewow`, :py:data:`freqmin`/:py:data:`freqmax`, :py:data:`stack`, :py:data:`bgr`, and :py:data:`tgain`, which are then ignored. Stages run in the order given, after distance normalization and before reversal. Defaults to :py:data:`None`.
+    :param align: Line up the direct wave of all traces before any other processing, to remove drift of the direct wave along the line (see :py:func:`readgssi.arrayops.align`). Delays are found by cross-correlation with the average direct wave (:py:data:`'xcorr'`) or by first break picks (:py:data:`'threshold'`), and traces are shifted by whole samples (:py:data:`':int'`) or fractions of a sample (:py:data:`':fft'`), e.g. :py:data:`'threshold:fft'` (see :py:func:`readgssi.arrayops.alignspec`). :py:data:`True`, :py:data:`'int'`, or :py:data:`'xcorr'` is cross-correlation and whole samples, and :py:data:`'fft'` cross-correlation and fractions of a sample. Defaults to :py:data:`False`.
+    :param cache: If :py:data:`True` or a directory path, processed arrays are stored in an on-disk cache (see :py:mod:`readgssi.cache`) and reused when the same file is processed again with the same parameters, so that only plotting and export are redone (for example when trying different values of :py:data:`gain`, :py:data:`colormap`, or :py:data:`zoom`). Arrays loaded from the cache are read-only. Defaults to :py:data:`False`.
     """
 
     if infile:
@@ -86,10 +101,11 @@ def readgssi(infile, outfile=None, verbose=False, antfreq=None, frmt='python',
             if verbose:
                 fx.printmsg('reading...')
                 fx.printmsg('input file:         %s' % (infile))
+            # GPS and marks are only read if something below asks for them (see readgssi.dzt.DZTHeader)
             header, data, gps = readdzt(infile, gps=normalize, spm=spm,
                                         start_scan=start_scan, num_scans=num_scans,
                                         epsr=epsr, antfreq=antfreq, zero=zero,
-                                        verbose=verbose)
+                                        verbose=verbose, mmap=mmap, dtype=dtype, lazy=True)
             # print a bunch of header info
             if verbose:
                 fx.printmsg('success. header values:')
@@ -126,7 +142,8 @@ def readgssi(infile, outfile=None, verbose=False, antfreq=None, frmt='python',
     chans = list(range(header['rh_nchan']))
     outfiles = {}
 
-    if (pausecorrect) and (not gps.empty):
+    dzg_file = os.path.splitext(infile)[0] + ".DZG"
+    if (pausecorrect) and (os.path.isfile(dzg_file)): # pause_correct parses the DZG itself, so it isn't read here first
         kwargs = {}
         fx.printmsg('correcting GPS errors created by user-initiated recording pauses...')
         if (type(pausecorrect) == float) or (type(pausecorrect) == int):
@@ -134,68 +151,57 @@ def readgssi(infile, outfile=None, verbose=False, antfreq=None, frmt='python',
             fx.printmsg('pause velocity threshold is %s m/s (user-specified)' % (kwargs['threshold']))
         else:
             fx.printmsg('pause velocity threshold is 0.25 m/s (default)')
-        gps = pause_correct(header=header, dzg_file=os.path.splitext(infile)[0] + ".DZG", verbose=verbose, **kwargs)
-    elif (pausecorrect) and (gps.empty):
+        header.gps = pause_correct(header=header, dzg_file=dzg_file, verbose=verbose, **kwargs)
+    elif (pausecorrect):
         fx.printmsg("can't correct pauses without a valid DZG file to look for. are you sure the DZG has the same name as the DZT file?")
-
-
-    for ar in data:
-        """
-        filter and construct an output file or plot from the current channel's array
-        """
-        if verbose:
-            fx.printmsg('beginning processing for channel %s (antenna %s)' % (ar, header['rh_antname'][ar]))
-        # execute filtering functions if necessary
-        if normalize:
-            header, data[ar], gps = arrayops.distance_normalize(header=header, ar=data[ar], gps=gps,
-                                                                  verbose=verbose)
-        if dewow:
-            # dewow
-            data[ar] = filtering.dewow(ar=data[ar], verbose=verbose)
-        if freqmin and freqmax:
-            # vertical triangular bandpass
-            data[ar] = filtering.triangular(ar=data[ar], header=header, freqmin=freqmin, freqmax=freqmax,
-                                               zerophase=True, verbose=verbose)
-        if stack != 1:
-            # horizontal stacking
-            header, data[ar], stack = arrayops.stack(ar=data[ar],
-                                                      header=header,
-                                                      stack=stack,
-                                                      verbose=verbose)
-        else:
-            stack = 1 # just in case it's not an integer
-        if bgr:
-            # background removal
-            data[ar] = filtering.bgr(ar=data[ar], header=header, win=win, verbose=verbose)
+    if gpscsv:
+        if header.gps.empty:
+            fx.printmsg('WARNING: no GPS records to write to CSV')
         else:
-            win = None
-        if reverse:
-            # read array backwards
-            data[ar] = arrayops.flip(data[ar], verbose=verbose)
-
-
-        ## file naming
-        # name the output file
-        if ar == 0: # first channel?
-            orig_outfile = outfile # preserve the original
-        else:
-            outfile = orig_outfile # recover the original
+            if verbose:
+                fx.printmsg('writing GPS to %s-gps.csv' % (dzg_file))
+            header.gps.to_csv('%s-gps.csv' % (dzg_file))
 
-        outfiles[ar] = fx.naming(outfile=outfile, infile_basename=infile_basename, chans=chans, chan=ar,
-                                 normalize=normalize, zero=header['timezero'][ar], stack=stack, reverse=reverse,
-                                 bgr=bgr, win=win, dewow=dewow, freqmin=freqmin, freqmax=freqmax, plotting=plotting,
-                                 gain=gain, absval=absval)
-        if plotting:
-            plot.radargram(ar=data[ar], ant=ar, header=header, freq=header['antfreq'][ar], verbose=verbose,
-                           figsize=figsize, dpi=dpi, stack=stack, x=x, z=z, gain=gain, colormap=colormap,
-                           colorbar=colorbar, noshow=noshow, outfile=outfiles[ar], fmt=frmt, win=win, title=title,
-                           zero=header['timezero'][ar], zoom=zoom, absval=absval, showmarks=showmarks)
 
-        if histogram:
-            plot.histogram(ar=data[ar], verbose=verbose)
+    if normalize:
+        header.gps # read the GPS once here rather than once per channel
+    if pipeline:
+        pipeline = Pipeline(str(pipeline))
+        if verbose:
+            fx.printmsg('processing pipeline: %s' % (pipeline))
 
-        if specgram:
-            plot.spectrogram(ar=data[ar], header=header, freq=header['antfreq'][ar], verbose=verbose)
+    # each channel is processed with its own copy of the header, so one channel's processing can't affect another's
+    kwargs = dict(infile_basename=infile_basename, outfile=outfile, chans=chans, verbose=verbose, frmt=frmt,
+                  plotting=plotting, figsize=figsize, dpi=dpi, stack=stack, x=x, z=z, histogram=histogram,
+                  colormap=colormap, colorbar=colorbar, gain=gain, freqmin=freqmin, freqmax=freqmax,
+                  filtertype=filtertype, tgain=tgain, reverse=reverse, bgr=bgr, win=win, dewow=dewow, absval=absval,
+                  normalize=normalize, specgram=specgram, noshow=noshow, title=title, zoom=zoom, showmarks=showmarks,
+                  mmap=mmap, dtype=dtype, cache=cache, pipeline=pipeline, threads=threads, align=align)
+    if cache:
+        # everything that affects the processed arrays or their headers
+        kwargs['cacheparams'] = dict(spm=spm, epsr=epsr, antfreq=antfreq, zero=zero, start_scan=header['start_scan'],
+                                     num_scans=header['num_scans'], normalize=normalize, pausecorrect=pausecorrect,
+                                     align=align,
+                                     dewow=dewow, freqmin=freqmin, freqmax=freqmax, filtertype=filtertype,
+                                     stack=stack, bgr=bgr, win=win, tgain=tgain,
+                                     pipeline=str(pipeline) if pipeline else None,
+                                     reverse=reverse, mmap=mmap, dtype=np.dtype(dtype).str)
+        if (normalize or pausecorrect) and os.path.isfile(dzg_file):
+            # the GPS decides the trace spacing, so the DZG is part of the key. pause correction rewrites the DZG
+            # from its backup, so the untouched backup (with the threshold in pausecorrect above) is what's fingerprinted
+            gpssource = dzg_file + '.bak' if (pausecorrect and os.path.isfile(dzg_file + '.bak')) else dzg_file
+            kwargs['cacheparams']['gps'] = arraycache.fingerprint(gpssource)
+    if parallel and (len(data) > 1) and ((plotting and not noshow) or histogram or specgram):
+        fx.printmsg('WARNING: interactive plots are shown one at a time, so channels will be processed in sequence.')
+        fx.printmsg('         use -n (noshow) to process channels in parallel.')
+        parallel = False
+    if parallel and (len(data) > 1):
+        headers, data, outfiles = process_parallel(data=data, header=header, **kwargs)
+    else:
+        headers = {}
+        for ar in data:
+            headers[ar], data[ar], outfiles[ar] = process_channel(chan=ar, ar=data[ar], header=header.copy(), **kwargs)
+    header = headers[0]
 
     if frmt != None:
         if verbose:
@@ -207,7 +213,7 @@ def readgssi(infile, outfile=None, verbose=False, antfreq=None, frmt='python',
             # what is the output format
             if frmt in 'csv':
                 translate.csv(ar=data[ar], outfile_abspath=outfile_abspath,
-                              header=header, verbose=verbose)
+                              header=headers[ar], verbose=verbose)
             elif frmt in 'h5':
                 translate.h5(ar=data[ar], infile_basename=infile_basename,
                              outfile_abspath=outfile_abspath, verbose=verbose)
@@ -219,14 +225,448 @@ def readgssi(infile, outfile=None, verbose=False, antfreq=None, frmt='python',
                                 verbose=verbose)
             elif frmt in 'gprpy':
                 translate.gprpy(ar=data[ar], outfile_abspath=outfile_abspath,
-                                header=header, verbose=verbose)
+                                header=headers[ar], verbose=verbose)
             elif frmt in 'dzt':
                 if ar == 0:
                     translate.dzt(ar=data, outfile_abspath=outfile_abspath,
                                   header=header, verbose=verbose)
         if frmt in ('object', 'python'):
-            return header, data, gps
+            return header, data, header.gps # a DataFrame. the DZG is only parsed here if processing didn't need it
     
+def process_channel(chan, ar, header, infile_basename, outfile=None, chans=[0], verbose=False, frmt='python',
+                    plotting=False, figsize=7, dpi=150, stack=1, x='seconds', z='nanoseconds', histogram=False,
+                    colormap='gray', colorbar=False, gain=1, freqmin=None, freqmax=None, reverse=False, bgr=False,
+                    win=0, dewow=False, absval=False, normalize=False, specgram=False, noshow=False, title=True,
+                    zoom=[0,0,0,0], showmarks=False, mmap=False, dtype=np.int32, cache=False, cacheparams=None,
+                    filtertype='triangular', tgain=None, pipeline=None, threads=1, align=False):
+    """
+    Filter a single channel's array, name its output, and plot it if requested. This is called once per channel by :py:func:`readgssi`, either in sequence or from worker processes (see :py:func:`process_parallel`). Parameters not listed here are the same as those of :py:func:`readgssi`.
+
+    :param int chan: The channel number
+    :param numpy.ndarray ar: The channel's radar array
+    :param dict header: The channel's own copy of the file header. Values changed by processing (for example :code:`rhf_spm` after stacking) are only changed in this copy.
+    :param str infile_basename: Input file path without extension, used for output naming
+    :param list chans: List of all channel numbers in the file, used for output naming
+    :param dict cacheparams: The parameters that the cache key is made from (see :py:func:`readgssi.cache.key`), if :code:`cache` is set
+    :param readgssi.pipeline.Pipeline pipeline: The processing pipeline, if any. A copy is run for each channel.
+    :rtype: header (:py:class:`dict`), radar array (:py:class:`numpy.ndarray`), output file name (:py:class:`str`)
+    """
+    if verbose:
+        fx.printmsg('beginning processing for channel %s (antenna %s)' % (chan, header['rh_antname'][chan]))
+    hit = None
+    if cache:
+        cachedir = cache if isinstance(cache, str) else None
+        cachekey = arraycache.key(header['infile'], chan, cacheparams)
+        hit = arraycache.load(cachekey, directory=cachedir, verbose=verbose)
+    if pipeline:
+        pipeline = Pipeline(str(pipeline), threads=threads)
+    if hit:
+        # filtering was already done with these parameters
+        ar, (header, stack, win, spec) = hit
+        if pipeline:
+            pipeline = Pipeline(spec, threads=threads) # with automatic stacking resolved
+    else:
+        if mmap and (align or normalize or ((not pipeline) and (dewow or (freqmin and freqmax) or (stack != 1) or bgr))):
+            # memory-mapped channels are read-only views of the file, so get a working copy before filtering
+            # (a pipeline converts one block at a time instead)
+            ar = convert(ar, dtype=dtype, offset=unsigned_offset(header))
+        # execute filtering functions if necessary
+        if align:
+            # line up the direct wave of every trace
+            method, fractional = arrayops.alignspec(align)
+            ar, shifts = arrayops.align(ar, method=method, fractional=fractional, verbose=verbose)
+        if normalize:
+            header, ar, header.gps = arrayops.distance_normalize(header=header, ar=ar, gps=header.gps, verbose=verbose)
+        if pipeline:
+            # dewow, filters, stacking, and background removal in one pass, in the order given
+            header, ar = pipeline.run(ar, header, dtype=dtype, verbose=verbose)
+            stack, win = pipeline.stack, pipeline.win()
+        else:
+            if dewow:
+                # dewow
+                ar = filtering.dewow(ar=ar, threads=threads, verbose=verbose)
+            if freqmin and freqmax:
+                if filtertype == 'butterworth':
+                    # vertical butterworth bandpass
+                    ar = filtering.bp(ar=ar, header=header, freqmin=freqmin, freqmax=freqmax,
+                                      zerophase=True, threads=threads, verbose=verbose)
+                else:
+                    # vertical triangular bandpass
+                    ar = filtering.triangular(ar=ar, header=header, freqmin=freqmin, freqmax=freqmax,
+                                              zerophase=True, threads=threads, verbose=verbose)
+            if stack != 1:
+                # horizontal stacking
+                header, ar, stack = arrayops.stack(ar=ar, header=header, stack=stack, verbose=verbose)
+            else:
+                stack = 1 # just in case it's not an integer
+            if bgr:
+                # background removal
+                ar = filtering.bgr(ar=ar, header=header, win=win, threads=threads, verbose=verbose)
+            else:
+                win = None
+            if tgain:
+                # amplitude gain
+                ar = gains.apply(ar, header, tgain, threads=threads, verbose=verbose)
+        if reverse:
+            # read array backwards
+            ar = arrayops.flip(ar, verbose=verbose)
+        if cache:
+            arraycache.save(cachekey, ar, (header, stack, win, str(pipeline) if pipeline else None),
+                            directory=cachedir, verbose=verbose)
+
+    ## file naming
+    # name the output file
+    outfile = fx.naming(outfile=outfile, infile_basename=infile_basename, chans=chans, chan=chan,
+                        normalize=normalize, zero=header['timezero'][chan], align=align, stack=stack, reverse=reverse,
+                        bgr=bgr, win=win, dewow=dewow, freqmin=freqmin, freqmax=freqmax, filtertype=filtertype,
+                        tgain=tgain, pipeline=pipeline, plotting=plotting, gain=gain, absval=absval)
+    if plotting:
+        plot.radargram(ar=ar, ant=chan, header=header, freq=header['antfreq'][chan], verbose=verbose,
+                       figsize=figsize, dpi=dpi, stack=stack, x=x, z=z, gain=gain, colormap=colormap,
+                       colorbar=colorbar, noshow=noshow, outfile=outfile, fmt=frmt, win=win, title=title,
+                       zero=header['timezero'][chan], zoom=zoom, absval=absval, showmarks=showmarks)
+
+    if histogram:
+        plot.histogram(ar=ar, verbose=verbose)
+
+    if specgram:
+        plot.spectrogram(ar=ar, header=header, freq=header['antfreq'][chan], verbose=verbose)
+
+    return header, ar, outfile
+
+def process_shared(chan, spec, header, kwargs):
+    """
+    Worker process side of :py:func:`process_parallel`. Attaches to the channel's array in shared memory, runs :py:func:`process_channel` on it, and copies the result into a new shared memory block for the parent process to collect.
+
+    :param int chan: The channel number
+    :param tuple spec: Shared memory spec of the input array from :py:func:`readgssi.functions.share_array`
+    :param dict header: The channel's copy of the file header
+    :param dict kwargs: Keyword arguments for :py:func:`process_channel`
+    :rtype: header (:py:class:`dict`), shared memory spec of the output array (:py:class:`tuple`), output file name (:py:class:`str`)
+    """
+    shm, ar = fx.attach_array(spec)
+    header, ar, outfile = process_channel(chan=chan, ar=ar, header=header, **kwargs)
+    out, outspec = fx.share_array(ar)
+    del ar # release the view of the input block before closing it
+    out.close()
+    shm.close()
+    return header, outspec, outfile
+
+def process_parallel(data, header, **kwargs):
+    """
+    Process all channels at the same time in a pool of worker processes, one per channel (up to the number of CPUs). Arrays are passed to and from the workers through :py:mod:`multiprocessing.shared_memory` rather than being pickled, and each worker gets its own copy of the header.
+
+    :param dict data: Radar arrays by channel
+    :param dict header: The file header
+    :param kwargs: Keyword arguments for :py:func:`process_channel`
+    :rtype: headers by channel (:py:class:`dict`), radar arrays by channel (:py:class:`dict`), output file names by channel (:py:class:`dict`)
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = min(len(data), os.cpu_count() or 1)
+    if kwargs.get('verbose'):
+        fx.printmsg('processing %s channels in parallel using %s processes' % (len(data), workers))
+    headers, outfiles, blocks, futures = {}, {}, [], {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for ar in data:
+                shm, spec = fx.share_array(data[ar])
+                blocks.append(shm)
+                futures[ar] = pool.submit(process_shared, ar, spec, header.copy(), kwargs)
+            for ar in futures:
+                headers[ar], spec, outfiles[ar] = futures[ar].result()
+                shm, a = fx.attach_array(spec)
+                data[ar] = np.array(a) # copy out of shared memory so the block can be freed
+                del a
+                shm.close()
+                shm.unlink()
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    return headers, data, outfiles
+
+def uptodate(infile, frmt='python', plotting=False, zero=[None,None,None,None], start_scan=0, num_scans=-1,
+             stack=1, normalize=False, reverse=False, bgr=False, win=0, dewow=False, freqmin=None, freqmax=None,
+             filtertype='triangular', tgain=None, pipeline=None, align=False, gain=1, absval=False, **kwargs):
+    """
+    Check whether the output files that :py:func:`readgssi` would write for :code:`infile` (as named by :py:func:`readgssi.functions.naming`) all exist and are newer than :code:`infile`. Only the header is read. Parameters are the same as those of :py:func:`readgssi`; others are ignored.
+
+    If the names can't be known in advance (automatic stacking of a distance normalized file), this returns :py:data:`False`.
+
+    :param str infile: Input DZT data file
+    :rtype: :py:class:`bool`
+    """
+    if frmt in ('object', 'python', None):
+        return False
+    if (frmt in plot.fmts) and not plotting:
+        return False # nothing is written
+    if pipeline:
+        pipeline = Pipeline(str(pipeline))
+        stack = 'auto' if 'auto' in [s.factor for s in pipeline.stages] else 1
+    if (str(stack).lower() == 'auto') and normalize:
+        return False
+    ext = {'numpy': 'npy', 'gprpy': 'npy', 'dzt': 'DZT'}.get(frmt, frmt)
+    try:
+        header = readdzt_header(infile, zero=zero)
+    except Exception:
+        return False # unreadable. let readgssi report the error
+    start_scan, num_scans = tracewindow(header, start_scan, num_scans)
+    chans = list(range(header['rh_nchan']))
+    # a DZT output holds every channel, and is named after channel 0
+    for chan in (chans[:1] if frmt == 'dzt' else chans):
+        pipe = None
+        if pipeline:
+            # resolves automatic stacking the same way process_channel will
+            pipe = Pipeline(str(pipeline))
+            pipe.start(header, shape=(header['rh_nsamp'] - header['timezero'][chan], num_scans))
+        s = stack
+        if str(stack).lower() == 'auto':
+            s = arrayops.autostack((header['rh_nsamp'] - header['timezero'][chan], num_scans))
+        try:
+            s = int(s)
+        except ValueError:
+            s = 1
+        outfile = fx.naming(outfile=None, infile_basename=os.path.splitext(infile)[0], chans=chans, chan=chan,
+                            normalize=normalize, zero=header['timezero'][chan], align=align, stack=s, reverse=reverse,
+                            bgr=bgr,
+                            win=win if bgr else None, dewow=dewow, freqmin=freqmin, freqmax=freqmax,
+                            filtertype=filtertype, tgain=tgain, pipeline=pipe, plotting=plotting, gain=gain,
+                            absval=absval)
+        outfile = '%s.%s' % (outfile, ext)
+        if (not os.path.isfile(outfile)) or os.path.samefile(outfile, infile):
+            return False
+        if os.path.getmtime(outfile) <= os.path.getmtime(infile):
+            return False
+    return True
+
+def batch_worker(infile, kwargs):
+    """
+    Process one file for :py:func:`batch`, catching any error so that one bad file doesn't stop the rest.
+
+    :param str infile: Input DZT data file
+    :param dict kwargs: Keyword arguments for :py:func:`readgssi`
+    :rtype: infile (:py:class:`str`), error (:py:data:`None` or :py:class:`str`), seconds elapsed (:py:class:`float`)
+    """
+    start = datetime.now()
+    error = None
+    try:
+        readgssi(infile=infile, **kwargs)
+    except Exception as e:
+        error = '%s: %s' % (type(e).__name__, e)
+    return infile, error, (datetime.now() - start).total_seconds()
+
+def batch(infiles, jobs=1, force=False, **kwargs):
+    """
+    Apply the same processing to many files, spread over :code:`jobs` worker processes. Files whose outputs are newer than the input are skipped unless :code:`force=True` (see :py:func:`uptodate`). A status line is printed as each file finishes, followed by a summary.
+
+    From the command line, batch mode is used when more than one file is given, for example :code:`readgssi -i survey/ -p 8 -n -s auto -r 0 -j 8` (a directory, a glob, or several files can be given with :code:`-i` or as extra arguments).
+
+    :param list infiles: Input DZT data files
+    :param int jobs: Number of worker processes. Defaults to 1 (files are processed one at a time in this process).
+    :param bool force: Process files even if their outputs are up to date. Defaults to False.
+    :param kwargs: Keyword arguments for :py:func:`readgssi`, applied to every file. :code:`outfile` is ignored.
+    :rtype: errors by input file (:py:class:`dict`, :py:data:`None` for files that succeeded)
+    """
+    start = datetime.now()
+    kwargs['outfile'] = None
+    if (jobs > 1) and kwargs.get('plotting') and (not kwargs.get('noshow')):
+        fx.printmsg('WARNING: plots cannot be shown interactively in batch mode with more than one job. figures will be saved but not shown.')
+        kwargs['noshow'] = True
+    todo, skipped = [], []
+    for infile in infiles:
+        if (not force) and uptodate(infile, **kwargs):
+            skipped.append(infile)
+            fx.printmsg('[skipped] %s (outputs are up to date)' % (infile))
+        else:
+            todo.append(infile)
+
+    results = {}
+    def report(infile, error, sec):
+        results[infile] = error
+        fx.printmsg('[%s/%s] %s %s (%.1f s)' % (len(results), len(todo), 'FAILED' if error else 'done', infile, sec))
+        if error:
+            fx.printmsg('        %s' % (error))
+
+    if (jobs > 1) and (len(todo) > 1):
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        fx.printmsg('processing %s files using %s processes' % (len(todo), min(jobs, len(todo))))
+        with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+            futures = [pool.submit(batch_worker, infile, kwargs) for infile in todo]
+            for future in as_completed(futures):
+                report(*future.result())
+    else:
+        for infile in todo:
+            report(*batch_worker(infile, kwargs))
+
+    failed = [f for f in results if results[f]]
+    fx.printmsg('batch summary: %s processed, %s skipped, %s failed (%.1f s)' % (len(results) - len(failed), len(skipped),
+                                                                               len(failed), (datetime.now() - start).total_seconds()))
+    for f in failed:
+        fx.printmsg('    failed: %s' % (f))
+    for f in skipped:
+        results[f] = None
+    return results
+
+def watch(infile, outfile=None, frmt='png', plotting=False, interval=2., idle=60., chunk=16, window=2000,
+          figsize=7, dpi=150, stack=1, x='seconds', z='nanoseconds', colormap='gray', colorbar=False, gain=1,
+          freqmin=None, freqmax=None, filtertype='triangular', bgr=False, win=0, dewow=False, tgain=None, absval=False,
+          title=True, zero=[None,None,None,None], spm=None, epsr=None, antfreq=[None,None,None,None],
+          dtype=np.int32, pipeline=None, threads=1, verbose=False):
+    """
+    Process a DZT while it is still being recorded. The file is polled every :code:`interval` seconds, and only the complete traces appended since the last poll are read (by trace count from :code:`data_offset` and the trace size, see :py:func:`readgssi.dzt.readtraces`). Likewise, only new lines of the DZG are parsed (see :py:func:`readgssi.gps.tail_dzg`).
+
+    New traces are dewowed, bandpassed, stacked, background-removed, and gained as they arrive, by one :py:class:`readgssi.pipeline.Pipeline` per channel (either the one given, or one built from the individual processing arguments). Traces left over from an incomplete stack are carried over to the next batch, so the output is the same as stacking the finished file. Background removal uses a running mean or a moving window that lags by half its length (see :py:func:`readgssi.filtering.bgr_stream`). The last :code:`window` processed traces of each channel are kept, and if :code:`plotting` is set, a quicklook image of them is rewritten after every update. If :code:`frmt='dzt'`, processed traces are also appended to an output DZT as they arrive.
+
+    Watching stops when the file has not grown for :code:`idle` seconds, or on :code:`Ctrl-C`.
+
+    Parameters not listed here are the same as those of :py:func:`readgssi`.
+
+    :param float interval: Seconds between polls. Defaults to 2.
+    :param float idle: Stop after this many seconds without new traces. 0 or None watches until interrupted. Defaults to 60.
+    :param int chunk: Minimum number of new traces to process at once. Defaults to 16.
+    :param int window: Number of processed traces per channel to keep and plot. Defaults to 2000.
+    :rtype: header (:py:class:`dict`), the last :code:`window` processed traces by channel (:py:class:`dict` of :py:class:`numpy.ndarray`), gps (:py:class:`pandas.DataFrame`)
+    """
+    header = readdzt_header(infile, spm=spm, epsr=epsr, antfreq=antfreq, zero=zero, verbose=verbose)
+    with open(infile, 'rb') as f:
+        f.seek(MINHEADSIZE * header['rh_nchan'])
+        header['header_extra'] = f.read(header['data_offset'] - (MINHEADSIZE * header['rh_nchan']))
+    chans = list(range(header['rh_nchan']))
+    infile_basename = os.path.splitext(infile)[0]
+    dzg = infile_basename + '.DZG'
+
+    if pipeline:
+        pipeline = Pipeline(str(pipeline), threads=threads)
+        named = pipeline
+    else:
+        pipeline = Pipeline.from_args(dewow=dewow, freqmin=freqmin, freqmax=freqmax, filtertype=filtertype,
+                                      stack=stack, bgr=bgr, win=win, tgain=tgain, threads=threads)
+        named = None # outputs are named the same way as readgssi would
+    if 'auto' in [s.factor for s in pipeline.stages]:
+        fx.printmsg('WARNING: automatic stacking depends on the length of the finished file. watching with no stacking.')
+        pipeline = Pipeline([s for s in pipeline.stages if s.factor != 'auto'], threads=threads)
+    stack, win = pipeline.stack, pipeline.win()
+    chunk = max(int(chunk), stack)
+
+    # one pipeline per channel. the processed header only depends on the stages, so it is made once up front
+    pipes = dict((chan, Pipeline(str(pipeline), threads=threads)) for chan in chans)
+    for chan in chans:
+        proc = pipes[chan].start(header)
+
+    outfiles = {}
+    for chan in chans:
+        outfiles[chan] = fx.naming(outfile=outfile, infile_basename=infile_basename, chans=chans, chan=chan,
+                                   zero=header['timezero'][chan], stack=stack, bgr=bgr, win=win,
+                                   dewow=dewow, freqmin=freqmin, freqmax=freqmax, filtertype=filtertype,
+                                   tgain=tgain, pipeline=named, plotting=plotting, gain=gain, absval=absval,
+                                   bgrrun=True)
+    export = None
+    if frmt == 'dzt':
+        exportfile = fx.naming(outfile=outfile, infile_basename=infile_basename, chans=[0], zero=header['timezero'][0],
+                               stack=stack, bgr=bgr, win=win, dewow=dewow, freqmin=freqmin,
+                               freqmax=freqmax, filtertype=filtertype, tgain=tgain, pipeline=named,
+                               bgrrun=True) + '.DZT'
+        if os.path.abspath(exportfile) == os.path.abspath(infile):
+            fx.printmsg('WARNING: export would overwrite the input file. not exporting (set a filter or output name).')
+        else:
+            export = open(exportfile, 'wb')
+            export.write(translate.dzt_header(proc, verbose=verbose))
+            fx.printmsg('exporting to:       %s' % (exportfile))
+    elif frmt not in plot.fmtst:
+        fx.printmsg('WARNING: only DZT output can be written while watching. not exporting %s.' % (frmt))
+    if plotting and (frmt not in plot.fmtst):
+        frmt = 'png'
+
+    shown = dict((chan, None) for chan in chans)
+
+    def keep(data):
+        # add processed traces to the quicklook and the output DZT
+        for chan in chans:
+            if shown[chan] is None:
+                shown[chan] = data[chan]
+            else:
+                shown[chan] = np.concatenate((shown[chan], data[chan]), axis=1)[:,-window:]
+        if export:
+            export.write(translate.dzt_traces(data, proc, verbose=verbose))
+            export.flush()
+
+    def quicklook():
+        for chan in chans:
+            if (shown[chan] is None) or (shown[chan].shape[1] == 0):
+                continue
+            try:
+                proc['sec'] = shown[chan].shape[1] / float(proc['rhf_sps'])
+            except ZeroDivisionError:
+                proc['sec'] = 1.
+            plot.radargram(ar=shown[chan], ant=chan, header=proc, freq=header['antfreq'][chan], figsize=figsize,
+                           dpi=dpi, stack=stack, x=x, z=z, gain=gain, colormap=colormap, colorbar=colorbar,
+                           noshow=True, outfile=outfiles[chan], fmt=frmt, win=win,
+                           title=title, zero=header['timezero'][chan], absval=absval, verbose=False)
+
+    gpsoffset, gpsstate, gps = 0, None, []
+    done, seen, quiet = 0, 0, 0.
+    fx.printmsg('watching %s (ctrl-c to stop)' % (infile))
+    try:
+        while True:
+            header['ntraces'] = int((os.path.getsize(infile) - header['data_offset']) // header['trace_bytes'])
+            grew = header['ntraces'] > seen
+            seen = header['ntraces']
+            if grew:
+                quiet = 0.
+            new = seen - done
+            # process once enough traces have piled up, or when recording pauses
+            if not ((new >= chunk) or ((new > 0) and (not grew))):
+                if idle and (quiet >= idle):
+                    break
+                time.sleep(interval)
+                quiet += interval
+                continue
+            new = min(new, max(chunk, 4096)) # catch up on an existing file in bounded batches
+
+            # read only the new traces
+            data = arraylist(header, readtraces(infile, header, start_scan=done, num_scans=new), dtype=dtype)
+            for chan in chans:
+                data[chan] = pipes[chan].feed(data[chan])
+            keep(data)
+            done += new
+
+            if os.path.exists(dzg):
+                recs, gpsoffset, gpsstate = tail_dzg(dzg, gpsoffset, gpsstate, date=header['rhb_cdt'].date())
+                if len(recs) > 0:
+                    gps.append(recs)
+            msg = 'read traces %s-%s' % (done - new, done)
+            if gpsstate and gpsstate['prevfix']:
+                msg = '%s - trace %s at %.6f, %.6f (%.1f m)' % (msg, gpsstate['trace'], gpsstate['prevfix'][1],
+                                                               gpsstate['prevfix'][0], gpsstate['meters'])
+            fx.printmsg(msg)
+
+            if plotting and (done == seen):
+                quicklook()
+            if done == seen:
+                time.sleep(interval)
+                quiet += interval
+    except KeyboardInterrupt:
+        fx.printmsg('stopped watching')
+    try:
+        if done:
+            # traces held back for the look-ahead of the bgr window, and the last partial stack
+            data = {}
+            for chan in chans:
+                data[chan] = pipes[chan].flush()
+            keep(data)
+            if plotting:
+                quicklook()
+    finally:
+        if export:
+            export.close()
+    fx.printmsg('processed %s traces of %s' % (done, infile))
+    if gps:
+        gps = pd.concat(gps)
+    else:
+        gps = pd.DataFrame()
+    return proc, shown, gps
+
 def main():
     """
     This function gathers and parses command line arguments with which to create function calls. It is not for use from the python console.
@@ -241,6 +681,16 @@ def main():
     zoom = [0,0,0,0]
     infile, outfile, antfreq, plotting, figsize, histogram, colorbar, dewow, bgr, noshow = None, None, None, None, None, None, None, None, None, None
     reverse, freqmin, freqmax, specgram, normalize, spm, epsr, absval, pausecorrect, showmarks = None, None, None, None, None, None, None, None, None, None
+    mmap, info, force, cache, watching = False, False, False, False, False
+    gpscsv = False
+    infiles, jobs = [], 1
+    dtype = np.int32
+    parallel = False
+    filtertype = 'triangular'
+    pipeline = None
+    tgain = None
+    threads = 1
+    align = False
     colormap = 'gray'
     x, z = 'seconds', 'nanoseconds'
     frmt = 'png'
@@ -249,11 +699,12 @@ def main():
 # some of this needs to be tweaked to formulate a command call to one of the main body functions
 # variables that can be passed to a body function: (infile, outfile, antfreq=None, frmt, plotting=False, stack=1)
     try:
-        opts, args = getopt.getopt(sys.argv[1:],'hVqd:i:a:o:f:p:s:r:RNwnmc:bg:Z:E:t:x:z:Te:D:APM',
+        opts, args = getopt.gnu_getopt(sys.argv[1:],'hVqd:i:a:o:f:p:s:r:RNwnmc:bg:Z:E:t:x:z:Te:D:APMIj:',
             ['help', 'version', 'quiet','spm=','input=','antfreq=','output=','format=','plot=','stack=','bgr=',
             'reverse', 'normalize','dewow','noshow','histogram','colormap=','colorbar','gain=',
             'zero=','epsr=','bandpass=', 'xscale=', 'zscale=', 'titleoff', 'zoom=', 'dpi=', 'absval','pausecorrect',
-            'showmarks'])
+            'showmarks', 'memmap', 'info', 'dtype=', 'parallel', 'jobs=', 'force', 'cache', 'watch', 'filtertype=',
+            'pipeline=', 'tgain=', 'threads=', 'align=', 'gpscsv'])
     # the 'no option supplied' error
     except getopt.GetoptError as e:
         fx.printmsg('ERROR: invalid argument(s) supplied')
@@ -274,6 +725,7 @@ def main():
                 infile = arg
                 if '~' in infile:
                     infile = os.path.expanduser(infile) # if using --input=~/... tilde needs to be expanded 
+                infiles.append(infile)
         if opt in ('-o', '--output'): # the output file
             if arg:
                 outfile = arg
@@ -344,7 +796,7 @@ def main():
             dewow = True
         if opt in ('-R', '--reverse'):
             reverse = True
-        if opt in ('-P', '--pausecorr'):
+        if opt in ('-P', '--pausecorrect'):
             pausecorrect = True
         if opt in ('-N', '--normalize'):
             normalize = True
@@ -439,6 +891,72 @@ def main():
             histogram = True
         if opt in ('-M', '--showmarks'):
             showmarks = True
+        if opt == '--memmap':
+            mmap = True
+        if opt == '--parallel':
+            parallel = True
+        if opt in ('-j', '--jobs'):
+            try:
+                jobs = int(arg)
+                assert jobs > 0
+            except:
+                fx.printmsg('WARNING: number of jobs must be a positive integer. defaulting to 1.')
+                jobs = 1
+        if opt == '--force':
+            force = True
+        if opt == '--cache':
+            cache = True
+        if opt == '--gpscsv':
+            gpscsv = True
+        if opt == '--watch':
+            watching = True
+        if opt == '--filtertype':
+            if arg.lower() in ('triangular', 'triangle', 'fir'):
+                filtertype = 'triangular'
+            elif arg.lower() in ('butterworth', 'butter', 'iir'):
+                filtertype = 'butterworth'
+            else:
+                fx.printmsg('WARNING: invalid filter type "%s". must be "triangular" or "butterworth". defaulting to triangular.' % arg)
+                filtertype = 'triangular'
+        if opt == '--align':
+            try:
+                arrayops.alignspec(arg)
+                align = arg.lower()
+            except ValueError as e:
+                fx.printmsg('WARNING: %s. aligning by cross-correlation and whole samples.' % e)
+                align = 'int'
+        if opt == '--pipeline':
+            try:
+                pipeline = Pipeline(arg)
+            except ValueError as e:
+                fx.printmsg('ERROR: invalid pipeline "%s": %s' % (arg, e))
+                sys.exit(2)
+        if opt == '--tgain':
+            try:
+                gains.parse(arg)
+                tgain = arg
+            except ValueError as e:
+                fx.printmsg('ERROR: invalid gain "%s": %s' % (arg, e))
+                sys.exit(2)
+        if opt == '--threads':
+            if arg.lower() in ('auto', '0'):
+                threads = 'auto'
+            else:
+                try:
+                    threads = int(arg)
+                    assert threads > 0
+                except:
+                    fx.printmsg('WARNING: number of threads must be a positive integer or "auto". defaulting to 1.')
+                    threads = 1
+        if opt == '--dtype':
+            try:
+                dtype = np.dtype(arg)
+                assert dtype.kind in ('i', 'f')
+            except:
+                fx.printmsg('WARNING: invalid working dtype "%s". must be a signed integer or float type, e.g. "float32". defaulting to int32.' % arg)
+                dtype = np.int32
+        if opt in ('-I', '--info'):
+            info = True
         if opt in ('-c', '--colormap'):
             if arg:
                 colormap = arg
@@ -475,8 +993,54 @@ def main():
                 except:
                     fx.printmsg('WARNING: DPI could not be set. did you supply a positive integer?')
 
+    if pipeline and (dewow or bgr or freqmin or (stack != 1) or tgain):
+        fx.printmsg('WARNING: a pipeline was given, so -w, -t, -s, -r, and --tgain are ignored. add them to the pipeline instead.')
+
+    if watching and align:
+        fx.printmsg('WARNING: direct wave alignment needs the whole line, so --align is ignored in watch mode.')
+
+    # inputs can be files, directories, or glob patterns, given with -i or as extra arguments
+    infiles = fx.expand_inputs(infiles + args)
+    if len(infiles) == 1:
+        infile = infiles[0]
+
     # call the function with the values we just got
-    if infile:
+    if infiles and info:
+        # header-only fast path: no data, GPS, or DZX is read
+        for infile in infiles:
+            fx.printmsg('input file:         %s' % (infile))
+            header = readdzt_header(infile, spm=spm, epsr=epsr, antfreq=antfreq, zero=zero)
+            header_info(header, None)
+            print('')
+    elif watching:
+        if len(infiles) != 1:
+            fx.printmsg('ERROR: watch mode follows one file at a time')
+            sys.exit(2)
+        if verbose:
+            fx.printmsg(config.dist)
+        watch(infile=infile, outfile=outfile, frmt=frmt, plotting=plotting, figsize=figsize, dpi=dpi, stack=stack,
+              x=x, z=z, colormap=colormap, colorbar=colorbar, gain=gain, freqmin=freqmin, freqmax=freqmax,
+              filtertype=filtertype, bgr=bgr, tgain=tgain,
+              win=win, dewow=dewow, absval=absval, title=title, zero=zero, spm=spm, epsr=epsr, antfreq=antfreq,
+              dtype=dtype, pipeline=pipeline, threads=threads, verbose=verbose)
+        print('')
+    elif len(infiles) > 1:
+        if verbose:
+            fx.printmsg(config.dist)
+        if outfile:
+            fx.printmsg('WARNING: output file name is ignored when processing more than one file')
+        results = batch(infiles, jobs=jobs, force=force, antfreq=antfreq, frmt=frmt, plotting=plotting, dpi=dpi,
+                        figsize=figsize, stack=stack, verbose=verbose, histogram=histogram, x=x, z=z,
+                        colormap=colormap, colorbar=colorbar, reverse=reverse, gain=gain, bgr=bgr, win=win,
+                        zero=zero, normalize=normalize, dewow=dewow, noshow=noshow, freqmin=freqmin, freqmax=freqmax,
+                        spm=spm, epsr=epsr, title=title, zoom=zoom, absval=absval, pausecorrect=pausecorrect,
+                        showmarks=showmarks, mmap=mmap, dtype=dtype, parallel=parallel, cache=cache,
+                        filtertype=filtertype, tgain=tgain, pipeline=pipeline, threads=threads, align=align,
+                        gpscsv=gpscsv)
+        print('')
+        if any(results.values()):
+            sys.exit(1)
+    elif infile:
         if verbose:
             fx.printmsg(config.dist)
         readgssi(infile=infile, outfile=outfile, antfreq=antfreq, frmt=frmt, plotting=plotting, dpi=dpi,
@@ -484,7 +1048,9 @@ def main():
                  colormap=colormap, colorbar=colorbar, reverse=reverse, gain=gain, bgr=bgr, win=win,
                  zero=zero, normalize=normalize, dewow=dewow, noshow=noshow, freqmin=freqmin, freqmax=freqmax,
                  spm=spm, epsr=epsr, title=title, zoom=zoom, absval=absval, pausecorrect=pausecorrect,
-                 showmarks=showmarks)
+                 showmarks=showmarks, mmap=mmap, dtype=dtype, parallel=parallel, cache=cache,
+                 filtertype=filtertype, tgain=tgain, pipeline=pipeline, threads=threads, align=align,
+                 gpscsv=gpscsv)
         if verbose:
             fx.printmsg('done with %s' % infile)
         print('')
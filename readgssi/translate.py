@@ -5,6 +5,7 @@ import json
 import struct
 from readgssi.gps import readdzg
 import readgssi.functions as fx
+from readgssi.constants import DZT_HEADER
 from datetime import datetime
 
 """
@@ -192,22 +193,68 @@ def writetime(d):
     :param datetime d: the :py:class:`datetime.datetime` to be encoded
     :rtype: bytes
     '''
-    # get binary values
-    sec2 = int(bin(int(d.second / 2))[2:])
-    mins = int(bin(d.minute)[2:])
-    hr = int(bin(d.hour)[2:])
-    day = int(bin(d.day)[2:])
-    mo = int(bin(d.month)[2:])
-    yr = int(bin(d.year - 1980)[2:])
-    # create binary string with proper padding
-    dtbits = '%07d%04d%05d%05d%06d%05d' % (yr, mo, day, hr, mins, sec2)
-    # create four bytes that make up rfDateByte
-    byt0 = int(dtbits[24:], 2)
-    byt1 = int(dtbits[16:24], 2)
-    byt2 = int(dtbits[8:16], 2)
-    byt3 = int(dtbits[0:8], 2)
-    # return a byte array
-    return bytes([byt0, byt1, byt2, byt3])
+    # pack (year-1980, month, day, hour, min, seconds/2) into a little endian unsigned int
+    rfdate = (((d.year - 1980) << 25) | (d.month << 21) | (d.day << 16) |
+              (d.hour << 11) | (d.minute << 5) | int(d.second / 2))
+    return struct.pack('<I', rfdate)
+
+def dzt_header(header, verbose=True):
+    """
+    Pack a header dictionary into the bytes at the start of a 32 bit DZT: one :py:data:`readgssi.constants.DZT_HEADER` block per channel, followed by :code:`header_extra`. Used by :py:func:`dzt`, and on its own to start a DZT that traces are appended to (see :py:func:`readgssi.readgssi.watch`).
+
+    :param dict header: The file header dictionary
+    :param bool verbose: Verbose, defaults to True
+    :rtype: bytes
+    """
+    # header should read all values per-channel no matter what
+    hdrs = np.zeros(header['rh_nchan'], dtype=DZT_HEADER)
+    for key in ('rh_tag', 'rh_data', 'rh_nsamp', 'rh_zero', 'rhf_sps', 'rhf_spm', 'rhf_mpm', 'rhf_position',
+                'rhf_range', 'rh_npass', 'rh_rgain', 'rh_nrgain', 'rh_text', 'rh_ntext', 'rh_proc', 'rh_nproc',
+                'rh_nchan', 'rhf_epsr', 'rhf_top', 'rhf_depth', 'rh_xstart', 'rh_xend', 'rhf_servo_level',
+                'rh_accomp', 'rh_sconfig', 'rh_spp', 'rh_linenum', 'rh_ystart', 'rh_yend'):
+        hdrs[key] = header[key]
+    hdrs['rh_bits'] = 32 # for simplicity, just hard-coding 32 bit
+    hdrs['rhb_cdt'] = struct.unpack('<I', writetime(header['rhb_cdt']))[0]
+    hdrs['rhb_mdt'] = struct.unpack('<I', writetime(datetime.now()))[0] # modification date/time
+    for key in ('rh_96', 'rh_dtype', 'rh_112', 'vsbyte'):
+        hdrs[key] = ord(header[key])
+    for key in ('rh_name', 'rh_chksum', 'INFOAREA', 'rh_RGPS0', 'rh_RGPS1'):
+        hdrs[key] = header[key]
+    for i in range(header['rh_nchan']):
+        if verbose:
+            fx.printmsg('writing DZT header for channel %s' % (i))
+        hdrs['rh_ant'][i] = header['dzt_ant'][i]
+    return hdrs.tobytes() + header['header_extra']
+
+def dzt_traces(ar, header, verbose=True):
+    """
+    Pack per-channel arrays into the interleaved trace block of a 32 bit DZT. Rows sliced off by time zero are written back as zeros, so the output can be appended to a file started with :py:func:`dzt_header`.
+
+    :param dict ar: Radar arrays by channel
+    :param dict header: The file header dictionary
+    :param bool verbose: Verbose, defaults to True
+    :rtype: bytes
+    """
+    stack = []
+    i = 0
+    for i in range(header['rh_nchan']):
+        # replace zeroed rows
+        stack.append(np.zeros((header['timezero'][i], ar[i].shape[1]),
+                                    dtype=np.int32))
+        stack.append(ar[i])
+        i += 1
+
+    writestack = np.vstack(tuple(stack))
+    sh = writestack.shape
+    writestack = writestack.T.reshape(-1)
+    if verbose:
+        fx.printmsg('writing %s data samples for %s channels (%s x %s)'
+              % (writestack.shape[0],
+                 int(len(stack)/2),
+                 sh[0], sh[1]))
+
+    # hard coded to write 32 bit signed ints to keep lossiness to a minimum
+    return writestack.round().astype(np.int32, casting='unsafe').tobytes(order='C')
 
 def dzt(ar, outfile_abspath, header, verbose=False):
     """
@@ -256,83 +303,7 @@ def dzt(ar, outfile_abspath, header, verbose=False):
     
     outfile = open(outfile_abspath, 'wb')
     fx.printmsg('writing to: %s' % outfile.name)
-
-    for i in range(header['rh_nchan']):
-        fx.printmsg('writing DZT header for channel %s' % (i))
-        # header should read all values per-channel no matter what
-        outfile.write(struct.pack('<h', header['rh_tag']))
-        outfile.write(struct.pack('<h', header['rh_data']))
-        outfile.write(struct.pack('<h', header['rh_nsamp']))
-        outfile.write(struct.pack('<h', 32)) # rhf_bits - for simplicity, just hard-coding 32 bit
-        outfile.write(struct.pack('<h', header['rh_zero']))
-        # byte 10
-        outfile.write(struct.pack('<f', header['rhf_sps']))
-        outfile.write(struct.pack('<f', header['rhf_spm'])) # dzt.py ln 94-97
-        outfile.write(struct.pack('<f', header['rhf_mpm']))
-        outfile.write(struct.pack('<f', header['rhf_position']))
-        outfile.write(struct.pack('<f', header['rhf_range']))
-        outfile.write(struct.pack('<h', header['rh_npass']))
-        # byte 32
-        outfile.write(writetime(header['rhb_cdt']))
-        outfile.write(writetime(datetime.now())) # modification date/time
-        # byte 40
-        outfile.write(struct.pack('<h', header['rh_rgain']))
-        outfile.write(struct.pack('<h', header['rh_nrgain']))
-        outfile.write(struct.pack('<h', header['rh_text']))
-        outfile.write(struct.pack('<h', header['rh_ntext']))
-        outfile.write(struct.pack('<h', header['rh_proc']))
-        outfile.write(struct.pack('<h', header['rh_nproc']))
-        outfile.write(struct.pack('<h', header['rh_nchan']))
-        outfile.write(struct.pack('<f', header['rhf_epsr'])) # dzt.py ln 121-126
-        outfile.write(struct.pack('<f', header['rhf_top']))
-        outfile.write(struct.pack('<f', header['rhf_depth']))
-        # byte 66
-        outfile.write(struct.pack('<f', header['rh_xstart'])) # part of rh_coordx
-        outfile.write(struct.pack('<f', header['rh_xend'])) # part of rh_coordx
-        outfile.write(struct.pack('<f', header['rhf_servo_level']))
-        outfile.write(bytes(3)) # "reserved"
-        outfile.write(struct.pack('B', header['rh_accomp']))
-        outfile.write(struct.pack('<h', header['rh_sconfig']))
-        outfile.write(struct.pack('<h', header['rh_spp']))
-        outfile.write(struct.pack('<h', header['rh_linenum']))
-        # byte 88
-        outfile.write(struct.pack('<f', header['rh_ystart'])) # part of rh_coordy
-        outfile.write(struct.pack('<f', header['rh_yend'])) # part of rh_coordy
-        outfile.write(header['rh_96'])
-        outfile.write(struct.pack('c', header['rh_dtype']))
-        outfile.write(header['dzt_ant'][i])
-        outfile.write(header['rh_112'])
-        # byte 113
-        outfile.write(header['vsbyte'])
-        outfile.write(header['rh_name'])
-        outfile.write(header['rh_chksum'])
-        # byte 128
-        outfile.write(header['INFOAREA'])
-        outfile.write(header['rh_RGPS0'])
-        outfile.write(header['rh_RGPS1'])
-        i += 1
-
-    outfile.write(header['header_extra'])
-
-    stack = []
-    i = 0
-    for i in range(header['rh_nchan']):
-        # replace zeroed rows
-        stack.append(np.zeros((header['timezero'][i], ar[i].shape[1]),
-                                    dtype=np.int32))
-        stack.append(ar[i])
-        i += 1
-
-    writestack = np.vstack(tuple(stack))
-    sh = writestack.shape
-    writestack = writestack.T.reshape(-1)
-    fx.printmsg('writing %s data samples for %s channels (%s x %s)'
-          % (writestack.shape[0],
-             int(len(stack)/2),
-             sh[0], sh[1]))
-
-    # hard coded to write 32 bit signed ints to keep lossiness to a minimum
-    outfile.write(writestack.round().astype(np.int32, casting='unsafe').tobytes(order='C'))
-
+    outfile.write(dzt_header(header))
+    outfile.write(dzt_traces(ar, header))
     outfile.close()
 